@@ -0,0 +1,1069 @@
+# Headless performance benchmarks for Shitty Planner.
+#
+#   python benchmark.py                              # default scales, writes bench_results.json
+#   python benchmark.py --scales 100,10000,50000 --content-size 4000
+#   python benchmark.py --generate-only --tasks 5000 --db big.db
+#   python benchmark.py --compare bench_results_old.json
+#
+# Exits non-zero when a correctness check in any scenario fails.
+# Runs under QT_QPA_PLATFORM=offscreen unless another platform is set, and never
+# touches the database.db next to main.py.
+import argparse
+import json
+import os
+import platform
+import random
+import re
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt6.QtWidgets import QApplication
+from PyQt6.QtCore import QObject, QEvent, Qt, QMimeData, QPoint, QPointF, PYQT_VERSION_STR, QT_VERSION_STR
+from PyQt6.QtGui import QImage, QColor, QMouseEvent
+from PyQt6.QtTest import QTest
+
+import main
+import planner_db
+
+DEFAULT_SCALES = (100, 1000, 10000)
+DEFAULT_CATEGORIES = 20
+DEFAULT_CONTENT_SIZE = 2000
+DEFAULT_SAMPLES = 30
+SOAK_SELECTIONS = 2000
+SOAK_MAX_OBJECT_GROWTH = 0  # QObjects the soak may leave behind; each selection reuses the same widgets
+SOAK_MAX_RSS_GROWTH_MB = 10  # allocator slack allowed over the soak, well under a leaked note per selection
+LARGE_NOTE_SIZE = 2000000  # characters of text in the large-note scenario
+REMOTE_EDITS = 20  # renames made by the second process in the remote_changes scenario
+RESIZE_DRAG_MOVES = 250  # mouse moves in the window_resize scenario, one every RESIZE_DRAG_MOVE_MS
+RESIZE_DRAG_MOVE_MS = 4
+ATTACHMENT_IMAGES = 8  # pasted images in the attachments scenario, 800x600 each
+CLI_BATCH_ADDS = 500  # add lines in the cli scenario's batch
+COMPACT_CONVERT_NOTES = 1000  # notes the compact_content scenario converts at most, at idle pace
+MAINTENANCE_DELETED_TASKS = 1000  # tasks duplicated and deleted again before the maintenance scenario reclaims their pages
+MAINTENANCE_TIMEOUT_S = 120
+
+# Benchmark methods in the order they run, each with the result keys it reports. A timing
+# summary prints its mean; any other nested result prints each of its numbers.
+SCENARIOS = (
+    ("startup", ("startup_to_first_paint_ms", "startup_to_tree_ms")),
+    ("memory", ("rss_mb",)),
+    ("load_categories", ("load_categories",)),
+    ("select_task", ("select_task_cold", "select_task_warm")),
+    ("keystroke_to_save", ("keystroke", "save_task_content", "write_behind_commit")),
+    ("star_toggle", ("star_toggle",)),
+    ("rename", ("rename",)),
+    ("search", ("search_to_results", "search_results")),
+    ("large_note", ("large_note_select_ms", "large_note_loaded_ms", "large_note_max_stall_ms")),
+    ("revisions", ("revision_record", "revision_load", "revision_compression_ratio")),
+    ("bulk", ("bulk_tasks", "bulk_star_ms", "bulk_unstar_ms", "bulk_duplicate_ms", "bulk_delete_ms")),
+    ("reorder", (
+        "reorder_move", "reorder_category", "reorder_rows_updated_max", "reorder_rebalances", "reorder_matches_reload",
+    )),
+    ("attachments", (
+        "attachment_paste", "attachment_autosave", "attachment_note_kb", "attachment_inline_note_kb",
+        "attachment_open_ms", "attachment_reads_on_open",
+    )),
+    ("window_resize", (
+        "resize_mouse_moves", "resize_geometry_changes", "resize_note_rewraps_during_drag",
+        "resize_note_rewraps_after", "resize_drag_ms", "resize_move_event",
+    )),
+    ("transfer", ("export_jsonl_ms", "import_jsonl_ms")),
+    ("cli", ("cli_list", "cli_batch_adds", "cli_batch_ms", "cli_imports_qt")),
+    ("backup", ("backup_total_ms", "backup_max_stall_ms", "backup_keystroke", "backup_save")),
+    ("remote_changes", ("remote_poll_idle", "remote_change_latency", "remote_changes_coalesced", "remote_lock_errors")),
+    ("profiler_overhead", (
+        "profiled_select_task_cold", "profiled_select_task_warm", "profiled_keystroke",
+        "profiled_save_task_content", "profiled_write_behind_commit",
+    )),
+    ("compact_content", (
+        "compact_notes", "compact_long_note", "compact_notes_converted", "compact_html_notes_left",
+        "compact_content_bytes_before", "compact_content_bytes_after", "compact_notes_per_second",
+        "compact_conversion_slice",
+    )),
+    ("maintenance", (
+        "maintenance_file_bytes_before", "maintenance_convert_ms", "maintenance_free_pages", "maintenance_vacuum_step",
+        "maintenance_analyze_ms", "maintenance_optimize_ms", "maintenance_stats_ms", "maintenance_file_bytes_after",
+        "maintenance_idle_jobs", "maintenance_ui_call", "maintenance_job",
+    )),
+    ("soak", ("soak",)),
+    ("restored_startup", ("restored_startup_to_first_paint_ms", "restored_startup_to_tree_ms")),
+)
+SUMMARY_FIELDS = ("n", "median_ms", "p95_ms", "min_ms", "max_ms")  # left out of the printed summary
+
+# Second planner process for remote_changes: renames one task to its commit time, every 100 ms
+REMOTE_WRITER = """
+import sys, time
+import planner_db
+db = planner_db.CategoryTaskDB(sys.argv[1])
+for n in range(int(sys.argv[3])):
+    db.update_task_name(int(sys.argv[2]), f"REMOTE {time.time():.6f}")
+    time.sleep(0.1)
+db.close()
+"""
+
+QT_HTML_HEADER = (
+    '<!DOCTYPE HTML PUBLIC "-//W3C//DTD HTML 4.0//EN" "http://www.w3.org/TR/REC-html40/strict.dtd">\n'
+    '<html><head><meta name="qrichtext" content="1" /><meta charset="utf-8" /><style type="text/css">\n'
+    'p, li { white-space: pre-wrap; }\nhr { height: 1px; border-width: 0; }\n</style></head>'
+    '<body style=" font-family:\'Sans Serif\'; font-size:18px; font-weight:400; font-style:normal;">\n'
+)
+WORDS = (
+    "plan call email invoice groceries meeting draft review notes idea fix deploy read write "
+    "buy book dentist garden report budget travel ticket gift birthday project deadline"
+).split()
+
+def fake_content(rng, size):
+    # Qt-style HTML of roughly `size` characters of text
+    paragraphs, length = [], 0
+    while length < size:
+        text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 24)))
+        if rng.random() < 0.2:
+            text = f'<span style=" font-weight:700;">{text}</span>'
+        paragraphs.append(
+            '<p style=" margin-top:0px; margin-bottom:0px; margin-left:0px; margin-right:0px; '
+            f'-qt-block-indent:0; text-indent:0px;">{text}</p>'
+        )
+        length += len(text)
+    return QT_HTML_HEADER + "\n".join(paragraphs) + "</body></html>"
+
+def generate_database(path, categories, tasks, content_size, seed=1):
+    # Fills a fresh planner database with `categories` x (tasks / categories) tasks
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    rng = random.Random(seed)
+    db = planner_db.CategoryTaskDB(path)
+    cur = db.conn.cursor()
+    now = int(time.time())
+    with db.conn:
+        cur.executemany('INSERT INTO categories (name, rank) VALUES (?, ?)', [(f"CATEGORY {i + 1}", (i + 1) * planner_db.RANK_GAP) for i in range(categories)])
+        category_ids = [row[0] for row in cur.execute('SELECT id FROM categories ORDER BY id')]
+        for n in range(tasks):
+            content = fake_content(rng, content_size) if content_size else ""
+            cur.execute(
+                'INSERT INTO tasks (category_id, name, content, important, last_modified, content_hash, rank) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (category_ids[n % categories], f"TASK {n + 1}", content, int(rng.random() < 0.1),
+                 now - rng.randint(0, 86400 * 365), planner_db.content_hash(content), (n + 1) * planner_db.RANK_GAP)
+            )
+            cur.execute('UPDATE tasks_fts SET body=? WHERE rowid=?', (planner_db.html_to_text(content), cur.lastrowid))
+    db.close()
+
+def current_rss():
+    # Resident set size in bytes, or None where it cannot be read cheaply
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    if sys.platform == "win32":
+        import ctypes
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD)] + [
+                (name, ctypes.c_size_t) for name in (
+                    "PeakWorkingSetSize", "WorkingSetSize", "QuotaPeakPagedPoolUsage", "QuotaPagedPoolUsage",
+                    "QuotaPeakNonPagedPoolUsage", "QuotaNonPagedPoolUsage", "PagefileUsage", "PeakPagefileUsage",
+                )
+            ]
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        handle = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+            return counters.WorkingSetSize
+    return None
+
+def summarize(samples_ms):
+    samples = sorted(samples_ms)
+    return {
+        "n": len(samples),
+        "mean_ms": round(statistics.fmean(samples), 3),
+        "median_ms": round(statistics.median(samples), 3),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+        "min_ms": round(samples[0], 3),
+        "max_ms": round(samples[-1], 3),
+    }
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return (time.perf_counter() - start) * 1000
+
+class EventCounter(QObject):
+    def __init__(self, *types):
+        super().__init__()
+        self.types = types
+        self.count = 0
+
+    def eventFilter(self, obj, event):
+        if event.type() in self.types:
+            self.count += 1
+        return False
+
+class PaintWatcher(QObject):
+    def __init__(self):
+        super().__init__()
+        self.painted = False
+
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Type.Paint:
+            self.painted = True
+        return False
+
+def process_events(app, rounds=3):
+    for _ in range(rounds):
+        app.processEvents()
+
+def close_window(window):
+    window.saved_this_session = True
+    window.close()
+
+class Benchmark:
+    def __init__(self, app, db_path, samples, rng):
+        self.app = app
+        self.db_path = db_path
+        self.settings_path = db_path + ".settings.json"
+        self.samples = samples
+        self.rng = rng
+        self.window = None
+        self.failures = []
+
+    def check(self, condition, message):
+        # A correctness check; failures are listed after the run and make it exit non-zero
+        if not condition:
+            self.failures.append(message)
+
+    def stored(self, task_id, column):
+        # A task column as another connection sees it, so only committed writes count
+        conn = sqlite3.connect(self.db_path)
+        try:
+            return conn.execute(f'SELECT {column} FROM tasks WHERE id=?', (task_id,)).fetchone()[0]
+        finally:
+            conn.close()
+
+    def stored_text(self, task_id):
+        return planner_db.content_to_text(planner_db.decode_content(self.stored(task_id, "content") or ""))
+
+    def task_sample(self):
+        task_ids = list(self.window.db.task_index)
+        return self.rng.sample(task_ids, min(self.samples, len(task_ids)))
+
+    def open_window(self):
+        # Constructor through the first paint, then until the category tree is filled in
+        watcher = PaintWatcher()
+        start = time.perf_counter()
+        window = main.MainWindow(self.db_path, self.settings_path)
+        window.installEventFilter(watcher)
+        window.show()
+        while not watcher.painted:
+            self.app.processEvents()
+        first_paint = (time.perf_counter() - start) * 1000
+        window.removeEventFilter(watcher)
+        while not window.tree_loaded:
+            self.app.processEvents()
+        tree_loaded = (time.perf_counter() - start) * 1000
+        process_events(self.app)
+        return window, round(first_paint, 3), round(tree_loaded, 3)
+
+    def startup(self):
+        if os.path.exists(self.settings_path):
+            os.remove(self.settings_path)
+        self.window, first_paint, tree_loaded = self.open_window()
+        return {"startup_to_first_paint_ms": first_paint, "startup_to_tree_ms": tree_loaded}
+
+    def restored_startup(self):
+        # Second start with settings.json pointing at the last task of the first session, which
+        # should come back with that task selected, the window where it was and the list scrolled as before
+        window = self.window
+        task_id = list(window.db.task_index)[-1]
+        window.select_task(task_id)
+        g = window.geometry()
+        window.setGeometry(g.x() + 17, g.y() + 11, g.width() - 20, g.height() - 10)
+        scroll_bar = window.task_list.verticalScrollBar()
+        scroll_bar.setValue(scroll_bar.maximum() // 2)
+        process_events(self.app)
+        geometry, scroll = window.geometry(), scroll_bar.value()
+        close_window(window)
+        process_events(self.app)
+        self.window, first_paint, tree_loaded = self.open_window()
+        self.check(self.window.selected_task == task_id, f"the second start selected task {self.window.selected_task}, not {task_id}")
+        self.check(self.window.geometry() == geometry, f"the second start placed the window at {self.window.geometry()}, not {geometry}")
+        restored = self.window.task_list.verticalScrollBar().value()
+        self.check(restored == scroll, f"the second start scrolled the task list to {restored}, not {scroll}")
+        return {"restored_startup_to_first_paint_ms": first_paint, "restored_startup_to_tree_ms": tree_loaded}
+
+    def load_categories(self):
+        window = self.window
+        samples = [timed(lambda: (window.load_categories(), window.task_list.viewport().repaint())) for _ in range(5)]
+        return {"load_categories": summarize(samples)}
+
+    def select_task(self):
+        window = self.window
+        cold, warm = [], []
+        for task_id in self.task_sample():
+            window.document_cache.clear()
+            cold.append(timed(lambda: window.select_task(task_id)))
+            window.select_task(window.selected_task)
+            warm.append(timed(lambda: (window.select_category(window.db.get_task(task_id)['category_id']), window.select_task(task_id))))
+            process_events(self.app, 1)
+        return {"select_task_cold": summarize(cold), "select_task_warm": summarize(warm)}
+
+    def keystroke_to_save(self):
+        # keystroke: key event handling; save: the debounced save body; commit: write-behind flush to disk
+        window = self.window
+        keystroke, save, commit = [], [], []
+        for task_id in self.task_sample():
+            window.select_task(task_id)
+            typed = self.stored_text(task_id).count("x")
+            window.task_content.moveCursor(window.task_content.textCursor().MoveOperation.End)
+            keystroke.append(timed(lambda: QTest.keyClick(window.task_content, Qt.Key.Key_X)))
+            window.save_content_timer.stop()
+            save.append(timed(window.save_task_content_actual))
+            commit.append(timed(window.db.writer.flush))
+            self.check(self.stored_text(task_id).count("x") == typed + 1, f"a keystroke in task {task_id} was not saved")
+        return {
+            "keystroke": summarize(keystroke),
+            "save_task_content": summarize(save),
+            "write_behind_commit": summarize(commit),
+        }
+
+    def star_toggle(self):
+        window = self.window
+        samples = []
+        for task_id in self.task_sample():
+            important = self.stored(task_id, "important")
+            samples.append(timed(lambda: (window.toggle_task_important(task_id), self.app.processEvents())))
+            self.check(self.stored(task_id, "important") == int(not important), f"starring task {task_id} was not saved")
+        return {"star_toggle": summarize(samples)}
+
+    def rename(self):
+        window = self.window
+        model = window.task_model
+        samples = []
+        for n, task_id in enumerate(self.task_sample()):
+            index = model.index(model.task_row(task_id))
+            samples.append(timed(lambda: (model.setData(index, f"RENAMED {n}"), self.app.processEvents())))
+            self.check(self.stored(task_id, "name") == f"RENAMED {n}", f"renaming task {task_id} was not saved")
+        return {"rename": summarize(samples)}
+
+    def search(self):
+        # Typing a query into the search box through to its results on screen, debounce included;
+        # every task is named "TASK n", so the first query always finds some
+        window = self.window
+        replies = []
+        def record(generation, results):
+            replies.append(generation)
+        window.search_worker.results_ready.connect(record)
+        samples, found = [], []
+        for query in ["task"] + self.rng.sample(WORDS, min(self.samples, 5)):
+            window.search_box.clear()
+            while window.search_timer.isActive():
+                self.app.processEvents()
+            generation = window.search_generation
+            start = time.perf_counter()
+            QTest.keyClicks(window.search_box, query)
+            deadline = start + 10
+            while not (replies and replies[-1] > generation) and time.perf_counter() < deadline:
+                self.app.processEvents()
+            process_events(self.app, 1)
+            samples.append((time.perf_counter() - start) * 1000)
+            found.append(window.search_results.count())
+        window.search_worker.results_ready.disconnect(record)
+        self.check(found[0] > 0, "search for 'task' rendered no results")
+        if found[0]:
+            item = window.search_results.item(0)
+            label = window.search_results.itemWidget(item)
+            self.check(label is not None and "TASK" in label.text(), "search result row has no rendered label")
+            window.open_search_result(item)
+            self.check(window.selected_task == item.data(Qt.ItemDataRole.UserRole), "clicking a search result did not open its task")
+        window.search_box.clear()
+        while window.search_timer.isActive() or window.search_results.isVisible():
+            self.app.processEvents()
+        return {"search_to_results": summarize(samples), "search_results": found[0]}
+
+    def large_note(self):
+        # Opening a multi-megabyte note: time until select_task returns, until the document is
+        # on screen, and the longest the event loop went without a turn in between
+        window = self.window
+        task_ids = list(window.db.task_index)
+        task_id = task_ids[0]
+        window.db.update_task_content(task_id, fake_content(self.rng, LARGE_NOTE_SIZE))
+        window.db.writer.flush()
+        window.document_cache.discard(task_id)
+        window.select_task(task_ids[-1])
+        start = time.perf_counter()
+        window.select_task(task_id)
+        returned = last = time.perf_counter()
+        stall = 0
+        while window.current_document is window.loading_document:
+            self.app.processEvents()
+            now = time.perf_counter()
+            stall, last = max(stall, now - last), now
+        return {
+            "large_note_select_ms": round((returned - start) * 1000, 3),
+            "large_note_loaded_ms": round((last - start) * 1000, 3),
+            "large_note_max_stall_ms": round(stall * 1000, 3),
+        }
+
+    def revisions(self):
+        # A note with 100 archived edits: cost to record each one, worst rebuild, and stored size
+        window = self.window
+        conn = window.db.conn
+        task_id = list(window.db.task_index)[-1]
+        content = fake_content(self.rng, 20000)
+        record, stored = [], 0
+        for n in range(100):
+            lines = content.split("\n")
+            lines.insert(self.rng.randrange(len(lines)), f"<p>edit {n}</p>")
+            content = "\n".join(lines)
+            record.append(timed(lambda: planner_db.record_revision(conn, task_id, content, n, n)))
+        conn.commit()
+        revision_ids = [row[0] for row in conn.execute('SELECT id FROM task_revisions WHERE task_id=?', (task_id,))]
+        load = [timed(lambda: planner_db.load_revision(conn, revision_id)) for revision_id in revision_ids]
+        stored, raw = conn.execute('SELECT SUM(LENGTH(data)), SUM(size) FROM task_revisions WHERE task_id=?', (task_id,)).fetchone()
+        conn.execute('DELETE FROM task_revisions WHERE task_id=?', (task_id,))
+        conn.commit()
+        return {
+            "revision_record": summarize(record),
+            "revision_load": summarize(load),
+            "revision_compression_ratio": round(raw / stored, 1),
+        }
+
+    def bulk(self):
+        # Context menu actions on up to 1000 selected tasks, one transaction and one model reset each
+        window = self.window
+        task_ids = list(window.db.task_index)[:1000]
+        results = {"bulk_tasks": len(task_ids)}
+        results["bulk_star_ms"] = round(timed(lambda: window.set_tasks_important(task_ids, 1)), 3)
+        results["bulk_unstar_ms"] = round(timed(lambda: window.set_tasks_important(task_ids, 0)), 3)
+        before = set(window.db.task_index)
+        results["bulk_duplicate_ms"] = round(timed(lambda: window.duplicate_tasks(task_ids)), 3)
+        copies = [task_id for task_id in window.db.task_index if task_id not in before]
+        results["bulk_delete_ms"] = round(timed(lambda: window.delete_tasks(copies)), 3)
+        return results
+
+    def reorder(self):
+        # Drag-and-drop moves: to random spots, then repeatedly into the same gap until it has to be
+        # renumbered. Rows written per move should stay at one except for those rebalances.
+        window = self.window
+        model = window.task_model
+        conn = window.db.conn
+        move, rows = [], []
+        def drop(task_id, cat_id, before):
+            changes = conn.total_changes
+            move.append(timed(lambda: (window.move_task_rows([task_id], cat_id, before), self.app.processEvents())))
+            # The change_log triggers write one row per updated task
+            rows.append((conn.total_changes - changes) // 2)
+            tasks = model.category_tasks[cat_id]
+            if before is not None and before != task_id and window.db.get_task(before)['important'] == window.db.get_task(task_id)['important']:
+                self.check(tasks.index(task_id) + 1 == tasks.index(before), f"task {task_id} did not land before task {before}")
+        for task_id in self.task_sample():
+            cat_id = self.rng.choice(model.category_ids)
+            tasks = model.category_tasks[cat_id]
+            drop(task_id, cat_id, self.rng.choice(tasks) if tasks else None)
+        cat_id = window.db.get_task(task_id)['category_id']
+        tasks = [tid for tid in model.category_tasks[cat_id] if window.db.get_task(tid)['important'] == 0]
+        if len(tasks) > 2:
+            anchor, moving = tasks[1], tasks[-2:]
+            for n in range(self.samples):
+                drop(moving[n % 2], cat_id, anchor)
+                anchor = moving[n % 2]
+        category_samples = []
+        for _ in range(min(self.samples, 20)):
+            cat_id = self.rng.choice(model.category_ids)
+            before = self.rng.choice(model.category_ids + [None])
+            category_samples.append(timed(lambda: (window.move_category(cat_id, before), self.app.processEvents())))
+        # Dropped on the upper half of its own header, a category stays put and nothing is written
+        cat_id = self.rng.choice(model.category_ids)
+        order, changes = list(model.category_ids), conn.total_changes
+        window.on_rows_dropped([(main.ROW_CATEGORY, cat_id)], model.category_row(cat_id), False)
+        self.app.processEvents()
+        self.check(model.category_ids == order and conn.total_changes == changes,
+            f"category {cat_id} dropped on itself moved or wrote its rank")
+        rows_per_category = {cat_id: list(model.category_tasks[cat_id]) for cat_id in model.category_ids}
+        window.db.load_index()
+        window.load_categories()
+        reloaded = {cat_id: list(model.category_tasks[cat_id]) for cat_id in model.category_ids}
+        matches_reload = rows_per_category == reloaded and list(rows_per_category) == list(reloaded)
+        self.check(matches_reload, "the task list after drag-and-drop moves differs from a full reload")
+        self.check(statistics.median(rows) == 1, "most drag-and-drop moves wrote more than one row")
+        return {
+            "reorder_move": summarize(move),
+            "reorder_category": summarize(category_samples),
+            "reorder_rows_updated_max": max(rows),
+            "reorder_rebalances": sum(1 for n in rows if n > 1),
+            "reorder_matches_reload": int(matches_reload),
+        }
+
+    def attachments(self):
+        # Paste images into a note, then type and autosave: the saved HTML should stay text-sized.
+        # Reopening the note should not read any image until it is painted.
+        window = self.window
+        task_id = self.task_sample()[0]
+        window.select_task(task_id)
+        window.task_content.moveCursor(window.task_content.textCursor().MoveOperation.End)
+        conn = window.db.conn
+        def attachment_rows():
+            return conn.execute('SELECT COUNT(*) FROM attachments').fetchone()[0]
+        rows_before = attachment_rows()
+        paste, mimes = [], []
+        for n in range(ATTACHMENT_IMAGES):
+            # Speckled so the PNG does not compress to nothing
+            image = QImage(800, 600, QImage.Format.Format_RGB32)
+            image.fill(QColor(n * 30 % 256, 128, 200))
+            for y in range(0, 600, 4):
+                for x in range(0, 800, 4):
+                    image.setPixelColor(x, y, QColor(self.rng.randrange(256), y % 256, x % 256))
+            mime = QMimeData()
+            mime.setImageData(image)
+            paste.append(timed(lambda: window.task_content.insertFromMimeData(mime)))
+            mimes.append(mime)
+        # The same image again is stored once however many times it is pasted
+        window.task_content.insertFromMimeData(mimes[0])
+        self.check(attachment_rows() == rows_before + ATTACHMENT_IMAGES, "a pasted image was stored twice")
+        save = []
+        for _ in range(self.samples):
+            QTest.keyClick(window.task_content, Qt.Key.Key_X)
+            window.save_content_timer.stop()
+            save.append(timed(lambda: (window.save_task_content_actual(), window.db.writer.flush())))
+        content = window.db.get_task_content(task_id)
+        references = re.findall(rf'{planner_db.ATTACHMENT_SCHEME}:(\d+)', planner_db.content_to_html(content))
+        self.check(len(references) == ATTACHMENT_IMAGES + 1 and len(set(references)) == ATTACHMENT_IMAGES,
+                   "the saved note does not reference each pasted image by its attachment")
+        inline = planner_db.inline_attachments(conn, content)
+        # Exports embed the images; importing them back finds the same attachments
+        self.check(planner_db.extract_data_uris(conn, inline) == content, "embedded images did not import back to the same attachments")
+        # Finding them again renews their paste time, which store_attachment() leaves to its caller to commit
+        conn.commit()
+        self.check(attachment_rows() == rows_before + ATTACHMENT_IMAGES, "re-importing embedded images added attachments")
+        window.document_cache.discard(task_id)
+        reads = []
+        get_attachment = window.db.get_attachment
+        window.db.get_attachment = lambda attachment_id: (reads.append(attachment_id), get_attachment(attachment_id))[1]
+        try:
+            start = time.perf_counter()
+            document = main.build_task_document(content, window.task_content.font())
+            document.documentLayout().documentSize()
+            opened = (time.perf_counter() - start) * 1000
+        finally:
+            del window.db.get_attachment
+        self.check(not reads, "opening a note read its images before they were painted")
+        return {
+            "attachment_paste": summarize(paste),
+            "attachment_autosave": summarize(save),
+            "attachment_note_kb": round(len(content) / 1024, 1),
+            "attachment_inline_note_kb": round(len(inline) / 1024, 1),
+            "attachment_open_ms": round(opened, 3),
+            "attachment_reads_on_open": len(reads),
+        }
+
+    def window_resize(self):
+        # Drags the bottom-right corner with a 250 Hz mouse while a long note is open. Offscreen has
+        # no system resize, so this is the hand-followed path: geometry changes should come once per
+        # frame, not once per mouse move, and the note should be rewrapped once, after the drag.
+        window = self.window
+        window.select_task(list(window.db.task_index)[0])
+        while window.current_document is window.loading_document or window.resize_settle_timer.isActive():
+            self.app.processEvents()
+        process_events(self.app)
+        resizes = EventCounter(QEvent.Type.Resize)
+        window.installEventFilter(resizes)
+        # Wrapping widths the note is laid out at; the layout also reports growth at a fixed width
+        # while it works through a long note in the background, which is not a rewrap. Expect one
+        # as the drag starts, before the editor's wrap width is pinned, and one once it settles.
+        widths = []
+        document = window.task_content.document()
+        def record_width(size):
+            widths.append(size.width())
+        document.documentLayout().documentSizeChanged.connect(record_width)
+        initial = document.textWidth()
+        def mouse(kind, pos, buttons):
+            local = QPointF(pos)
+            event = QMouseEvent(kind, local, QPointF(window.mapToGlobal(pos)), Qt.MouseButton.LeftButton, buttons, Qt.KeyboardModifier.NoModifier)
+            QApplication.sendEvent(window, event)
+        corner = QPoint(window.width() - 2, window.height() - 2)
+        start = time.perf_counter()
+        mouse(QEvent.Type.MouseButtonPress, corner, Qt.MouseButton.LeftButton)
+        moves = []
+        for n in range(RESIZE_DRAG_MOVES):
+            moves.append(timed(lambda: mouse(QEvent.Type.MouseMove, corner + QPoint(n, n // 2), Qt.MouseButton.LeftButton)))
+            deadline = time.perf_counter() + RESIZE_DRAG_MOVE_MS / 1000
+            while time.perf_counter() < deadline:
+                self.app.processEvents()
+        mouse(QEvent.Type.MouseButtonRelease, corner + QPoint(RESIZE_DRAG_MOVES, RESIZE_DRAG_MOVES // 2), Qt.MouseButton.NoButton)
+        dragged = (time.perf_counter() - start) * 1000
+        during = set(widths) - {initial}
+        while window.resize_settle_timer.isActive():
+            self.app.processEvents()
+        process_events(self.app)
+        window.removeEventFilter(resizes)
+        document.documentLayout().documentSizeChanged.disconnect(record_width)
+        # The frame timer fires at most once per frame, plus the release applies the last position
+        frames = int(dragged // main.RESIZE_FRAME_MS) + 1
+        self.check(0 < resizes.count <= frames,
+                   f"the drag changed the geometry {resizes.count} times in {frames} frames and {RESIZE_DRAG_MOVES} mouse moves")
+        rewraps_after = len(set(widths) - during - {initial})
+        self.check(len(during) <= 1 and rewraps_after <= 1,
+                   f"the note was rewrapped {len(during)} times during the drag and {rewraps_after} after it")
+        return {
+            "resize_mouse_moves": RESIZE_DRAG_MOVES,
+            "resize_geometry_changes": resizes.count,
+            "resize_note_rewraps_during_drag": len(during),
+            "resize_note_rewraps_after": rewraps_after,
+            "resize_drag_ms": round(dragged, 3),
+            "resize_move_event": summarize(moves),
+        }
+
+    def transfer(self):
+        # Whole-planner JSON Lines round trip into a fresh database; the UI is not involved
+        export_path = self.db_path + ".jsonl"
+        import_path = self.db_path + ".import.db"
+        self.window.db.writer.flush()
+        results = {"export_jsonl_ms": round(timed(lambda: planner_db.export_jsonl(self.db_path, export_path)), 3)}
+        planner_db.CategoryTaskDB(import_path).close()
+        results["import_jsonl_ms"] = round(timed(
+            lambda: planner_db.import_records(import_path, planner_db.iter_jsonl_records(export_path))
+        ), 3)
+        for path in (export_path, import_path, import_path + "-wal", import_path + "-shm"):
+            if os.path.exists(path):
+                os.remove(path)
+        return results
+
+    def cli(self):
+        # The command line on a copy of the planner's database: process start to exit for a
+        # read, and one batch of adds in a single transaction; it must never load Qt
+        self.window.db.writer.flush()
+        cli_path = self.db_path + ".cli.db"
+        copy = sqlite3.connect(cli_path)
+        self.window.db.conn.backup(copy)
+        copy.close()
+        script = os.path.abspath(main.__file__)
+        def run(*args, stdin=None, check=True):
+            return subprocess.run(
+                [sys.executable, script, *args, "--db", cli_path],
+                input=stdin, capture_output=True, text=True, check=check,
+            )
+        def task_count():
+            conn = sqlite3.connect(cli_path)
+            try:
+                return conn.execute('SELECT COUNT(*) FROM tasks').fetchone()[0]
+            finally:
+                conn.close()
+        startup = [timed(lambda: run("list")) for _ in range(min(self.samples, 10))]
+        probe = subprocess.run(
+            [sys.executable, "-c", "import sys, planner_cli; planner_cli.main(['list', '--db', sys.argv[1]]); "
+             "print('PyQt6' in sys.modules, file=sys.stderr)", cli_path],
+            cwd=os.path.dirname(script), capture_output=True, text=True, check=True,
+        )
+        lines = "".join(f'add "CLI bench" "Scripted task {n}"\n' for n in range(CLI_BATCH_ADDS))
+        before = task_count()
+        batch = timed(lambda: run("batch", stdin=lines))
+        self.check(task_count() == before + CLI_BATCH_ADDS, "cli batch did not add every task")
+        # A failing line rolls back the lines before it and prints nothing but the error
+        failed = run("batch", stdin='add "CLI bench" "Rolled back"\nstar 999999999\n', check=False)
+        self.check(failed.returncode != 0 and not failed.stdout, "cli batch with a failing line did not fail cleanly")
+        self.check(task_count() == before + CLI_BATCH_ADDS, "cli batch with a failing line was not rolled back")
+        imports_qt = probe.stderr.strip().endswith("True")
+        self.check(not imports_qt, "the command line imported PyQt6")
+        for path in (cli_path, cli_path + "-wal", cli_path + "-shm"):
+            if os.path.exists(path):
+                os.remove(path)
+        return {
+            "cli_list": summarize(startup),
+            "cli_batch_adds": CLI_BATCH_ADDS,
+            "cli_batch_ms": round(batch, 3),
+            "cli_imports_qt": int(imports_qt),
+        }
+
+    def backup(self):
+        # Type and save while a scheduled backup copies the database in the background;
+        # the event loop should never wait on the copy
+        window = self.window
+        task_ids = list(window.db.task_index)
+        # The first task holds the large_note scenario's note
+        window.select_task(task_ids[len(task_ids) // 2])
+        window.task_content.moveCursor(window.task_content.textCursor().MoveOperation.End)
+        keystroke, save = [], []
+        start = last = time.perf_counter()
+        stall = 0
+        window.start_backup()
+        while window.transfer_thread is not None:
+            keystroke.append(timed(lambda: QTest.keyClick(window.task_content, Qt.Key.Key_X)))
+            window.save_content_timer.stop()
+            save.append(timed(lambda: (window.save_task_content_actual(), window.save_all())))
+            self.app.processEvents()
+            now = time.perf_counter()
+            stall, last = max(stall, now - last), now
+        results = {
+            "backup_total_ms": round((last - start) * 1000, 3),
+            "backup_max_stall_ms": round(stall * 1000, 3),
+            "backup_keystroke": summarize(keystroke),
+            "backup_save": summarize(save),
+        }
+        folder = window.backup_folder()
+        for path in planner_db.list_backups(folder):
+            os.remove(path)
+        if not os.listdir(folder):
+            os.rmdir(folder)
+        return results
+
+    def remote_changes(self):
+        # A second process renames a task while this window types into another: how long until
+        # each rename reaches the tree, whether any write hit a lock, and what an idle poll costs
+        window = self.window
+        task_ids = list(window.db.task_index)
+        window.select_task(task_ids[len(task_ids) // 2])
+        window.task_content.moveCursor(window.task_content.textCursor().MoveOperation.End)
+        idle = [timed(window.apply_remote_changes) for _ in range(self.samples)]
+        target = task_ids[-1]
+        writer = subprocess.Popen(
+            [sys.executable, "-c", REMOTE_WRITER, self.db_path, str(target), str(REMOTE_EDITS)],
+            cwd=os.path.dirname(os.path.abspath(main.__file__)),
+        )
+        latency, seen, last = [], window.db.get_task(target)['name'], None
+        deadline = time.perf_counter() + 60
+        # Until the other process has exited and its last rename has arrived
+        while seen != last and time.perf_counter() < deadline:
+            if last is None and writer.poll() is not None:
+                last = self.stored(target, "name")
+            QTest.keyClick(window.task_content, Qt.Key.Key_X)
+            self.app.processEvents()
+            name = window.db.get_task(target)['name']
+            if name != seen and name.startswith("REMOTE "):
+                latency.append((time.time() - float(name.split()[1])) * 1000)
+                seen = name
+            time.sleep(0.005)
+        writer.wait()
+        window.flush_pending_content()
+        window.db.writer.flush()
+        model = window.task_model
+        shown = model.data(model.index(model.task_row(target), 0))
+        self.check(writer.returncode == 0, f"the second process exited with status {writer.returncode}")
+        self.check(window.db.writer.last_error is None, f"a write failed alongside the second process: {window.db.writer.last_error}")
+        self.check(latency, "no rename from the second process reached this window")
+        self.check(shown == last, f"the tree shows {shown!r}, not the second process's last rename {last!r}")
+        return {
+            "remote_poll_idle": summarize(idle),
+            "remote_change_latency": summarize(latency),
+            # Renames landing within one poll interval show up as the last of them
+            "remote_changes_coalesced": REMOTE_EDITS - len(latency),
+            "remote_lock_errors": int(window.db.writer.last_error is not None),
+        }
+
+    def profiler_overhead(self):
+        # The select_task and keystroke_to_save scenarios again with every profiled call wrapped
+        profiler = main.Profiler(self.db_path + ".profile.json")
+        profiler.install(main.profiled_targets())
+        try:
+            results = {**self.select_task(), **self.keystroke_to_save()}
+        finally:
+            profiler.uninstall()
+        return {f"profiled_{key}": value for key, value in results.items()}
+
+    def compact_content(self):
+        # The same notes stored as Qt HTML and as text plus format runs: bytes on disk, time to
+        # build the editor's document from them and to serialize it back. Then the idle conversion
+        # of the database's HTML notes, slice by slice.
+        window = self.window
+        font = window.task_content.font()
+        window.flush_pending_content()
+        window.db.writer.flush()
+        def stored_bytes(content):
+            stored = planner_db.encode_content(content)
+            return len(stored) if isinstance(stored, bytes) else len(stored.encode("utf-8"))
+        def measure(notes):
+            result = {}
+            for kind in ("html", "compact"):
+                sizes, load, save = [], [], []
+                for html, compact in notes:
+                    content = html if kind == "html" else compact
+                    sizes.append(stored_bytes(content))
+                    document = None
+                    def build():
+                        nonlocal document
+                        document = main.build_task_document(content, font)
+                    load.append(timed(build))
+                    save.append(timed(document.toHtml if kind == "html" else lambda: main.document_content(document)))
+                    if kind == "compact":
+                        # Text plus format runs round-trip exactly through the editor and through storage
+                        self.check(main.document_content(document) == content, "a compact note changed on its way through the editor")
+                        self.check(planner_db.content_to_text(content) == document.toPlainText(), "a compact note's plain text differs from its document")
+                        self.check(planner_db.decode_content(planner_db.encode_content(content)) == content, "a compact note changed on its way through storage")
+                result[f"{kind}_bytes"] = sum(sizes)
+                result[f"{kind}_load"] = summarize(load)
+                result[f"{kind}_save"] = summarize(save)
+            return result
+        notes = []
+        for task_id in self.task_sample():
+            html = window.db.get_task_content(task_id)
+            compact = None if planner_db.is_compact(html) else main.compact_equivalent(html, font)
+            if compact is not None:
+                notes.append((html, compact))
+        large = fake_content(self.rng, LARGE_NOTE_SIZE)
+        results = {"compact_notes": measure(notes), "compact_long_note": measure([(large, main.compact_equivalent(large, font))])}
+        conn = window.db.conn
+        def html_left():
+            return conn.execute(f'SELECT COUNT(*) FROM tasks WHERE {planner_db.HTML_CONTENT_WHERE}').fetchone()[0]
+        def content_bytes():
+            return conn.execute('SELECT COALESCE(SUM(length(CAST(content AS BLOB))), 0) FROM tasks').fetchone()[0]
+        before, bytes_before = html_left(), content_bytes()
+        slices = []
+        window.convert_timer.start()
+        while window.convert_timer.isActive() and before - html_left() < COMPACT_CONVERT_NOTES:
+            slices.append(timed(window.convert_html_notes))
+        window.convert_timer.stop()
+        converted = before - html_left()
+        self.check(converted or not before, "the idle conversion converted no HTML notes")
+        results.update({
+            "compact_notes_converted": converted,
+            "compact_html_notes_left": html_left(),
+            "compact_content_bytes_before": bytes_before,
+            "compact_content_bytes_after": content_bytes(),
+            "compact_notes_per_second": round(converted / (sum(slices) / 1000), 1) if slices and sum(slices) else 0,
+            "compact_conversion_slice": summarize(slices),
+        })
+        return results
+
+    def maintenance(self):
+        # Space freed by deleted tasks coming back: first on a copy laid out as older versions created
+        # it (the Compact database conversion, then bounded vacuum steps and statistics), then in the
+        # window, whose worker runs the steps and statistics once input has been idle
+        window = self.window
+        window.flush_pending_content()
+        window.db.writer.flush()
+        path = self.db_path + ".maintenance.db"
+        src, conn = sqlite3.connect(self.db_path), sqlite3.connect(path)
+        src.backup(conn)
+        src.close()
+        conn.execute('PRAGMA auto_vacuum=NONE')
+        conn.execute('VACUUM')
+        conn.execute('DELETE FROM tasks WHERE id % 2 = 0')
+        conn.commit()
+        converted = []
+        results = {
+            "maintenance_file_bytes_before": planner_db.database_stats(conn)['file_bytes'],
+            "maintenance_convert_ms": round(timed(lambda: converted.append(planner_db.convert_auto_vacuum(path))), 3),
+        }
+        self.check(converted == [True] and planner_db.database_stats(conn)['auto_vacuum'] == "incremental",
+                   "converting a database without auto_vacuum did not turn on incremental vacuum")
+        self.check(planner_db.convert_auto_vacuum(path) is False, "converting an already converted database rebuilt it again")
+        # A contiguous run of rows, so whole pages empty out
+        conn.execute('DELETE FROM tasks WHERE id IN (SELECT id FROM tasks ORDER BY id LIMIT (SELECT COUNT(*) / 2 FROM tasks))')
+        conn.commit()
+        results["maintenance_free_pages"] = conn.execute('PRAGMA freelist_count').fetchone()[0]
+        steps, freed = [], []
+        while conn.execute('PRAGMA freelist_count').fetchone()[0]:
+            steps.append(timed(lambda: freed.append(planner_db.incremental_vacuum_step(conn))))
+            if not freed[-1][0]:
+                break
+        self.check(all(0 < n <= planner_db.VACUUM_PAGES_PER_STEP for n, _ in freed),
+                   "a vacuum step freed no pages or more than its share")
+        self.check(conn.execute('PRAGMA freelist_count').fetchone()[0] == 0, "vacuum steps left free pages behind")
+        if steps:
+            results["maintenance_vacuum_step"] = summarize(steps)
+        results["maintenance_analyze_ms"] = round(timed(lambda: planner_db.optimize_database(conn)), 3)
+        self.check(conn.execute("SELECT COUNT(*) FROM sqlite_stat1 WHERE tbl='tasks'").fetchone()[0] > 0,
+                   "the first optimize gathered no statistics for tasks")
+        results["maintenance_optimize_ms"] = round(timed(lambda: planner_db.optimize_database(conn)), 3)
+        stats = []
+        results["maintenance_stats_ms"] = round(timed(lambda: stats.append(planner_db.database_stats(conn))), 3)
+        self.check(stats[0]['rows']['tasks'] == conn.execute('SELECT COUNT(*) FROM tasks').fetchone()[0]
+                   and stats[0]['free_pages'] == 0, "database statistics disagree with the database")
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        results["maintenance_file_bytes_after"] = planner_db.database_stats(conn)['file_bytes']
+        self.check(results["maintenance_file_bytes_after"] < results["maintenance_file_bytes_before"] or not results["maintenance_free_pages"],
+                   "the database file did not shrink after its deleted tasks were reclaimed")
+        conn.close()
+        for name in (path, path + "-wal", path + "-shm"):
+            if os.path.exists(name):
+                os.remove(name)
+        task_ids = list(window.db.task_index)
+        # Away from the large_note scenario's note, whose layout would otherwise dominate the stalls
+        window.select_task(task_ids[len(task_ids) // 2])
+        before = set(task_ids)
+        window.duplicate_tasks(task_ids[:MAINTENANCE_DELETED_TASKS])
+        window.delete_tasks([task_id for task_id in window.db.task_index if task_id not in before])
+        process_events(self.app)
+        free_before = window.db.conn.execute('PRAGMA freelist_count').fetchone()[0]
+        # Each job is handed over the way the idle timer does it: the UI thread's share is the
+        # call that posts it, the rest runs on the worker until its reply comes back
+        jobs, calls, round_trips = [], [], []
+        def record(kind, free):
+            jobs.append((kind, free))
+        window.maintenance_worker.maintained.connect(record)
+        window.maintenance_timer.stop()
+        window.last_optimize = window.last_sweep = None
+        start = time.perf_counter()
+        while not (jobs and jobs[-1] == ("", 0)) and time.perf_counter() - start < MAINTENANCE_TIMEOUT_S:
+            window.idle_monitor.last_input = time.monotonic() - main.MAINTENANCE_IDLE_MS / 1000
+            sent = time.perf_counter()
+            call = timed(window.run_maintenance)
+            if not window.maintenance_busy:
+                self.app.processEvents()
+                continue
+            calls.append(call)
+            while window.maintenance_busy:
+                self.app.processEvents()
+            round_trips.append((time.perf_counter() - sent) * 1000)
+        window.maintenance_worker.maintained.disconnect(record)
+        window.maintenance_timer.start()
+        kinds = {kind for kind, _ in jobs}
+        self.check(jobs and jobs[-1] == ("", 0) and kinds == {"attachments", "vacuum", "optimize", ""} - ({"vacuum"} if not free_before else set()),
+                   f"idle maintenance did not sweep attachments, vacuum, optimize and settle (jobs: {sorted(kinds)})")
+        self.check(window.db.conn.execute('PRAGMA freelist_count').fetchone()[0] == 0, "idle maintenance left free pages behind")
+        self.check(window.maintenance_error is None, f"idle maintenance failed: {window.maintenance_error}")
+        results.update({
+            "maintenance_idle_jobs": len(jobs) - 1,
+            "maintenance_ui_call": summarize(calls),
+            "maintenance_job": summarize(round_trips),
+        })
+        return results
+
+    def soak(self):
+        # Repeated selections must not grow the object tree or memory
+        window = self.window
+        task_ids = list(window.db.task_index)[:50]
+        if not task_ids:
+            return {}
+        def objects():
+            return len(window.findChildren(QObject))
+        for task_id in task_ids:
+            window.select_task(task_id)
+        process_events(self.app)
+        objects_before, rss_before = objects(), current_rss()
+        for n in range(SOAK_SELECTIONS):
+            window.select_task(task_ids[n % len(task_ids)])
+            if n % 100 == 0:
+                window.select_category(window.db.get_task(task_ids[0])['category_id'])
+            self.app.processEvents()
+        objects_after, rss_after = objects(), current_rss()
+        result = {
+            "selections": SOAK_SELECTIONS,
+            "qobjects_before": objects_before,
+            "qobjects_after": objects_after,
+        }
+        self.check(objects_after - objects_before <= SOAK_MAX_OBJECT_GROWTH,
+            f"soak grew the object tree from {objects_before} to {objects_after} QObjects")
+        if rss_before is not None:
+            result["rss_before_mb"] = round(rss_before / 2**20, 2)
+            result["rss_after_mb"] = round(rss_after / 2**20, 2)
+            self.check(result["rss_after_mb"] - result["rss_before_mb"] <= SOAK_MAX_RSS_GROWTH_MB,
+                f"soak grew memory from {result['rss_before_mb']} to {result['rss_after_mb']} MB")
+        return {"soak": result}
+
+    def memory(self):
+        rss = current_rss()
+        return {"rss_mb": round(rss / 2**20, 2)} if rss is not None else {}
+
+    def run(self):
+        results = {}
+        for name, keys in SCENARIOS:
+            result = getattr(self, name)()
+            self.check(set(result) <= set(keys), f"{name} reports keys SCENARIOS does not list: {sorted(set(result) - set(keys))}")
+            results.update(result)
+        close_window(self.window)
+        process_events(self.app)
+        return results
+
+def flatten(results, prefix=""):
+    # {"a": {"mean_ms": 1}} -> {"a.mean_ms": 1}, for comparisons
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)):
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+def reported(results):
+    # (key, number) pairs for the keys SCENARIOS lists, in that order
+    for _, keys in SCENARIOS:
+        for key in keys:
+            value = results.get(key)
+            if isinstance(value, dict):
+                for name, number in flatten(value, f"{key}.").items():
+                    if name.rpartition(".")[2] not in SUMMARY_FIELDS:
+                        yield name, number
+            elif value is not None:
+                yield key, value
+
+def compare(previous_path, report):
+    with open(previous_path, encoding="utf-8") as f:
+        previous = json.load(f)
+    old_runs = {run["tasks"]: flatten(run["results"]) for run in previous.get("runs", [])}
+    for run in report["runs"]:
+        old = old_runs.get(run["tasks"])
+        if not old:
+            continue
+        print(f"\n{run['tasks']} tasks vs {previous_path}")
+        for key, value in flatten(run["results"]).items():
+            if key in old and old[key] and (key.endswith("_ms") or key.endswith("_mb")):
+                change = (value - old[key]) / old[key] * 100
+                print(f"  {key:48} {old[key]:>10} -> {value:>10}  {change:+6.1f}%")
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Headless Shitty Planner benchmarks")
+    parser.add_argument("--scales", default=",".join(map(str, DEFAULT_SCALES)), help="comma separated task counts")
+    parser.add_argument("--tasks", type=int, help="single task count (overrides --scales)")
+    parser.add_argument("--categories", type=int, default=DEFAULT_CATEGORIES)
+    parser.add_argument("--content-size", type=int, default=DEFAULT_CONTENT_SIZE, help="characters of text per task")
+    parser.add_argument("--samples", type=int, default=DEFAULT_SAMPLES)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--db", help="database path to generate/use (default: a temp file per scale)")
+    parser.add_argument("--generate-only", action="store_true", help="just write the synthetic database")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", help="previous results file to diff against")
+    args = parser.parse_args(argv)
+
+    scales = [args.tasks] if args.tasks else [int(n) for n in args.scales.split(",") if n.strip()]
+    if args.generate_only:
+        path = args.db or planner_db.get_db_path() + ".bench"
+        for tasks in scales:
+            generate_database(path, args.categories, tasks, args.content_size, args.seed)
+        print(f"Wrote {path}")
+        return 0
+
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    app.setStyleSheet(main.APP_STYLESHEET)
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "qt": QT_VERSION_STR,
+        "pyqt": PYQT_VERSION_STR,
+        "platform": platform.platform(),
+        "qpa": os.environ.get("QT_QPA_PLATFORM"),
+        "categories": args.categories,
+        "content_size": args.content_size,
+        "samples": args.samples,
+        "runs": [],
+    }
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for tasks in scales:
+            db_path = args.db or os.path.join(tmp, f"bench_{tasks}.db")
+            start = time.perf_counter()
+            generate_database(db_path, args.categories, tasks, args.content_size, args.seed)
+            print(f"{tasks} tasks: generated in {time.perf_counter() - start:.1f}s", flush=True)
+            benchmark = Benchmark(app, db_path, args.samples, random.Random(args.seed))
+            results = benchmark.run()
+            report["runs"].append({"tasks": tasks, "results": results, "failures": benchmark.failures})
+            for key, value in reported(results):
+                print(f"  {key:48} {value}")
+            failures += [f"{tasks} tasks: {message}" for message in benchmark.failures]
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.output}")
+    if args.compare:
+        compare(args.compare, report)
+    for message in failures:
+        print(f"FAILED {message}", file=sys.stderr)
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
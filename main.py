@@ -1,16 +1,77 @@
 import sys
 import os
+import html
+import json
+import mimetypes
+import re
 import sqlite3
+import threading
+import time
+import traceback
+from bisect import bisect_right
+from collections import OrderedDict
+from inspect import Parameter, signature
+import planner_db
+from planner_db import (
+    BACKUP_GENERATIONS, COMPACT_PREFIX, REVISION_PAGE_SIZE, CategoryTaskDB, TransferCancelled, attachment_url,
+    backup_database, content_to_text, convert_auto_vacuum, database_stats, export_jsonl, export_markdown,
+    format_size, format_timestamp, fts_query, get_app_folder, get_db_path, import_records, incremental_vacuum_step,
+    is_compact, iter_jsonl_records, iter_markdown_records, list_backups, optimize_database, parse_attachment_url,
+    search_tasks, split_compact, sweep_attachments, text_to_content,
+)
+import planner_cli
+
+if __name__ == "__main__" and planner_cli.is_command(sys.argv[1:]):
+    # Scripting subcommands return before Qt is ever imported
+    sys.exit(planner_cli.main(sys.argv[1:]))
+
 from PyQt6.QtWidgets import (
-    QApplication, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel, QTextEdit, QScrollArea,
-    QListWidget, QListWidgetItem, QLineEdit, QFrame, QFileDialog, QMessageBox, QSizeGrip, QSizePolicy
+    QApplication, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel, QTextEdit,
+    QListWidget, QListWidgetItem, QLineEdit, QFrame, QFileDialog, QMessageBox, QSizeGrip, QSizePolicy,
+    QTableView, QHeaderView, QStyledItemDelegate, QStyle, QToolTip, QAbstractItemView, QMenu, QProgressDialog, QPlainTextEdit, QPlainTextDocumentLayout, QDialog
 )
-from PyQt6.QtGui import QIcon, QAction, QFont, QPainter, QColor, QPixmap, QTextCursor, QTextCharFormat, QKeySequence
-from PyQt6.QtCore import Qt, QSize, QRect, QTimer, QDateTime
+from PyQt6.QtGui import QIcon, QAction, QFont, QPainter, QColor, QTextCursor, QTextCharFormat, QKeySequence, QTextDocument, QPen, QTextDocumentFragment, QDrag, QImage, QTextImageFormat, QTextFormat
+from PyQt6.QtCore import Qt, QSize, QRect, QPoint, QTimer, QObject, QThread, pyqtSignal, QAbstractListModel, QModelIndex, QEvent, QMimeData, QUrl, QBuffer, QIODevice
 
 APP_NAME = "Shitty Planner"
-DB_FILENAME = "database.db"
 SETTINGS_FILENAME = "settings.json"
+CHANGE_POLL_MS = 1000  # how often other instances' commits are looked for
+SAVE_DEBOUNCE_MS = 500
+SAVE_DEBOUNCE_MAX_MS = 4000
+SAVE_DEBOUNCE_SMALL_DOC = 20000  # characters edited with the base debounce
+DOCUMENT_CACHE_MAX_COUNT = 16
+DOCUMENT_CACHE_MAX_BYTES = 64 * 1024 * 1024  # approximate, from the stored note size
+DOCUMENT_PREFETCH_NEIGHBOURS = 1  # tasks on each side of the selected one
+LARGE_NOTE_ASYNC_CHARS = 256 * 1024  # stored notes above this are built in chunks behind a placeholder
+LARGE_NOTE_CHUNK_CHARS = 64 * 1024  # characters built per event-loop turn, roughly 10-25 ms of HTML
+LARGE_NOTE_PLAIN_CHARS = 1024 * 1024  # in plain-text mode, notes above this open without rich layout
+CONTENT_CONVERT_DELAY_MS = 20000  # notes still stored as HTML start moving to the compact format this long after startup
+CONTENT_CONVERT_INTERVAL_MS = 200  # then a slice of them per interval while the editor is quiet
+CONTENT_CONVERT_BUDGET_MS = 10  # time spent converting per slice
+CONTENT_CONVERT_MAX_CHARS = 64 * 1024  # longer HTML notes take the compact format when they are next saved
+CONTENT_CONVERT_BATCH = 50  # task ids fetched per query
+SEARCH_DEBOUNCE_MS = 120
+REVISION_PRUNE_DELAY_MS = 30000  # expired revisions are dropped this long after startup
+BACKUP_FOLDER = "backups"  # next to database.db
+BACKUP_INTERVAL_HOURS = 24  # scheduled backup age; settings.json "backup_interval_hours" overrides it, 0 turns it off
+BACKUP_CHECK_MS = 10 * 60 * 1000  # how often the backup age is checked; the first check is BACKUP_STARTUP_DELAY_MS in
+BACKUP_STARTUP_DELAY_MS = 60000
+MAINTENANCE_IDLE_MS = 30000  # no keyboard or mouse input for this long before space is reclaimed or statistics refreshed
+MAINTENANCE_CHECK_MS = 15000  # how often idleness is checked while there is nothing to reclaim
+MAINTENANCE_STEP_MS = 250  # gap between jobs while there is still work, such as free pages left
+MAINTENANCE_BUSY_TIMEOUT_MS = 1000  # a step that cannot get the write lock this quickly waits for the next turn
+OPTIMIZE_INTERVAL_HOURS = 4  # query statistics are refreshed at most this often
+ATTACHMENT_SWEEP_INTERVAL_HOURS = 24  # images nothing refers to any more are looked for at most this often
+PROFILE_ENV = "PLANNER_PROFILE"  # =1 (or --profile) turns profiling on; any other value is the report path
+PROFILE_FILENAME = "profile.json"  # report written on exit, next to database.db
+PROFILE_STALL_MS = 100  # event-loop turns longer than this are recorded as stalls
+PROFILE_HEARTBEAT_MS = 20
+PROFILE_BUCKETS_MS = (0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000)  # histogram upper bounds
+PROFILE_MAX_STALLS = 200  # newest stalls kept in the report
+RESIZE_MARGIN = 6  # pixels along the frameless window's border that start a resize
+RESIZE_FRAME_MS = 16  # a hand-followed move or resize changes the geometry at most this often
+RESIZE_SETTLE_MS = 150  # the note is rewrapped to the new width once resize events stop this long
+TASK_LIST_ROW_HEIGHT = 42  # every left-panel row is the same height so the view never measures them
 ICON_PATH = os.path.join(os.path.dirname(__file__), "icons", "save.svg")
 STAR_ICON = os.path.join(os.path.dirname(__file__), "icons", "star_white.svg")
 STAR_FILLED_ICON = os.path.join(os.path.dirname(__file__), "icons", "star_white_filled.svg")
@@ -20,110 +81,93 @@ PAYPAL_ICON = os.path.join(os.path.dirname(__file__), "icons", "paypal.svg")
 BOOK_ICON = os.path.join(os.path.dirname(__file__), "icons", "book.svg")
 AMAZON_ICON = os.path.join(os.path.dirname(__file__), "icons", "amazon_a.svg")
 
-# Helper to get exe folder
-def get_app_folder():
-    return os.path.dirname(os.path.abspath(sys.argv[0]))
+# One stylesheet for the whole app, parsed once; widgets opt in with object names and the "role" property
+APP_STYLESHEET = """
+QFrame#leftPanel { background-color: #3A4352; border-radius: 10px; }
+QLabel#appTitle {
+    font-size: 24px; font-weight: bold; font-family: serif; color: #222; background: #EDEDED;
+    border: 3px solid #222; border-radius: 12px; padding: 2px 12px;
+}
+QPushButton[role="pill"], QLineEdit[role="pill"] {
+    background: #fff; color: #222; font-size: 18px; border-radius: 16px; border: 2px solid #222;
+    padding: 5px 0; margin: 2px 0; font-family: serif;
+}
+QPushButton[role="pill"]:hover { background: #d6d6d6; }
+QLineEdit[role="pill"] { padding-left: 16px; }
+QPushButton[role="icon"] { border: none; background: transparent; color: #222; font-size: 26px; font-weight: bold; }
+QLabel#profileOverlay {
+    color: #EDEDED; background: rgba(0, 0, 0, 190); border-radius: 8px; padding: 8px;
+    font-family: monospace; font-size: 11px;
+}
+QLabel#saveLabel {
+    color: white; font-weight: bold; background: #222; border-radius: 8px; padding: 2px 12px;
+    min-width: 0px; min-height: 0px;
+}
+QListWidget#searchResults { background: #fff; border: 2px solid #222; border-radius: 10px; }
+QLabel[role="searchResult"] { font-size: 13px; color: #222; padding: 4px 8px; }
+QTableView#taskList { background: transparent; border: none; }
+QTableView#taskList QScrollBar:vertical { background: transparent; width: 8px; margin: 0; border: none; }
+QTableView#taskList QScrollBar::handle:vertical { background: #EDEDED; border-radius: 4px; min-height: 24px; }
+QTableView#taskList QScrollBar::add-line, QTableView#taskList QScrollBar::sub-line { height: 0; border: none; }
+QTableView#taskList QScrollBar::add-page, QTableView#taskList QScrollBar::sub-page { background: none; }
+QFrame#rightPanel, QFrame#rightPanel QLabel {
+    background-color: #3A4352; border-radius: 14px; border: 3px solid #222;
+}
+QFrame#rightPanel[active="true"], QFrame#rightPanel[active="true"] QLabel { background-color: #fff; }
+QFrame#rightPanel QLabel#taskTitle { font-size: 24px; font-weight: bold; }
+QFrame#rightPanel QLabel#lastModified { color: #888; font-size: 10px; }
+QPushButton#historyButton { color: #888; font-size: 10px; text-decoration: underline; background: transparent; border: none; }
+QPushButton#historyButton:hover { color: #222; }
+QFrame#rightPanel QTextEdit#taskContent, QFrame#rightPanel QPlainTextEdit#taskContent { font-size: 18px; background: #fff; border: 2px solid #222; border-radius: 14px; }
+QPushButton#closeButton { color: #222; background: transparent; border: none; }
+QPushButton#closeButton:hover { background: transparent; color: #a33; }
+QPushButton[role="delete"] {
+    color: #000; background: #fff; border: 1px solid #000; border-radius: 10px; font-size: 12px;
+}
+QPushButton[role="delete"]:hover { color: #fff; background: #000; border: 1px solid #000; }
+QLabel#helpText { font-size: 14px; color: #222; }
+"""
+
+_icon_cache = {}
+_pixmap_cache = {}
+
+def cached_icon(path):
+    # One QIcon per file; QIcon keeps its own rendered sizes
+    icon = _icon_cache.get(path)
+    if icon is None:
+        icon = _icon_cache[path] = QIcon(path)
+    return icon
 
-def get_db_path():
-    return os.path.join(get_app_folder(), DB_FILENAME)
+def cached_pixmap(path, size, device_pixel_ratio):
+    # Pre-rendered icon at the screen's pixel density, shared by every painted row
+    key = (path, size.width(), size.height(), device_pixel_ratio)
+    pixmap = _pixmap_cache.get(key)
+    if pixmap is None:
+        pixmap = _pixmap_cache[key] = cached_icon(path).pixmap(size, device_pixel_ratio)
+    return pixmap
 
 def get_settings_path():
     return os.path.join(get_app_folder(), SETTINGS_FILENAME)
 
-class CategoryTaskDB:
-    def __init__(self, db_path):
-        self.conn = sqlite3.connect(db_path)
-        self.create_tables()
-
-    def create_tables(self):
-        cur = self.conn.cursor()
-        cur.execute('''CREATE TABLE IF NOT EXISTS categories (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL
-        )''')
-        cur.execute('''CREATE TABLE IF NOT EXISTS tasks (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            category_id INTEGER,
-            name TEXT NOT NULL,
-            content TEXT DEFAULT '',
-            important INTEGER DEFAULT 0,
-            last_modified TEXT,
-            FOREIGN KEY(category_id) REFERENCES categories(id)
-        )''')
-        self.conn.commit()
-
-    def get_categories(self):
-        cur = self.conn.cursor()
-        cur.execute('SELECT id, name FROM categories')
-        return cur.fetchall()
-
-    def get_tasks(self, category_id):
-        cur = self.conn.cursor()
-        cur.execute('SELECT id, name, important FROM tasks WHERE category_id=? ORDER BY important DESC, id ASC', (category_id,))
-        return cur.fetchall()
-
-    def get_task_content(self, task_id):
-        cur = self.conn.cursor()
-        cur.execute('SELECT content FROM tasks WHERE id=?', (task_id,))
-        row = cur.fetchone()
-        return row[0] if row else ""
-
-    def get_task_last_modified(self, task_id):
-        cur = self.conn.cursor()
-        cur.execute('SELECT last_modified FROM tasks WHERE id=?', (task_id,))
-        row = cur.fetchone()
-        return row[0] if row else ""
-
-    def add_category(self, name="NEW CATEGORY"):
-        cur = self.conn.cursor()
-        cur.execute('INSERT INTO categories (name) VALUES (?)', (name,))
-        self.conn.commit()
-        return cur.lastrowid
-
-    def add_task(self, category_id, name="NEW TASK"):
-        cur = self.conn.cursor()
-        cur.execute('INSERT INTO tasks (category_id, name) VALUES (?, ?)', (category_id, name))
-        self.conn.commit()
-        return cur.lastrowid
-
-    def update_category_name(self, category_id, name):
-        cur = self.conn.cursor()
-        cur.execute('UPDATE categories SET name=? WHERE id=?', (name, category_id))
-        self.conn.commit()
-
-    def update_task_name(self, task_id, name):
-        cur = self.conn.cursor()
-        cur.execute('UPDATE tasks SET name=? WHERE id=?', (name, task_id))
-        self.conn.commit()
-
-    def update_task_content(self, task_id, content):
-        cur = self.conn.cursor()
-        cur.execute('UPDATE tasks SET content=? WHERE id=?', (content, task_id))
-        self.conn.commit()
-
-    def set_task_important(self, task_id, important):
-        cur = self.conn.cursor()
-        cur.execute('UPDATE tasks SET important=? WHERE id=?', (int(important), task_id))
-        self.conn.commit()
-
-    def update_task_last_modified(self, task_id, last_modified):
-        cur = self.conn.cursor()
-        cur.execute('UPDATE tasks SET last_modified=? WHERE id=?', (last_modified, task_id))
-        self.conn.commit()
-
-    def delete_task(self, task_id):
-        cur = self.conn.cursor()
-        cur.execute('DELETE FROM tasks WHERE id=?', (task_id,))
-        self.conn.commit()
-
-    def delete_category_and_tasks(self, cat_id):
-        c = self.conn.cursor()
-        c.execute('DELETE FROM tasks WHERE category_id=?', (cat_id,))
-        c.execute('DELETE FROM categories WHERE id=?', (cat_id,))
-        self.conn.commit()
-
-    def save(self):
-        self.conn.commit()
+def load_settings(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            settings = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return settings if isinstance(settings, dict) else {}
+
+def save_settings(path, settings):
+    # Written beside the file and swapped in, so a crash never leaves half a settings.json
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(settings, f, indent=2)
+    os.replace(tmp_path, path)
+
+def save_debounce_interval(char_count):
+    # Serializing a big document costs more, so let edits on it settle longer
+    extra = max(0, char_count - SAVE_DEBOUNCE_SMALL_DOC) // 50
+    return min(SAVE_DEBOUNCE_MS + extra, SAVE_DEBOUNCE_MAX_MS)
 
 class RichTextEdit(QTextEdit):
     def keyPressEvent(self, event):
@@ -149,164 +193,1530 @@ class RichTextEdit(QTextEdit):
             fmt.setFontUnderline(not current)
         cursor.mergeCharFormat(fmt)
 
+    # Pasted and dropped images go into the attachments table; the note only refers to them
+
+    def image_files(self, source):
+        return [url.toLocalFile() for url in source.urls()
+                if url.isLocalFile() and (mimetypes.guess_type(url.toLocalFile())[0] or "").startswith("image/")]
+
+    def canInsertFromMimeData(self, source):
+        return source.hasImage() or bool(self.image_files(source)) or super().canInsertFromMimeData(source)
+
+    def insertFromMimeData(self, source):
+        db = TaskDocument.db
+        if db is None or self.isReadOnly():
+            super().insertFromMimeData(source)
+        elif source.hasImage():
+            data = QBuffer()
+            data.open(QIODevice.OpenModeFlag.WriteOnly)
+            image = QImage(source.imageData())
+            image.save(data, "PNG")
+            self.insert_attachment(db.add_attachment(bytes(data.data()), "image/png"), image)
+        elif self.image_files(source):
+            # Files keep their own encoding rather than being re-encoded as PNG
+            for path in self.image_files(source):
+                with open(path, "rb") as f:
+                    data = f.read()
+                image = QImage.fromData(data)
+                if not image.isNull():
+                    self.insert_attachment(db.add_attachment(data, mimetypes.guess_type(path)[0]), image)
+        elif source.hasHtml() and 'src="data:' in source.html():
+            mime = QMimeData()
+            mime.setHtml(db.extract_attachments(source.html()))
+            mime.setText(source.text())
+            super().insertFromMimeData(mime)
+        else:
+            super().insertFromMimeData(source)
+
+    def insert_attachment(self, attachment_id, image):
+        # The size is written into the HTML so later layouts need not decode the image
+        name = attachment_url(attachment_id)
+        self.document().addResource(QTextDocument.ResourceType.ImageResource.value, QUrl(name), image)
+        fmt = QTextImageFormat()
+        fmt.setName(name)
+        fmt.setWidth(image.width())
+        fmt.setHeight(image.height())
+        self.textCursor().insertImage(fmt)
+
+class TaskDocument(QTextDocument):
+    # Note documents. attachment: images are read from TaskDocument.db the first time layout or
+    # painting asks for them; the document keeps them as resources after that.
+    db = None
+
+    def loadResource(self, resource_type, url):
+        attachment_id = parse_attachment_url(url.toString())
+        if attachment_id is not None and TaskDocument.db is not None:
+            found = TaskDocument.db.get_attachment(attachment_id)
+            if found is not None:
+                return QImage.fromData(found[0])
+        return super().loadResource(resource_type, url)
+
+def plain_text_document(text, font):
+    document = QTextDocument()
+    document.setDocumentLayout(QPlainTextDocumentLayout(document))
+    document.setDefaultFont(font)
+    document.setPlainText(text)
+    return document
+
+def build_task_document(content, font, plain=False):
+    if plain and is_compact(content):
+        document = plain_text_document(content_to_text(content), font)
+    else:
+        document = TaskDocument()
+        document.setDefaultFont(font)
+        set_document_content(document, content)
+        if plain:
+            document = plain_text_document(document.toPlainText(), font)
+    document.setModified(False)
+    return document
+
+def document_cost(content):
+    # Rough bytes a built document takes; compact notes hold about half the characters of their HTML
+    return len(content) * (4 if is_compact(content) else 2)
+
+# ---- Compact notes (see planner_db): text plus runs of the formats below, written and read through Qt ----
+RUN_FLAGS = (
+    ('b', QTextFormat.Property.FontWeight.value, QFont.Weight.Bold.value),
+    ('i', QTextFormat.Property.FontItalic.value, True),
+    ('u', QTextFormat.Property.TextUnderlineStyle.value, QTextCharFormat.UnderlineStyle.SingleUnderline.value),
+    ('s', QTextFormat.Property.FontStrikeOut.value, True),
+)
+RUN_NEUTRAL_VALUES = (None, 0, False, QFont.Weight.Normal.value)
+RUN_FONT_PROPERTIES = (
+    QTextFormat.Property.FontFamilies.value, QTextFormat.Property.FontPointSize.value, QTextFormat.Property.FontPixelSize.value,
+)
+
+def run_key(fmt):
+    # (flags, image, font) for a character format, or None if it holds anything a run cannot
+    props = fmt.properties()
+    flags = ""
+    for letter, prop, value in RUN_FLAGS:
+        found = props.pop(prop, None)
+        if found == value:
+            flags += letter
+        elif found not in RUN_NEUTRAL_VALUES:
+            return None
+    if props.get(QTextFormat.Property.FontUnderline.value) == ('u' in flags):
+        del props[QTextFormat.Property.FontUnderline.value]
+    font = tuple(props.pop(prop, None) for prop in RUN_FONT_PROPERTIES)
+    font = (font[0] and tuple(font[0]), *font[1:])  # families come as a list
+    props.pop(QTextFormat.Property.ObjectIndex.value, None)
+    image = None
+    if props.pop(QTextFormat.Property.ObjectType.value, None) == QTextFormat.ObjectTypes.ImageObject.value:
+        image = tuple(
+            props.pop(prop, None)
+            for prop in (QTextFormat.Property.ImageName.value, QTextFormat.Property.ImageWidth.value, QTextFormat.Property.ImageHeight.value)
+        )
+        font = None
+    return None if props else (flags, image, font)
+
+def serialize_document(document):
+    # The compact form of a document, or None when its formatting does not fit format runs
+    # (tables, lists, alignment, colours, links, other fonts and sizes)
+    if any(frame.firstPosition() <= frame.lastPosition() for frame in document.rootFrame().childFrames()):
+        return None
+    keys, fonts, plain_blocks = {}, set(), {}
+    parts, runs = [], []
+    run, run_length = ("", None), 0
+    block = document.begin()
+    separator = None
+    while block.isValid():
+        index = block.blockFormatIndex()
+        if index not in plain_blocks:
+            # List items carry their list's object index; any other block property must be zero
+            props = block.blockFormat().properties()
+            plain_blocks[index] = QTextFormat.Property.ObjectIndex.value not in props and not any(props.values())
+        if not plain_blocks[index]:
+            return None
+        # The "\n" before a block carries that block's own character format
+        pieces = [] if separator is None else [(separator, block.charFormatIndex(), block.charFormat)]
+        separator = "\n"
+        it = block.begin()
+        while not it.atEnd():
+            fragment = it.fragment()
+            pieces.append((fragment.text(), fragment.charFormatIndex(), fragment.charFormat))
+            it += 1
+        for text, index, fmt in pieces:
+            key = keys.get(index, False)
+            if key is False:
+                key = keys[index] = run_key(fmt())
+                if key is None:
+                    return None
+                if key[2] is not None:
+                    fonts.add(key[2])
+                key = keys[index] = key[:2]
+            parts.append(text)
+            if key[1] is not None:
+                if run_length:
+                    runs.append((run_length, run))
+                runs.extend((1, key) for _ in text)
+                run, run_length = ("", None), 0
+            elif key == run:
+                run_length += len(text)
+            else:
+                if run_length:
+                    runs.append((run_length, run))
+                run, run_length = key, len(text)
+        block = block.next()
+    if run != ("", None):
+        runs.append((run_length, run))
+    # Qt's HTML gives every fragment the body's font. One font throughout is the editor's font,
+    # not formatting; text in different fonts or sizes needs HTML.
+    if (None, None, None) in fonts:
+        # Fragments without font properties are in the editor's font
+        default_font = document.defaultFont()
+        fonts.discard((None, None, None))
+        fonts.add((tuple(default_font.families()), default_font.pointSizeF() if default_font.pointSizeF() > 0 else None,
+                   default_font.pixelSize() if default_font.pixelSize() > 0 else None))
+    if len(fonts) > 1:
+        return None
+    text = "".join(parts)
+    if not text:
+        return ""
+    encoded = [
+        [length, flags, image[0], *(int(size) if size is not None and size == int(size) else size for size in image[1:])] if image else [length, flags]
+        for length, (flags, image) in runs
+    ]
+    return COMPACT_PREFIX + json.dumps(encoded, separators=(',', ':'), ensure_ascii=False) + "\n" + text
+
+def run_format(run):
+    flags = run[1]
+    fmt = QTextImageFormat() if len(run) > 2 else QTextCharFormat()
+    if 'b' in flags:
+        fmt.setFontWeight(QFont.Weight.Bold)
+    if 'i' in flags:
+        fmt.setFontItalic(True)
+    if 'u' in flags:
+        fmt.setFontUnderline(True)
+    if 's' in flags:
+        fmt.setFontStrikeOut(True)
+    if len(run) > 2:
+        fmt.setName(run[2])
+        if run[3] is not None:
+            fmt.setWidth(run[3])
+        if run[4] is not None:
+            fmt.setHeight(run[4])
+    return fmt
+
+def fill_compact(document, content, chunk_chars=None):
+    # Writes a compact note into an empty document. As a generator it pauses after every
+    # chunk_chars characters; with chunk_chars None it runs to the end in one step.
+    runs, text = split_compact(content)
+    runs.append([len(text) - sum(run[0] for run in runs), ""])
+    cursor = QTextCursor(document)
+    start = done = 0
+    for run in runs:
+        end = start + run[0]
+        fmt = run_format(run)
+        if len(run) > 2:
+            for _ in range(run[0]):
+                cursor.insertImage(fmt)
+            start = end
+        while start < end:
+            stop = end if chunk_chars is None else min(end, start + chunk_chars - done)
+            cursor.insertText(text[start:stop], fmt)
+            done += stop - start
+            start = stop
+            if chunk_chars is not None and done >= chunk_chars:
+                done = 0
+                yield
+
+def set_document_content(document, content):
+    # Replaces a document's contents with a stored note in either format
+    if not is_compact(content):
+        document.setHtml(content)
+        return
+    if not document.isEmpty():
+        document.clear()
+    undo = document.isUndoRedoEnabled()
+    document.setUndoRedoEnabled(False)
+    for _ in fill_compact(document, content):
+        pass
+    document.setUndoRedoEnabled(undo)
+
+def document_content(document):
+    # What a note is saved as: compact when its formatting allows, otherwise Qt's HTML
+    content = serialize_document(document)
+    return document.toHtml() if content is None else content
+
+def compact_equivalent(content, font):
+    # The compact form of an HTML note, or None unless it rebuilds into exactly the same document
+    document = QTextDocument()
+    document.setDefaultFont(font)
+    document.setHtml(content)
+    compact = serialize_document(document)
+    if compact is None:
+        return None
+    # Compared in the note's own body font, which the compact form leaves to the editor
+    font = document.begin().charFormat().font().resolve(font)
+    document.setDefaultFont(font)
+    check = QTextDocument()
+    check.setDefaultFont(font)
+    set_document_content(check, compact)
+    return compact if check.toHtml() == document.toHtml() else None
+
+def is_plain_document(document):
+    return isinstance(document.documentLayout(), QPlainTextDocumentLayout)
+
+def iter_html_chunks(content, chunk_chars=LARGE_NOTE_CHUNK_CHARS):
+    # Splits toHtml() output before top-level paragraphs; each piece is a whole document with
+    # the original <head> and <body> so styles such as white-space: pre-wrap still apply
+    body_tag = re.search(r'<body[^>]*>', content)
+    head = content[:body_tag.end()] if body_tag else ""
+    body = re.sub(r'</body>\s*</html>\s*$', '', content[len(head):])
+    lines, size, depth = [], 0, 0
+    for line in body.splitlines(True):
+        if size >= chunk_chars and depth == 0 and re.match(r'<p[ >]', line) and lines:
+            yield head + "".join(lines) + "</body></html>"
+            lines, size = [], 0
+        lines.append(line)
+        size += len(line)
+        depth += len(re.findall(r'<(?:table|ul|ol)\b', line)) - len(re.findall(r'</(?:table|ul|ol)>', line))
+    yield head + "".join(lines) + "</body></html>"
+
+def iter_document_steps(document, content, chunk_chars=LARGE_NOTE_CHUNK_CHARS):
+    # Builds a note into an empty document, about chunk_chars of it per step
+    if is_compact(content):
+        yield from fill_compact(document, content, chunk_chars)
+        return
+    for n, chunk in enumerate(iter_html_chunks(content, chunk_chars)):
+        if n:
+            append_html_chunk(document, chunk)
+        else:
+            document.setHtml(chunk)
+        yield
+
+def append_html_chunk(document, chunk):
+    part = QTextDocument()
+    part.setDefaultFont(document.defaultFont())
+    part.setHtml(chunk)
+    cursor = QTextCursor(document)
+    cursor.movePosition(QTextCursor.MoveOperation.End)
+    # A fresh block with the chunk's first formats; inserting straight away would merge it into the last one
+    cursor.insertBlock(part.firstBlock().blockFormat(), part.firstBlock().charFormat())
+    cursor.insertFragment(QTextDocumentFragment(part))
+
+class DocumentLoader(QObject):
+    # Builds large notes one chunk per event-loop turn and hands back the finished document.
+    # QTextDocument.setHtml() holds the GIL, so a worker thread would stall the UI just the same.
+    loaded = pyqtSignal(int, object, int)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.jobs = OrderedDict()  # task_id -> [document, steps, size, plain]
+        self.timer = QTimer(self)
+        self.timer.setInterval(0)
+        self.timer.timeout.connect(self.load_next_chunk)
+
+    def __contains__(self, task_id):
+        return task_id in self.jobs
+
+    def load(self, task_id, content, font, plain, urgent=False):
+        if task_id not in self.jobs:
+            if plain and is_compact(content):
+                # The text is all there already; no rich document to build first
+                document, steps, plain = plain_text_document(content_to_text(content), font), iter(()), False
+            else:
+                document = TaskDocument()
+                document.setDefaultFont(font)
+                steps = iter_document_steps(document, content)
+            document.setUndoRedoEnabled(False)
+            self.jobs[task_id] = [document, steps, document_cost(content), plain]
+        if urgent:
+            self.jobs.move_to_end(task_id, last=False)
+        self.timer.start()
+
+    def load_next_chunk(self):
+        if not self.jobs:
+            self.timer.stop()
+            return
+        task_id, (document, steps, size, plain) = next(iter(self.jobs.items()))
+        if next(steps, True) is None:
+            # Steps yield None; the default means the note is complete
+            return
+        del self.jobs[task_id]
+        if plain:
+            document = plain_text_document(document.toPlainText(), document.defaultFont())
+        document.setUndoRedoEnabled(True)
+        document.setModified(False)
+        self.loaded.emit(task_id, document, size)
+
+    def discard(self, task_id):
+        self.jobs.pop(task_id, None)
+
+    def stop(self):
+        self.timer.stop()
+        self.jobs.clear()
+
+class SearchWorker(QObject):
+    # Runs FTS queries on its own connection in a worker thread
+    results_ready = pyqtSignal(int, list)
+
+    def __init__(self, db_path):
+        super().__init__()
+        self.db_path = db_path
+        self.conn = None
+        self.latest_generation = 0
+
+    def search(self, generation, text):
+        if generation < self.latest_generation:
+            return  # superseded while queued
+        if self.conn is None:
+            self.conn = sqlite3.connect(self.db_path)
+        try:
+            results = search_tasks(self.conn, text)
+        except sqlite3.Error:
+            results = []
+        self.results_ready.emit(generation, results)
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+class InputIdleMonitor(QObject):
+    # Application-wide event filter that notes the time of the last keyboard or mouse input
+    INPUT_EVENTS = frozenset((
+        QEvent.Type.KeyPress, QEvent.Type.MouseButtonPress, QEvent.Type.MouseMove, QEvent.Type.Wheel,
+    ))
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.last_input = time.monotonic()
+
+    def idle_ms(self):
+        return (time.monotonic() - self.last_input) * 1000
+
+    def eventFilter(self, obj, event):
+        if event.type() in self.INPUT_EVENTS:
+            self.last_input = time.monotonic()
+        return False
+
+class MaintenanceWorker(QObject):
+    # Reclaims free pages and refreshes query statistics on its own connection in a worker thread.
+    # maintained(kind, free_pages) names the one job a maintain() call ran: "attachments", "vacuum",
+    # "optimize", or "" when there was nothing to do. Each holds the write lock for a few milliseconds at most;
+    # the attachment sweep reads notes and revisions first and only takes it to delete what is unused.
+    maintained = pyqtSignal(str, int)
+    failed = pyqtSignal(str)
+    stats_ready = pyqtSignal(dict)
+
+    def __init__(self, db_path):
+        super().__init__()
+        self.db_path = db_path
+        self.conn = None
+
+    def connection(self):
+        if self.conn is None:
+            self.conn = sqlite3.connect(self.db_path)
+            self.conn.execute(f'PRAGMA busy_timeout={MAINTENANCE_BUSY_TIMEOUT_MS}')
+        return self.conn
+
+    def maintain(self, optimize, sweep):
+        kind = ""
+        try:
+            conn = self.connection()
+            if sweep:
+                # Runs ahead of the vacuum steps, which then reclaim the pages the images held
+                sweep_attachments(conn)
+                self.maintained.emit("attachments", conn.execute('PRAGMA freelist_count').fetchone()[0])
+                return
+            freed, free = incremental_vacuum_step(conn)
+            if freed:
+                kind = "vacuum"
+            elif optimize:
+                optimize_database(conn)
+                kind = "optimize"
+        except sqlite3.Error as error:
+            self.failed.emit(str(error))
+            return
+        self.maintained.emit(kind, free)
+
+    def stats(self):
+        try:
+            stats = database_stats(self.connection())
+        except sqlite3.Error as error:
+            stats = {'error': str(error)}
+        self.stats_ready.emit(stats)
+
+    def interrupt(self):
+        # Called from the UI thread on exit
+        if self.conn is not None:
+            self.conn.interrupt()
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+class TransferWorker(QObject):
+    # Runs one export or import job in a worker thread; job(progress) returns a status message
+    progress = pyqtSignal(int)
+    done = pyqtSignal(str)
+    failed = pyqtSignal(str)
+
+    def __init__(self, job):
+        super().__init__()
+        self.job = job
+        self.cancelled = threading.Event()
+        self.percent = -1
+
+    def run(self):
+        try:
+            message = self.job(self.report)
+        except TransferCancelled:
+            self.failed.emit("Cancelled.")
+        except (OSError, ValueError, sqlite3.Error) as error:
+            self.failed.emit(str(error))
+        else:
+            self.done.emit(message)
+
+    def report(self, done, total):
+        if self.cancelled.is_set():
+            raise TransferCancelled()
+        percent = done * 100 // total if total else 100
+        if percent != self.percent:
+            self.percent = percent
+            self.progress.emit(percent)
+
+class DocumentCache:
+    # LRU of parsed task documents, bounded by count and approximate memory
+    def __init__(self, max_count=DOCUMENT_CACHE_MAX_COUNT, max_bytes=DOCUMENT_CACHE_MAX_BYTES):
+        self.max_count = max_count
+        self.max_bytes = max_bytes
+        self.documents = OrderedDict()
+        self.total_bytes = 0
+        self.pinned = None
+
+    def __contains__(self, task_id):
+        return task_id in self.documents
+
+    def get(self, task_id):
+        entry = self.documents.get(task_id)
+        if entry is None:
+            return None
+        self.documents.move_to_end(task_id)
+        return entry[0]
+
+    def put(self, task_id, document, size):
+        self.discard(task_id)
+        self.documents[task_id] = (document, size)
+        self.total_bytes += size
+        self.evict()
+
+    def discard(self, task_id):
+        entry = self.documents.pop(task_id, None)
+        if entry:
+            self.total_bytes -= entry[1]
+
+    def clear(self):
+        self.documents.clear()
+        self.total_bytes = 0
+
+    def evict(self):
+        # Oldest first; the document on screen is never evicted
+        for task_id in list(self.documents):
+            if len(self.documents) <= self.max_count and self.total_bytes <= self.max_bytes:
+                break
+            if task_id != self.pinned:
+                self.discard(task_id)
+
+class Profiler:
+    # Opt-in timing of database calls and UI hot paths, with per-call histograms and
+    # event-loop stall records. install() wraps the methods in place; nothing is timed otherwise.
+    # A watchdog thread samples the main thread's Python stack while its event loop is stuck.
+    def __init__(self, path, stall_ms=PROFILE_STALL_MS):
+        self.path = path
+        self.stall_ms = stall_ms
+        self.started = time.time()
+        self.calls = {}
+        self.stalls = []
+        self.stack = []  # names of the timed calls running on the main thread
+        self.slow_calls = []  # (end, name, ms) for main-thread calls long enough to explain a stall
+        self.samples = []
+        self.event_depth = 0
+        self.lock = threading.Lock()
+        self.main_ident = threading.get_ident()
+        self.beat = time.perf_counter()
+        self.originals = []
+        self.stopped = threading.Event()
+        self.watchdog = None
+
+    def record(self, name, ms):
+        with self.lock:
+            entry = self.calls.get(name)
+            if entry is None:
+                entry = self.calls[name] = {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'buckets': [0] * (len(PROFILE_BUCKETS_MS) + 1)}
+            entry['count'] += 1
+            entry['total_ms'] += ms
+            entry['max_ms'] = max(entry['max_ms'], ms)
+            entry['buckets'][bisect_right(PROFILE_BUCKETS_MS, ms)] += 1
+
+    def call(self, name, fn, *args, **kwargs):
+        on_main = threading.get_ident() == self.main_ident
+        if on_main:
+            self.stack.append(name)
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            end = time.perf_counter()
+            ms = (end - start) * 1000
+            self.record(name, ms)
+            if on_main:
+                self.stack.pop()
+                if ms >= self.stall_ms / 4:
+                    self.slow_calls.append((end, name, round(ms, 3)))
+                    del self.slow_calls[:-50]
+
+    def wrap(self, name, fn):
+        # Extra positional arguments are dropped the way PyQt does for slots that take fewer
+        params = signature(fn).parameters.values()
+        limit = None if any(p.kind == Parameter.VAR_POSITIONAL for p in params) else sum(
+            p.kind in (Parameter.POSITIONAL_ONLY, Parameter.POSITIONAL_OR_KEYWORD) for p in params)
+
+        def timed(*args, **kwargs):
+            return self.call(name, fn, *(args if limit is None else args[:limit]), **kwargs)
+        timed.__name__ = fn.__name__
+        return timed
+
+    def install(self, targets):
+        # targets: [(owner, names)], owner being a class or this module; names None means every public method
+        for owner, names in targets:
+            prefix = f"{owner.__name__}." if isinstance(owner, type) else ""
+            for name in names or [n for n, v in vars(owner).items() if callable(v) and not n.startswith('_')]:
+                original = vars(owner)[name]
+                self.originals.append((owner, name, original))
+                setattr(owner, name, self.wrap(prefix + name, original))
+        self.watchdog = threading.Thread(target=self._watch, name="planner-profile-watchdog", daemon=True)
+        self.watchdog.start()
+
+    def uninstall(self):
+        self.stopped.set()
+        for owner, name, original in reversed(self.originals):
+            setattr(owner, name, original)
+        self.originals = []
+
+    def heartbeat(self):
+        # Called from a main-thread timer; a late beat means the loop was busy that long
+        now = time.perf_counter()
+        gap = (now - self.beat) * 1000 - PROFILE_HEARTBEAT_MS
+        if gap >= self.stall_ms:
+            with self.lock:
+                samples, self.samples = self.samples, []
+            calls = [(name, ms) for end, name, ms in self.slow_calls if end >= self.beat]
+            self.stalls.append({
+                'at': round(time.time() - self.started, 3), 'ms': round(gap, 3),
+                'calls': calls, 'samples': samples,
+            })
+            del self.stalls[:-PROFILE_MAX_STALLS]
+        self.beat = now
+
+    def _watch(self):
+        # Samples only once per stall interval; Qt calls that hold the GIL leave no sample,
+        # and the slow calls recorded around the stall name them instead
+        while not self.stopped.wait(self.stall_ms / 2000):
+            if (time.perf_counter() - self.beat) * 1000 < self.stall_ms:
+                continue
+            frame = sys._current_frames().get(self.main_ident)
+            sample = {
+                'calls': list(self.stack),
+                'python': [line.strip() for line in traceback.format_stack(frame, limit=12)] if frame else [],
+            }
+            with self.lock:
+                if len(self.samples) < 10:
+                    self.samples.append(sample)
+
+    def report(self):
+        with self.lock:
+            calls = {
+                name: {
+                    'count': entry['count'], 'total_ms': round(entry['total_ms'], 3),
+                    'mean_ms': round(entry['total_ms'] / entry['count'], 3), 'max_ms': round(entry['max_ms'], 3),
+                    'histogram_ms': {
+                        f"<={bound}" if bound is not None else f">{PROFILE_BUCKETS_MS[-1]}": count
+                        for bound, count in zip(PROFILE_BUCKETS_MS + (None,), entry['buckets']) if count
+                    },
+                }
+                for name, entry in sorted(self.calls.items(), key=lambda item: -item[1]['total_ms'])
+            }
+        return {
+            'seconds': round(time.time() - self.started, 3), 'stall_threshold_ms': self.stall_ms,
+            'calls': calls, 'stalls': list(self.stalls),
+        }
+
+    def summary(self, top=8):
+        # A few lines for the overlay
+        report = self.report()
+        lines = [f"{len(report['stalls'])} stalls over {self.stall_ms} ms"]
+        if report['stalls']:
+            stall = report['stalls'][-1]
+            # The slowest call below the event dispatch that contained it
+            calls = [call for call in stall['calls'] if not call[0].startswith("event:")] or stall['calls']
+            culprit = max(calls, key=lambda call: call[1])[0] if calls else "?"
+            lines.append(f"last: {stall['ms']:.0f} ms in {culprit}")
+        for name, entry in list(report['calls'].items())[:top]:
+            lines.append(f"{entry['total_ms']:9.1f} ms {entry['count']:6} x {entry['max_ms']:7.1f} max  {name}")
+        return "\n".join(lines)
+
+    def dump(self, path=None):
+        path = path or self.path
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.report(), f, indent=2)
+        os.replace(tmp_path, path)
+        return path
+
+profiler = None  # set by main() when profiling is on
+
+class ProfiledApplication(QApplication):
+    # Times each top-level event dispatch, so paint, layout and timers show up beside the Python hot paths
+    def notify(self, receiver, event):
+        if profiler is None or profiler.event_depth or profiler.stack:
+            return super().notify(receiver, event)
+        try:
+            name = "event:" + event.type().name
+        except (AttributeError, ValueError):
+            name = f"event:{int(event.type())}"
+        profiler.event_depth += 1
+        try:
+            return profiler.call(name, super().notify, receiver, event)
+        finally:
+            profiler.event_depth -= 1
+
+# Left panel row kinds and item data roles
+ROW_CATEGORY, ROW_TASK, ROW_ADD_TASK = range(3)
+RowKindRole = Qt.ItemDataRole.UserRole + 1
+CategoryIdRole = Qt.ItemDataRole.UserRole + 2
+TaskIdRole = Qt.ItemDataRole.UserRole + 3
+ImportantRole = Qt.ItemDataRole.UserRole + 4
+
+class TaskListModel(QAbstractListModel):
+    # Flat list of category, task and "ADD TASK" rows backed by the CategoryTaskDB index.
+    # Only ids are held here; rows are located through per-category offsets.
+    task_renamed = pyqtSignal(int, str)
+
+    def __init__(self, db, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self.category_ids = []
+        self.category_tasks = {}
+        self._offsets = None
+        self._row_count = 0
+
+    def reload(self):
+        self.beginResetModel()
+        tree = self.db.get_tree()
+        self.category_ids = [cat_id for cat_id, _, _ in tree]
+        self.category_tasks = {cat_id: [task[0] for task in tasks] for cat_id, _, tasks in tree}
+        self._offsets = None
+        self.endResetModel()
+
+    def offsets(self):
+        if self._offsets is None:
+            offsets, row = [], 0
+            for cat_id in self.category_ids:
+                offsets.append(row)
+                row += len(self.category_tasks[cat_id]) + 2
+            self._offsets, self._row_count = offsets, row
+        return self._offsets
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        self.offsets()
+        return self._row_count
+
+    def entry(self, row):
+        # (kind, cat_id, task_id) for a row
+        offsets = self.offsets()
+        pos = bisect_right(offsets, row) - 1
+        cat_id = self.category_ids[pos]
+        tasks = self.category_tasks[cat_id]
+        local = row - offsets[pos]
+        if local == 0:
+            return ROW_CATEGORY, cat_id, None
+        if local <= len(tasks):
+            return ROW_TASK, cat_id, tasks[local - 1]
+        return ROW_ADD_TASK, cat_id, None
+
+    def category_row(self, cat_id):
+        return self.offsets()[self.category_ids.index(cat_id)]
+
+    def task_row(self, task_id):
+        cat_id = self.db.get_task(task_id)['category_id']
+        return self.category_row(cat_id) + 1 + self.category_tasks[cat_id].index(task_id)
+
+    def task_position(self, cat_id, task_id):
+        # Index in the category's task list that keeps get_tasks() ordering
+        key = self.db.task_order(task_id)
+        tasks = self.category_tasks[cat_id]
+        for pos, other_id in enumerate(tasks):
+            if other_id != task_id and self.db.task_order(other_id) > key:
+                return pos
+        return len(tasks)
+
+    def category_position(self, cat_id):
+        key = self.db.category_order(cat_id)
+        for pos, other_id in enumerate(self.category_ids):
+            if other_id != cat_id and self.db.category_order(other_id) > key:
+                return pos
+        return len(self.category_ids)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        kind, cat_id, task_id = self.entry(index.row())
+        if role in (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.EditRole):
+            if kind == ROW_CATEGORY:
+                return self.db.categories.get(cat_id, "")
+            if kind == ROW_TASK:
+                return self.db.get_task(task_id)['name']
+            return "ADD TASK"
+        if role == Qt.ItemDataRole.ToolTipRole and kind != ROW_ADD_TASK:
+            return "Double Click To Edit!"
+        if role == RowKindRole:
+            return kind
+        if role == CategoryIdRole:
+            return cat_id
+        if role == TaskIdRole:
+            return task_id
+        if role == ImportantRole and kind == ROW_TASK:
+            return self.db.get_task(task_id)['important']
+        return None
+
+    def flags(self, index):
+        flags = Qt.ItemFlag.ItemIsEnabled
+        kind = self.entry(index.row())[0] if index.isValid() else None
+        if kind == ROW_TASK:
+            flags |= Qt.ItemFlag.ItemIsSelectable
+        if kind in (ROW_CATEGORY, ROW_TASK):
+            flags |= Qt.ItemFlag.ItemIsEditable | Qt.ItemFlag.ItemIsDragEnabled
+        return flags
+
+    def setData(self, index, value, role=Qt.ItemDataRole.EditRole):
+        name = (value or "").strip()
+        if role != Qt.ItemDataRole.EditRole or not index.isValid() or not name:
+            return False
+        kind, cat_id, task_id = self.entry(index.row())
+        if kind == ROW_CATEGORY:
+            self.db.update_category_name(cat_id, name)
+        elif kind == ROW_TASK:
+            self.db.update_task_name(task_id, name)
+            self.task_renamed.emit(task_id, name)
+        else:
+            return False
+        self.dataChanged.emit(index, index)
+        return True
+
+    def insert_category(self, cat_id):
+        pos = self.category_position(cat_id)
+        row = self.offsets()[pos] if pos < len(self.category_ids) else self.rowCount()
+        self.beginInsertRows(QModelIndex(), row, row + 1)
+        self.category_ids.insert(pos, cat_id)
+        self.category_tasks[cat_id] = []
+        self._offsets = None
+        self.endInsertRows()
+
+    def remove_category(self, cat_id):
+        if cat_id not in self.category_tasks:
+            return
+        row = self.category_row(cat_id)
+        self.beginRemoveRows(QModelIndex(), row, row + len(self.category_tasks[cat_id]) + 1)
+        self.category_ids.remove(cat_id)
+        del self.category_tasks[cat_id]
+        self._offsets = None
+        self.endRemoveRows()
+
+    def insert_task(self, task_id):
+        cat_id = self.db.get_task(task_id)['category_id']
+        pos = self.task_position(cat_id, task_id)
+        row = self.category_row(cat_id) + 1 + pos
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.category_tasks[cat_id].insert(pos, task_id)
+        self._offsets = None
+        self.endInsertRows()
+
+    def remove_task(self, cat_id, task_id):
+        if task_id not in self.category_tasks.get(cat_id, ()):
+            return
+        row = self.category_row(cat_id) + 1 + self.category_tasks[cat_id].index(task_id)
+        self.beginRemoveRows(QModelIndex(), row, row)
+        self.category_tasks[cat_id].remove(task_id)
+        self._offsets = None
+        self.endRemoveRows()
+
+    def update_task(self, task_id):
+        # Repaint one task row, moving it if its star or rank changed its place in the category
+        self.relocate_task(task_id, self.db.get_task(task_id)['category_id'])
+        index = self.index(self.task_row(task_id))
+        self.dataChanged.emit(index, index)
+
+    def relocate_task(self, task_id, old_cat_id):
+        # Moves a task's row from old_cat_id to where its category, star and rank now place it
+        cat_id = self.db.get_task(task_id)['category_id']
+        old_tasks, tasks = self.category_tasks[old_cat_id], self.category_tasks[cat_id]
+        old_pos = old_tasks.index(task_id)
+        old_row = self.category_row(old_cat_id) + 1 + old_pos
+        pos = self.task_position(cat_id, task_id)
+        # beginMoveRows wants the destination row as counted before the move
+        dest = self.category_row(cat_id) + 1 + pos
+        if tasks is old_tasks and dest in (old_row, old_row + 1):
+            return
+        self.beginMoveRows(QModelIndex(), old_row, old_row, QModelIndex(), dest)
+        old_tasks.pop(old_pos)
+        if tasks is old_tasks and pos > old_pos:
+            pos -= 1
+        tasks.insert(pos, task_id)
+        self._offsets = None
+        self.endMoveRows()
+
+    def move_category(self, cat_id):
+        # Moves a category's block of rows to where its rank now places it
+        old_pos = self.category_ids.index(cat_id)
+        start = self.category_row(cat_id)
+        end = start + len(self.category_tasks[cat_id]) + 1
+        pos = self.category_position(cat_id)
+        dest = self.offsets()[pos] if pos < len(self.category_ids) else self.rowCount()
+        if start <= dest <= end + 1:
+            return
+        self.beginMoveRows(QModelIndex(), start, end, QModelIndex(), dest)
+        self.category_ids.pop(old_pos)
+        self.category_ids.insert(pos - 1 if pos > old_pos else pos, cat_id)
+        self._offsets = None
+        self.endMoveRows()
+
+class TaskRowDelegate(QStyledItemDelegate):
+    # Paints left panel rows as the planner's pill buttons; no per-row widgets exist
+    star_clicked = pyqtSignal(int)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.font = QFont("serif")
+        self.font.setPixelSize(18)
+
+    def sizeHint(self, option, index):
+        return QSize(option.rect.width(), TASK_LIST_ROW_HEIGHT)
+
+    def star_rect(self, rect):
+        return QRect(rect.x() + 4, rect.center().y() - 10, 20, 20)
+
+    def pill_rect(self, rect, kind):
+        if kind == ROW_TASK:
+            return QRect(rect.x() + 30, rect.y() + 5, rect.width() - 30, 32)
+        return QRect(rect.x(), rect.y() + 3, rect.width(), 36)
+
+    def paint(self, painter, option, index):
+        kind = index.data(RowKindRole)
+        rect = option.rect
+        painter.save()
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        if kind == ROW_TASK:
+            star = self.star_rect(rect)
+            path = STAR_FILLED_ICON if index.data(ImportantRole) else STAR_ICON
+            painter.drawPixmap(star, cached_pixmap(path, star.size(), painter.device().devicePixelRatioF()))
+        pill = self.pill_rect(rect, kind)
+        if kind == ROW_ADD_TASK:
+            pill.setHeight(32)
+        hovered = option.state & QStyle.StateFlag.State_MouseOver
+        selected = option.state & QStyle.StateFlag.State_Selected
+        painter.setPen(QPen(QColor("#222"), 2))
+        painter.setBrush(QColor("#b8b8b8" if selected else "#d6d6d6" if hovered else "#fff"))
+        painter.drawRoundedRect(pill.adjusted(1, 1, -1, -1), 16, 16)
+        painter.setFont(self.font)
+        painter.setPen(QColor("#222"))
+        text = painter.fontMetrics().elidedText(index.data(), Qt.TextElideMode.ElideRight, pill.width() - 24)
+        painter.drawText(pill, Qt.AlignmentFlag.AlignCenter, text)
+        if kind == ROW_ADD_TASK:
+            # Category divider
+            painter.fillRect(QRect(rect.x(), rect.bottom() - 3, rect.width(), 3), QColor("#222"))
+        painter.restore()
+
+    def editorEvent(self, event, model, option, index):
+        if (event.type() == QEvent.Type.MouseButtonRelease and index.data(RowKindRole) == ROW_TASK
+                and self.star_rect(option.rect).contains(event.position().toPoint())):
+            self.star_clicked.emit(index.data(TaskIdRole))
+            return True
+        return super().editorEvent(event, model, option, index)
+
+    def createEditor(self, parent, option, index):
+        edit = QLineEdit(parent)
+        edit.setProperty("role", "pill")
+        edit.setAlignment(Qt.AlignmentFlag.AlignVCenter | Qt.AlignmentFlag.AlignLeft)
+        edit.setFont(self.font)
+        return edit
+
+    def updateEditorGeometry(self, editor, option, index):
+        editor.setGeometry(self.pill_rect(option.rect, index.data(RowKindRole)))
+
+    def setEditorData(self, editor, index):
+        editor.setText(index.data(Qt.ItemDataRole.EditRole))
+
+    def setModelData(self, editor, model, index):
+        model.setData(index, editor.text(), Qt.ItemDataRole.EditRole)
+
+ROW_MIME_TYPE = "application/x-planner-rows"
+
+class TaskListView(QTableView):
+    # Virtualized, scrollable left panel list; only rows in view are painted.
+    # A one-column table rather than a QListView: fixed-size header sections keep row geometry
+    # in C++, where QListView re-walks every row through the Python model on each change.
+    rows_dropped = pyqtSignal(object, int, bool)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.horizontalHeader().hide()
+        self.horizontalHeader().setStretchLastSection(True)
+        self.verticalHeader().hide()
+        self.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
+        self.verticalHeader().setDefaultSectionSize(TASK_LIST_ROW_HEIGHT)
+        self.setShowGrid(False)
+        self.setWordWrap(False)
+        self.setCornerButtonEnabled(False)
+        self.setMouseTracking(True)
+        self.setVerticalScrollMode(QAbstractItemView.ScrollMode.ScrollPerPixel)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+        self.setEditTriggers(QAbstractItemView.EditTrigger.DoubleClicked)
+        # Ctrl/Shift-click picks task rows for the bulk actions in the context menu
+        self.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
+        self.setFocusPolicy(Qt.FocusPolicy.NoFocus)
+        self.setFrameShape(QFrame.Shape.NoFrame)
+        self.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
+        self.viewport().setCursor(Qt.CursorShape.PointingHandCursor)
+        self.setObjectName("taskList")
+        self.setAcceptDrops(True)
+        self.setAutoScroll(True)
+        self.drag_start = None
+        self.dragged = None
+        self.drop_indicator = None
+
+    # Drag and drop: task and category rows are dragged by hand rather than through the model's
+    # mime machinery, which only drags selected rows and would remove the source rows itself.
+    # rows_dropped carries the dragged [(kind, id)], the row dropped on and whether below it.
+
+    def mousePressEvent(self, event):
+        index = self.indexAt(event.position().toPoint())
+        is_row = event.button() == Qt.MouseButton.LeftButton and index.data(RowKindRole) in (ROW_CATEGORY, ROW_TASK)
+        self.drag_start = event.position().toPoint() if is_row else None
+        super().mousePressEvent(event)
+
+    def mouseMoveEvent(self, event):
+        if (self.drag_start is not None and event.buttons() & Qt.MouseButton.LeftButton
+                and (event.position().toPoint() - self.drag_start).manhattanLength() >= QApplication.startDragDistance()):
+            index = self.indexAt(self.drag_start)
+            self.drag_start = None
+            if index.isValid():
+                self.start_row_drag(index)
+                return
+        super().mouseMoveEvent(event)
+
+    def mouseReleaseEvent(self, event):
+        self.drag_start = None
+        super().mouseReleaseEvent(event)
+
+    def start_row_drag(self, index):
+        # A task drags the rest of the selection along when it is part of it; a category drags alone
+        if index.data(RowKindRole) == ROW_TASK:
+            rows = [index.row()]
+            if self.selectionModel().isRowSelected(index.row(), QModelIndex()):
+                rows = sorted(selected.row() for selected in self.selectionModel().selectedRows())
+            self.dragged = [(ROW_TASK, self.model().index(row).data(TaskIdRole)) for row in rows]
+        else:
+            self.dragged = [(ROW_CATEGORY, index.data(CategoryIdRole))]
+        mime = QMimeData()
+        mime.setData(ROW_MIME_TYPE, json.dumps(self.dragged).encode())
+        drag = QDrag(self)
+        drag.setMimeData(mime)
+        drag.setPixmap(self.viewport().grab(self.visualRect(index)))
+        drag.exec(Qt.DropAction.MoveAction)
+        self.dragged = None
+        self.set_drop_indicator(None)
+
+    def set_drop_indicator(self, indicator):
+        if indicator != self.drop_indicator:
+            self.drop_indicator = indicator
+            self.viewport().update()
+
+    def dragEnterEvent(self, event):
+        if event.source() is self and self.dragged:
+            self.setState(QAbstractItemView.State.DraggingState)
+            event.accept()
+        else:
+            event.ignore()
+
+    def dragMoveEvent(self, event):
+        if event.source() is not self or not self.dragged:
+            event.ignore()
+            return
+        # The base class only contributes auto-scrolling near the edges here
+        super().dragMoveEvent(event)
+        pos = event.position().toPoint()
+        index = self.indexAt(pos)
+        if index.isValid():
+            rect = self.visualRect(index)
+            self.set_drop_indicator((index.row(), pos.y() > rect.center().y()))
+        elif self.model().rowCount():
+            self.set_drop_indicator((self.model().rowCount() - 1, True))
+        event.setDropAction(Qt.DropAction.MoveAction)
+        event.accept()
+
+    def dragLeaveEvent(self, event):
+        self.set_drop_indicator(None)
+        super().dragLeaveEvent(event)
+
+    def dropEvent(self, event):
+        indicator, dragged = self.drop_indicator, self.dragged
+        self.set_drop_indicator(None)
+        self.setState(QAbstractItemView.State.NoState)
+        if event.source() is not self or not dragged or indicator is None:
+            event.ignore()
+            return
+        event.setDropAction(Qt.DropAction.MoveAction)
+        event.accept()
+        self.rows_dropped.emit(dragged, indicator[0], indicator[1])
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if self.drop_indicator is not None:
+            row, below = self.drop_indicator
+            rect = self.visualRect(self.model().index(row))
+            painter = QPainter(self.viewport())
+            painter.setPen(QPen(QColor("#222"), 3))
+            y = rect.bottom() if below else rect.top() + 1
+            painter.drawLine(rect.left() + 8, y, rect.right() - 8, y)
+            painter.end()
+
+    def viewportEvent(self, event):
+        if event.type() == QEvent.Type.ToolTip:
+            index = self.indexAt(event.pos())
+            text = index.data(Qt.ItemDataRole.ToolTipRole) if index.isValid() else None
+            if text:
+                QToolTip.showText(event.globalPos(), text, self, QRect(), 2000)
+            else:
+                QToolTip.hideText()
+            return True
+        return super().viewportEvent(event)
+
 class MainWindow(QWidget):
-    def __init__(self):
+    search_requested = pyqtSignal(int, str)
+    maintenance_requested = pyqtSignal(bool, bool)
+    stats_requested = pyqtSignal()
+
+    def __init__(self, db_path=None, settings_path=None):
         super().__init__()
-        exe_dir = os.path.dirname(sys.executable) if getattr(sys, 'frozen', False) else os.path.dirname(__file__)
-        appico_path = os.path.join(exe_dir, "appico.ico")
-        if os.path.exists(appico_path):
-            self.setWindowIcon(QIcon(appico_path))
         self.setWindowTitle(APP_NAME)
         self.setWindowFlags(self.windowFlags() | Qt.WindowType.FramelessWindowHint)
         self.setAttribute(Qt.WidgetAttribute.WA_TranslucentBackground)
         self.resize(1000, 700)
-        self.db = CategoryTaskDB(get_db_path())
+        self.settings_path = settings_path or get_settings_path()
+        self.settings = load_settings(self.settings_path)
+        # The category tree is filled in by finish_startup() once the window is up
+        self.db = CategoryTaskDB(db_path or get_db_path(), load_index=False)
+        TaskDocument.db = self.db
+        self.tree_loaded = False
+        self.startup_scheduled = False
         self.selected_category = None
         self.selected_task = None
         self.saved_this_session = False
         self._drag_pos = None
-        self._resizing = False
-        self._resize_dir = None
+        self._resize_edges = None
+        self._resize_origin = None
+        self._pointer_pos = None
+        self.frame_timer = QTimer(self)
+        self.frame_timer.setInterval(RESIZE_FRAME_MS)
+        self.frame_timer.setSingleShot(True)
+        self.frame_timer.timeout.connect(self.apply_pointer_geometry)
+        self.resize_settle_timer = QTimer(self)
+        self.resize_settle_timer.setInterval(RESIZE_SETTLE_MS)
+        self.resize_settle_timer.setSingleShot(True)
+        self.resize_settle_timer.timeout.connect(self.finish_live_resize)
         self.save_content_timer = QTimer(self)
-        self.save_content_timer.setInterval(500)
+        self.save_content_timer.setInterval(SAVE_DEBOUNCE_MS)
         self.save_content_timer.setSingleShot(True)
         self.save_content_timer.timeout.connect(self.save_task_content_actual)
+        self.document_cache = DocumentCache()
+        self.prefetch_queue = []
+        self.prefetch_timer = QTimer(self)
+        self.prefetch_timer.setInterval(0)
+        self.prefetch_timer.timeout.connect(self.prefetch_next_document)
+        self.prune_timer = QTimer(self)
+        self.prune_timer.setInterval(REVISION_PRUNE_DELAY_MS)
+        self.prune_timer.setSingleShot(True)
+        self.prune_timer.timeout.connect(self.db.prune_revisions)
+        self.prune_timer.timeout.connect(self.db.prune_change_log)
+        self.change_timer = QTimer(self)
+        self.change_timer.setInterval(CHANGE_POLL_MS)
+        self.change_timer.timeout.connect(self.apply_remote_changes)
+        self.convert_timer = QTimer(self)
+        self.convert_timer.setInterval(CONTENT_CONVERT_DELAY_MS)
+        self.convert_timer.timeout.connect(self.convert_html_notes)
+        self.convert_queue = []
+        self.convert_after_id = 0
+        self.search_generation = 0
+        self.transfer_thread = None
+        self.transfer_worker = None
+        self.transfer_dialog = None
+        self.backup_running = False
+        self.backup_timer = QTimer(self)
+        self.backup_timer.setInterval(BACKUP_STARTUP_DELAY_MS)
+        self.backup_timer.timeout.connect(self.check_backup)
+        self.search_timer = QTimer(self)
+        self.search_timer.setInterval(SEARCH_DEBOUNCE_MS)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.timeout.connect(self.run_search)
+        self.search_thread = QThread(self)
+        self.search_worker = SearchWorker(self.db.db_path)
+        self.search_worker.moveToThread(self.search_thread)
+        self.search_requested.connect(self.search_worker.search)
+        self.search_worker.results_ready.connect(self.show_search_results)
+        self.search_thread.finished.connect(self.search_worker.close)
+        self.idle_monitor = InputIdleMonitor(self)
+        QApplication.instance().installEventFilter(self.idle_monitor)
+        self.maintenance_timer = QTimer(self)
+        self.maintenance_timer.setInterval(MAINTENANCE_CHECK_MS)
+        self.maintenance_timer.timeout.connect(self.run_maintenance)
+        self.maintenance_busy = False
+        self.maintenance_error = None
+        self.last_optimize = None
+        self.last_sweep = None
+        self.maintenance_thread = QThread(self)
+        self.maintenance_worker = MaintenanceWorker(self.db.db_path)
+        self.maintenance_worker.moveToThread(self.maintenance_thread)
+        self.maintenance_requested.connect(self.maintenance_worker.maintain)
+        self.stats_requested.connect(self.maintenance_worker.stats)
+        self.maintenance_worker.maintained.connect(self.finish_maintenance)
+        self.maintenance_worker.failed.connect(self.maintenance_failed)
+        self.maintenance_thread.finished.connect(self.maintenance_worker.close)
+        self.document_loader = DocumentLoader(self)
+        self.document_loader.loaded.connect(self.on_document_loaded)
         self.init_ui()
+        if profiler is not None:
+            self.init_profiler()
+        self.restore_session()
+
+    def init_profiler(self):
+        self.profile_timer = QTimer(self)
+        self.profile_timer.setInterval(PROFILE_HEARTBEAT_MS)
+        self.profile_timer.timeout.connect(profiler.heartbeat)
+        self.profile_timer.start()
+        self.profile_overlay = QLabel(self)
+        self.profile_overlay.setObjectName("profileOverlay")
+        self.profile_overlay.setAttribute(Qt.WidgetAttribute.WA_TransparentForMouseEvents)
+        self.profile_overlay.hide()
+        self.profile_overlay_timer = QTimer(self)
+        self.profile_overlay_timer.setInterval(500)
+        self.profile_overlay_timer.timeout.connect(self.refresh_profile_overlay)
+        toggle = QAction(self)
+        toggle.setShortcut(QKeySequence("Ctrl+Shift+P"))
+        toggle.triggered.connect(lambda: self.show_profile_overlay(self.profile_overlay.isHidden()))
+        self.addAction(toggle)
+
+    def show_profile_overlay(self, visible):
+        if visible:
+            self.refresh_profile_overlay()
+            self.profile_overlay.show()
+            self.profile_overlay.raise_()
+            self.profile_overlay_timer.start()
+        else:
+            self.profile_overlay_timer.stop()
+            self.profile_overlay.hide()
+
+    def refresh_profile_overlay(self):
+        self.profile_overlay.setText(profiler.summary())
+        self.profile_overlay.adjustSize()
+        self.profile_overlay.move(self.width() - self.profile_overlay.width() - 24, 24)
+
+    def save_profile_report(self):
+        try:
+            self.show_save_label(f"Profile saved to {os.path.basename(profiler.dump())}")
+        except OSError as error:
+            QMessageBox.warning(self, APP_NAME, str(error))
+
+    def restore_session(self):
+        geometry = self.settings.get('geometry')
+        if isinstance(geometry, list) and len(geometry) == 4 and all(isinstance(n, int) for n in geometry):
+            rect = QRect(*geometry)
+            # Skip it if the monitor it was on is gone
+            if QApplication.screenAt(rect.center()) is not None:
+                self.setGeometry(rect)
+        # Only the last open task is read before the first paint
+        task_id = self.settings.get('last_task')
+        if isinstance(task_id, int) and self.db.load_task(task_id):
+            self.select_task(task_id)
+        else:
+            # On startup, show right panel as blue and hide task editor
+            self.show_blank_right_panel()
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if not self.tree_loaded and not self.startup_scheduled:
+            # The first frame is on screen; fill in the rest on the next loop turn
+            self.startup_scheduled = True
+            QTimer.singleShot(0, self.finish_startup)
+
+    def finish_startup(self):
+        if self.tree_loaded:
+            return
+        self.db.load_index()
         self.load_categories()
-        # On startup, show right panel as blue and hide task editor
-        self.show_blank_right_panel()
+        scroll = self.settings.get('task_list_scroll')
+        if isinstance(scroll, int):
+            # The scroll range is normally only set on the next layout pass
+            self.task_list.updateGeometries()
+            self.task_list.verticalScrollBar().setValue(scroll)
+        elif self.selected_task in self.db.task_index:
+            self.task_list.scrollTo(self.task_model.index(self.task_model.task_row(self.selected_task)))
+        if self.selected_task is not None:
+            self.schedule_prefetch(self.selected_task)
+        self.tree_loaded = True
+        # Nothing below is needed to draw the first frame
+        self.search_thread.start()
+        self.maintenance_thread.start()
+        self.maintenance_timer.start()
+        self.prune_timer.start()
+        self.backup_timer.start()
+        self.change_timer.start()
+        self.convert_timer.start()
+        exe_dir = os.path.dirname(sys.executable) if getattr(sys, 'frozen', False) else os.path.dirname(__file__)
+        appico_path = os.path.join(exe_dir, "appico.ico")
+        if os.path.exists(appico_path):
+            self.setWindowIcon(cached_icon(appico_path))
 
-    def button_style(self):
-        return (
-            "QPushButton, QLineEdit {"
-            "background: #fff; color: #222; font-size: 18px; border-radius: 16px; border: 2px solid #222; padding: 5px 0; margin: 2px 0; font-family: serif;"
-            "}"
-            "QPushButton:hover { background: #d6d6d6; }"
-            "QLineEdit { padding-left: 16px; }"
-        )
+    def save_session(self):
+        g = self.geometry()
+        self.settings['geometry'] = [g.x(), g.y(), g.width(), g.height()]
+        self.settings['last_task'] = self.selected_task
+        if self.tree_loaded:
+            self.settings['task_list_scroll'] = self.task_list.verticalScrollBar().value()
+        try:
+            save_settings(self.settings_path, self.settings)
+        except OSError:
+            pass
 
     def load_categories(self):
-        # Clear area
-        while self.cat_task_area.count():
-            item = self.cat_task_area.takeAt(0)
-            widget = item.widget()
-            if widget:
-                widget.deleteLater()
-        # Load from DB
-        cats = self.db.get_categories()
-        for cat_id, cat_name in cats:
-            self.add_category_widget(cat_id, cat_name)
-
-    def add_category_widget(self, cat_id, cat_name):
-        cat_widget = QWidget()
-        cat_layout = QVBoxLayout(cat_widget)
-        cat_layout.setContentsMargins(0, 0, 0, 0)
-        cat_layout.setSpacing(2)
-        # Category button (always QPushButton)
-        cat_btn = QPushButton(cat_name)
-        cat_btn.setStyleSheet(self.button_style())
-        cat_btn.setFixedHeight(36)
-        cat_btn.setFont(self.font())
-        cat_btn.setCursor(Qt.CursorShape.PointingHandCursor)
-        cat_btn.clicked.connect(lambda _, cid=cat_id: self.select_category(cid))
-        cat_btn.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
-        cat_btn.customContextMenuRequested.connect(lambda _, cid=cat_id, btn=cat_btn: self.edit_category_name(cid, btn))
-        cat_btn.mouseDoubleClickEvent = lambda e, cid=cat_id, btn=cat_btn: self.edit_category_name(cid, btn)
-        # Tooltip for double click
-        cat_btn.setToolTip("Double Click To Edit!")
-        cat_btn.setToolTipDuration(2000)
-        cat_layout.addWidget(cat_btn)
-        # Tasks
-        tasks = self.db.get_tasks(cat_id)
-        for task in tasks:
-            task_id, task_name, important = task
-            self.add_task_widget(cat_layout, cat_id, task_id, task_name, important)
-        # Add Task button styled
-        add_task_btn = QPushButton("ADD TASK")
-        add_task_btn.setStyleSheet(self.button_style())
-        add_task_btn.setFixedHeight(36)
-        add_task_btn.setFont(self.font())
-        add_task_btn.clicked.connect(lambda _, cid=cat_id: self.add_task(cid))
-        cat_layout.addWidget(add_task_btn)
-        # Divider
-        divider = QFrame()
-        divider.setFrameShape(QFrame.Shape.HLine)
-        divider.setStyleSheet("color: #222; background: #222; height: 3px;")
-        cat_layout.addWidget(divider)
-        self.cat_task_area.addWidget(cat_widget)
-
-    def add_task_widget(self, parent_layout, cat_id, task_id, task_name, important):
-        task_widget = QWidget()
-        task_layout = QHBoxLayout(task_widget)
-        task_layout.setContentsMargins(0, 0, 0, 0)
-        task_layout.setSpacing(2)
-        # Star button
-        star_btn = QPushButton()
-        star_btn.setFixedSize(28, 28)
-        star_btn.setIcon(QIcon(STAR_FILLED_ICON if important else STAR_ICON))
-        star_btn.setIconSize(QSize(20, 20))
-        star_btn.setStyleSheet("border: none; background: transparent;")
-        star_btn.clicked.connect(lambda _, tid=task_id, btn=star_btn: self.toggle_task_important(tid, btn))
-        task_layout.addWidget(star_btn)
-        # Task button
-        task_btn = QPushButton(task_name)
-        task_btn.setStyleSheet(self.button_style())
-        task_btn.setFixedHeight(32)
-        task_btn.setFont(self.font())
-        task_btn.setCursor(Qt.CursorShape.PointingHandCursor)
-        task_btn.clicked.connect(lambda _, tid=task_id: self.select_task(tid))
-        task_btn.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
-        task_btn.customContextMenuRequested.connect(lambda _, tid=task_id, btn=task_btn: self.edit_task_name(tid, btn))
-        task_btn.mouseDoubleClickEvent = lambda e, tid=task_id, btn=task_btn: self.edit_task_name(tid, btn)
-        # Tooltip for double click
-        task_btn.setToolTip("Double Click To Edit!")
-        task_btn.setToolTipDuration(2000)
-        task_layout.addWidget(task_btn)
-        parent_layout.addWidget(task_widget)
-
-    def edit_category_name(self, cat_id, btn):
-        old_name = btn.text()
-        edit = QLineEdit(old_name)
-        edit.setStyleSheet(self.button_style())
-        edit.setFixedHeight(36)
-        edit.setAlignment(Qt.AlignmentFlag.AlignVCenter | Qt.AlignmentFlag.AlignLeft)
-        edit.setFont(btn.font())
-        edit.setFocus()
-        def finish_edit():
-            new_name = edit.text().strip()
-            if new_name:
-                self.db.update_category_name(cat_id, new_name)
-            self.load_categories()
-        edit.editingFinished.connect(finish_edit)
-        btn.parentWidget().layout().replaceWidget(btn, edit)
-        btn.deleteLater()
-        edit.setFocus()
-
-    def edit_task_name(self, task_id, btn):
-        old_name = btn.text()
-        edit = QLineEdit(old_name)
-        edit.setStyleSheet(self.button_style())
-        edit.setFixedHeight(32)
-        edit.setAlignment(Qt.AlignmentFlag.AlignVCenter | Qt.AlignmentFlag.AlignLeft)
-        edit.setFont(btn.font())
-        edit.setFocus()
-        def finish_edit():
-            new_name = edit.text().strip()
-            if new_name:
-                self.db.update_task_name(task_id, new_name)
-            self.load_categories()
-        edit.editingFinished.connect(finish_edit)
-        btn.parentWidget().layout().replaceWidget(btn, edit)
-        btn.deleteLater()
-        edit.setFocus()
-
-    def toggle_task_important(self, task_id, star_btn):
+        self.task_model.reload()
+
+    def on_task_row_clicked(self, index):
+        kind = index.data(RowKindRole)
+        if kind == ROW_CATEGORY:
+            self.select_category(index.data(CategoryIdRole))
+        elif kind == ROW_TASK:
+            # Ctrl/Shift-click only changes the selection
+            modifiers = QApplication.keyboardModifiers()
+            if not modifiers & (Qt.KeyboardModifier.ControlModifier | Qt.KeyboardModifier.ShiftModifier):
+                self.select_task(index.data(TaskIdRole))
+        elif kind == ROW_ADD_TASK:
+            self.add_task(index.data(CategoryIdRole))
+
+    def on_task_list_context_menu(self, pos):
+        # Right click renames a category; on a task it opens the task menu
+        index = self.task_list.indexAt(pos)
+        if not index.isValid():
+            return
+        if index.data(RowKindRole) == ROW_TASK:
+            self.show_task_menu(index, self.task_list.viewport().mapToGlobal(pos))
+        elif index.flags() & Qt.ItemFlag.ItemIsEditable:
+            self.task_list.edit(index)
+
+    def selected_task_ids(self):
+        return [index.data(TaskIdRole) for index in self.task_list.selectionModel().selectedRows()]
+
+    def show_task_menu(self, index, global_pos):
+        # Acts on the whole selection when the clicked task is part of it
+        task_ids = self.selected_task_ids()
+        if index.data(TaskIdRole) not in task_ids:
+            task_ids = [index.data(TaskIdRole)]
+        count = f" {len(task_ids)} TASKS" if len(task_ids) > 1 else ""
+        menu = QMenu(self)
+        if len(task_ids) == 1:
+            menu.addAction("Rename", lambda: self.task_list.edit(index))
+        move_menu = menu.addMenu(f"Move{count} to")
+        for cat_id, name in self.db.categories.items():
+            move_menu.addAction(name, lambda cat_id=cat_id: self.move_tasks(task_ids, cat_id))
+        menu.addAction(f"Star{count}", lambda: self.set_tasks_important(task_ids, 1))
+        menu.addAction(f"Unstar{count}", lambda: self.set_tasks_important(task_ids, 0))
+        menu.addAction(f"Duplicate{count}", lambda: self.duplicate_tasks(task_ids))
+        menu.addSeparator()
+        menu.addAction(f"Delete{count}", lambda: self.confirm_delete_tasks(task_ids))
+        menu.exec(global_pos)
+
+    def refresh_task_list(self):
+        # One model reset after a bulk change, keeping the scroll position
+        scroll = self.task_list.verticalScrollBar().value()
+        self.task_model.reload()
+        self.task_list.updateGeometries()
+        self.task_list.verticalScrollBar().setValue(scroll)
+
+    def apply_remote_changes(self):
+        # Patches the tree and the open note with what other instances committed since the last poll.
+        # A note with unsaved local edits keeps them; saving it then overwrites the other instance's copy.
+        selected = self.db.get_task(self.selected_task)
+        selected_hash = selected['content_hash'] if selected else None
+        changes = self.db.poll_changes()
+        if changes is None:
+            return
+        if changes is True:
+            self.document_cache.clear()
+            self.document_loader.stop()
+            self.refresh_task_list()
+            task = self.db.get_task(self.selected_task)
+            if self.selected_task is not None and task is None:
+                self.remove_selected_task()
+            elif task is not None:
+                self.task_title.setText(task['name'])
+                self.show_task_last_modified(task['last_modified'])
+                if task['content_hash'] != selected_hash:
+                    self.reload_task_content(self.selected_task)
+            if self.selected_category not in self.db.categories:
+                self.selected_category = None
+                self.clear_category_delete_button()
+            return
+        categories, tasks = changes
+        model = self.task_model
+        for cat_id, (old, new) in categories.items():
+            if old is None:
+                model.insert_category(cat_id)
+            elif new is not None:
+                if new['rank'] != old['rank']:
+                    model.move_category(cat_id)
+                model.dataChanged.emit(model.index(model.category_row(cat_id)), model.index(model.category_row(cat_id)))
+        for task_id, (old, new) in tasks.items():
+            if old is not None and (new is None or new['category_id'] != old['category_id']):
+                model.remove_task(old['category_id'], task_id)
+            if new is not None and new['category_id'] in model.category_tasks:
+                if task_id not in model.category_tasks[new['category_id']]:
+                    model.insert_task(task_id)
+                elif (new['name'], new['important'], new['rank']) != (old['name'], old['important'], old['rank']):
+                    model.update_task(task_id)
+            if old is None or new is None or new['content_hash'] != old['content_hash']:
+                self.document_cache.discard(task_id)
+                self.document_loader.discard(task_id)
+                if task_id == self.selected_task and new is not None:
+                    self.reload_task_content(task_id)
+            if task_id == self.selected_task:
+                if new is None:
+                    self.remove_selected_task()
+                    continue
+                self.task_title.setText(new['name'])
+                self.show_task_last_modified(new['last_modified'])
+        for cat_id, (old, new) in categories.items():
+            if new is None:
+                if self.selected_category == cat_id:
+                    self.selected_category = None
+                    self.clear_category_delete_button()
+                model.remove_category(cat_id)
+
+    def remove_selected_task(self):
+        self.save_content_timer.stop()
+        self.selected_task = None
+        self.clear_task_editor()
+        self.show_blank_right_panel()
+
+    def reload_task_content(self, task_id):
+        # Swaps in content saved by another instance, keeping the cursor and scroll position
+        if self.save_content_timer.isActive() or self.current_document.isModified():
+            return
+        editor = self.content_editor
+        position = editor.textCursor().position()
+        scroll = editor.verticalScrollBar().value()
+        self.document_cache.discard(task_id)
+        self.document_loader.discard(task_id)
+        content = self.db.get_task_content(task_id)
+        if len(content) > LARGE_NOTE_ASYNC_CHARS:
+            self.request_document(task_id, content)
+            self.show_document(self.loading_document)
+            return
+        document = self.load_task_document(task_id, content)
+        self.show_document(document)
+        editor = self.content_editor
+        cursor = editor.textCursor()
+        cursor.setPosition(min(position, document.characterCount() - 1))
+        editor.setTextCursor(cursor)
+        editor.verticalScrollBar().setValue(scroll)
+
+    def on_rows_dropped(self, dragged, row, below):
+        kind, cat_id, task_id = self.task_model.entry(row)
+        if dragged[0][0] == ROW_CATEGORY:
+            # Above a category's header goes before it; anywhere else in its block goes after it
+            ids = self.task_model.category_ids
+            before = cat_id if kind == ROW_CATEGORY and not below else (ids[ids.index(cat_id) + 1] if ids.index(cat_id) + 1 < len(ids) else None)
+            self.move_category(dragged[0][1], before)
+            return
+        task_ids = [item_id for _, item_id in dragged]
+        ids = self.task_model.category_ids
+        if kind == ROW_CATEGORY and not below and ids.index(cat_id) > 0:
+            # Above a header is the end of the category before it
+            cat_id = ids[ids.index(cat_id) - 1]
+            kind = ROW_ADD_TASK
+        tasks = self.task_model.category_tasks[cat_id]
+        if kind == ROW_TASK:
+            pos = tasks.index(task_id) + (1 if below else 0)
+        else:
+            pos = 0 if kind == ROW_CATEGORY else len(tasks)
+        # The first task after the drop point that is not itself being moved
+        before = next((tid for tid in tasks[pos:] if tid not in task_ids), None)
+        self.move_task_rows(task_ids, cat_id, before)
+
+    def move_task_rows(self, task_ids, cat_id, before=None):
+        # Each task is put before the same anchor, so they keep their relative order
+        for task_id in task_ids:
+            task = self.db.get_task(task_id)
+            if task is None:
+                continue
+            old_cat_id = task['category_id']
+            self.db.move_task(task_id, cat_id, before)
+            self.task_model.relocate_task(task_id, old_cat_id)
+        if self.selected_task in task_ids:
+            self.schedule_prefetch(self.selected_task)
+
+    def move_category(self, cat_id, before=None):
+        if self.db.move_category(cat_id, before):
+            self.task_model.move_category(cat_id)
+
+    def move_tasks(self, task_ids, cat_id):
+        self.db.move_tasks(task_ids, cat_id)
+        self.refresh_task_list()
+
+    def set_tasks_important(self, task_ids, important):
+        self.db.set_tasks_important(task_ids, important)
+        self.refresh_task_list()
+
+    def duplicate_tasks(self, task_ids):
+        self.flush_pending_content()
+        self.db.duplicate_tasks(task_ids, int(time.time()))
+        self.refresh_task_list()
+
+    def confirm_delete_tasks(self, task_ids):
+        if len(task_ids) > 1:
+            msg = QMessageBox(self)
+            msg.setWindowTitle("Delete Tasks")
+            msg.setText(f"This will delete {len(task_ids)} tasks. Continue?")
+            msg.setStandardButtons(QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
+            msg.setDefaultButton(QMessageBox.StandardButton.No)
+            if msg.exec() != QMessageBox.StandardButton.Yes:
+                return
+        self.delete_tasks(task_ids)
+
+    def delete_tasks(self, task_ids):
+        if self.selected_task in task_ids:
+            self.save_content_timer.stop()
+            self.selected_task = None
+            self.clear_task_editor()
+        self.db.delete_tasks(task_ids)
+        for task_id in task_ids:
+            self.document_cache.discard(task_id)
+        self.refresh_task_list()
+
+    def on_task_renamed(self, task_id, name):
+        if self.selected_task == task_id:
+            self.task_title.setText(name)
+
+    def toggle_task_important(self, task_id):
         # Toggle important
-        cur_tasks = self.db.conn.execute('SELECT important FROM tasks WHERE id=?', (task_id,)).fetchone()
-        important = 0 if cur_tasks and cur_tasks[0] else 1
+        task = self.db.get_task(task_id)
+        important = 0 if task and task['important'] else 1
         self.db.set_task_important(task_id, important)
-        star_btn.setIcon(QIcon(STAR_FILLED_ICON if important else STAR_ICON))
-        self.load_categories()
+        self.task_model.update_task(task_id)
 
     def select_category(self, cat_id):
         self.selected_category = cat_id
@@ -315,59 +1725,350 @@ class MainWindow(QWidget):
         self.show_blank_right_panel()
 
     def select_task(self, task_id):
+        self.flush_pending_content()
         self.selected_task = task_id
-        name = None
-        # Find name
-        cats = self.db.get_categories()
-        for cat_id, _ in cats:
-            tasks = self.db.get_tasks(cat_id)
-            for tid, tname, _ in tasks:
-                if tid == task_id:
-                    name = tname
-                    break
-        self.task_title.setText(name or "TASK")
-        content = self.db.get_task_content(task_id)
-        # Set as HTML
-        self.task_content.setHtml(content)
-        last_modified = self.db.get_task_last_modified(task_id)
-        self.show_task_last_modified(last_modified)
+        task = self.db.get_task(task_id)
+        self.task_title.setText(task['name'] if task else "TASK")
+        # Recently used tasks are a document swap, others are built from the stored note once;
+        # large notes are parsed on the loader thread behind a read-only placeholder
+        document = self.document_cache.get(task_id)
+        if document is None:
+            content = self.db.get_task_content(task_id)
+            if len(content) > LARGE_NOTE_ASYNC_CHARS:
+                self.request_document(task_id, content)
+                document = self.loading_document
+            else:
+                document = self.load_task_document(task_id, content)
+        self.document_cache.pinned = task_id
+        self.show_document(document)
+        self.schedule_prefetch(task_id)
+        self.show_task_last_modified(task['last_modified'] if task else None)
         self.add_task_delete_button()
         self.clear_category_delete_button()
         # Show task editor and switch to white background
         self.task_title.show()
-        self.task_content.show()
-        self.right_panel.setStyleSheet("background-color: #fff; border-radius: 14px; border: 3px solid #222;")
+        self.content_editor.show()
+        self.set_right_panel_active(True)
+
+    def plain_text_mode(self, char_count):
+        return bool(self.settings.get('plain_text_large_notes')) and char_count > LARGE_NOTE_PLAIN_CHARS
+
+    def load_task_document(self, task_id, content=None):
+        if content is None:
+            content = self.db.get_task_content(task_id)
+        document = build_task_document(content, self.task_content.font(), self.plain_text_mode(len(content)))
+        self.document_cache.put(task_id, document, document_cost(content))
+        return document
+
+    def request_document(self, task_id, content):
+        self.document_loader.load(
+            task_id, content, self.task_content.font(), self.plain_text_mode(len(content)), urgent=task_id == self.selected_task
+        )
+
+    def on_document_loaded(self, task_id, document, size):
+        if self.db.get_task(task_id) is None:
+            return
+        self.document_cache.put(task_id, document, size)
+        if self.selected_task == task_id and self.current_document is self.loading_document:
+            self.show_document(document)
+
+    def show_document(self, document):
+        old = self.current_document
+        if old is document:
+            return
+        old.contentsChange.disconnect(self.save_task_content)
+        if document.defaultFont() != self.task_content.font():
+            document.setDefaultFont(self.task_content.font())
+        # Plain-text documents need QPlainTextEdit's layout; the idle editor drops its document
+        if is_plain_document(document):
+            editor, other, other_empty = self.plain_content, self.task_content, self.empty_document
+        else:
+            editor, other, other_empty = self.task_content, self.plain_content, self.empty_plain_document
+        if other.document() is not other_empty:
+            other.setDocument(other_empty)
+        editor.setDocument(document)
+        editor.setReadOnly(document is self.loading_document)
+        if not other.isHidden():
+            other.hide()
+            editor.show()
+        self.content_editor = editor
+        self.current_document = document
+        document.contentsChange.connect(self.save_task_content)
+        self.save_content_timer.stop()
+
+    def neighbour_task_ids(self, task_id):
+        task = self.db.get_task(task_id)
+        ordered = self.task_model.category_tasks.get(task['category_id'], []) if task else []
+        if task_id not in ordered:
+            return []
+        pos = ordered.index(task_id)
+        n = DOCUMENT_PREFETCH_NEIGHBOURS
+        return ordered[pos + 1:pos + 1 + n] + ordered[max(0, pos - n):pos][::-1]
+
+    def schedule_prefetch(self, task_id):
+        # Parse neighbouring tasks one per event-loop turn so input stays responsive
+        self.prefetch_queue = [tid for tid in self.neighbour_task_ids(task_id) if tid not in self.document_cache]
+        if self.prefetch_queue:
+            self.prefetch_timer.start()
+
+    def prefetch_next_document(self):
+        if not self.prefetch_queue:
+            self.prefetch_timer.stop()
+            return
+        task_id = self.prefetch_queue.pop(0)
+        if task_id not in self.document_cache and task_id not in self.document_loader and self.db.get_task(task_id):
+            content = self.db.get_task_content(task_id)
+            if len(content) > LARGE_NOTE_ASYNC_CHARS:
+                self.request_document(task_id, content)
+                return
+            self.load_task_document(task_id, content)
+            # Prefetched documents are evicted before ones the user actually opened
+            self.document_cache.documents.move_to_end(task_id, last=False)
 
     def add_category(self):
         cat_id = self.db.add_category()
-        self.load_categories()
+        self.task_model.insert_category(cat_id)
+        self.task_list.scrollTo(self.task_model.index(self.task_model.category_row(cat_id)))
 
     def add_task(self, cat_id):
         task_id = self.db.add_task(cat_id)
-        self.db.update_task_last_modified(task_id, QDateTime.currentDateTime().toString("yyyy-MM-dd HH:mm"))
-        self.load_categories()
+        self.db.update_task_last_modified(task_id, int(time.time()))
+        self.task_model.insert_task(task_id)
 
-    def save_task_content(self):
-        # Debounced save: restart timer on each text change
+    def save_task_content(self, position=0, chars_removed=0, chars_added=0):
+        # Debounced save: restart timer on each document change
+        document = self.current_document
+        if not document.isModified():
+            return
+        self.save_content_timer.setInterval(save_debounce_interval(document.characterCount()))
         self.save_content_timer.start()
 
     def save_task_content_actual(self):
-        if self.selected_task:
-            # Save as HTML
-            content = self.task_content.toHtml()
-            self.db.update_task_content(self.selected_task, content)
-            self.db.update_task_last_modified(self.selected_task, QDateTime.currentDateTime().toString("yyyy-MM-dd HH:mm"))
-            self.show_task_last_modified(QDateTime.currentDateTime().toString("yyyy-MM-dd HH:mm"))
+        document = self.current_document
+        if self.selected_task and document.isModified():
+            # Skipped when it matches what is stored
+            content = text_to_content(document.toPlainText()) if is_plain_document(document) else document_content(document)
+            document.setModified(False)
+            if not self.db.update_task_content(self.selected_task, content, document.toPlainText()):
+                return
+            now = int(time.time())
+            self.db.update_task_last_modified(self.selected_task, now)
+            self.show_task_last_modified(now)
+
+    def convert_html_notes(self):
+        # Moves notes saved as HTML to the compact format a slice at a time, only while nothing is
+        # being typed, loaded or transferred. A note whose formatting the compact format cannot hold
+        # exactly stays HTML.
+        self.convert_timer.setInterval(CONTENT_CONVERT_INTERVAL_MS)
+        if self.save_content_timer.isActive() or self.document_loader.jobs or self.transfer_thread is not None:
+            return
+        deadline = time.perf_counter() + CONTENT_CONVERT_BUDGET_MS / 1000
+        while time.perf_counter() < deadline:
+            if not self.convert_queue:
+                self.convert_queue = self.db.html_content_ids(self.convert_after_id, CONTENT_CONVERT_MAX_CHARS, CONTENT_CONVERT_BATCH)
+                if not self.convert_queue:
+                    self.convert_timer.stop()
+                    return
+                self.convert_after_id = self.convert_queue[-1]
+            task_id = self.convert_queue.pop(0)
+            content = self.db.get_task_content(task_id)
+            if is_compact(content):
+                continue
+            compact = compact_equivalent(content, self.task_content.font())
+            if compact is not None:
+                self.db.replace_task_content(task_id, content, compact)
+
+    def run_maintenance(self):
+        # Hands the worker one bounded job once keyboard and mouse have been quiet for a while and
+        # nothing is being saved, loaded or transferred. The UI thread itself runs no SQL for it.
+        if (self.maintenance_busy or self.idle_monitor.idle_ms() < MAINTENANCE_IDLE_MS
+                or self.save_content_timer.isActive() or self.document_loader.jobs or self.transfer_thread is not None):
+            return
+        self.maintenance_busy = True
+        optimize = self.last_optimize is None or time.monotonic() - self.last_optimize >= OPTIMIZE_INTERVAL_HOURS * 3600
+        sweep = self.last_sweep is None or time.monotonic() - self.last_sweep >= ATTACHMENT_SWEEP_INTERVAL_HOURS * 3600
+        self.maintenance_requested.emit(optimize, sweep)
+
+    def finish_maintenance(self, kind, free_pages):
+        self.maintenance_busy = False
+        self.maintenance_error = None
+        if kind == "optimize":
+            self.last_optimize = time.monotonic()
+        elif kind == "attachments":
+            self.last_sweep = time.monotonic()
+        # Jobs follow each other a step apart until one finds nothing to do, then checks slow down
+        self.maintenance_timer.setInterval(MAINTENANCE_STEP_MS if kind else MAINTENANCE_CHECK_MS)
+
+    def maintenance_failed(self, message):
+        # Usually the write lock was busy; the next idle check tries again
+        self.maintenance_busy = False
+        self.maintenance_error = message
+        self.maintenance_timer.setInterval(MAINTENANCE_CHECK_MS)
+
+    def flush_pending_content(self):
+        # Run a debounced save now instead of waiting for the timer
+        if self.save_content_timer.isActive():
+            self.save_content_timer.stop()
+            self.save_task_content_actual()
 
     def save_all(self):
-        self.db.save()
+        self.flush_pending_content()
+        self.db.save("PASSIVE" if self.backup_running else "FULL")
         self.saved_this_session = True
         self.show_save_label()
 
-    def show_save_label(self):
-        self.save_label.setText("Saved!")
+    def show_save_label(self, text="Saved!"):
+        self.save_label.setText(text)
         self.save_label.show()
-        QTimer.singleShot(1000, self.save_label.hide)
+        QTimer.singleShot(1000 if text == "Saved!" else 3000, self.save_label.hide)
+
+    def show_tools_menu(self):
+        menu = QMenu(self)
+        menu.addAction("Export as JSON Lines...", self.export_jsonl)
+        menu.addAction("Export as Markdown folder...", self.export_markdown)
+        menu.addSeparator()
+        menu.addAction("Import JSON Lines...", self.import_jsonl)
+        menu.addAction("Import Markdown folder...", self.import_markdown)
+        menu.addSeparator()
+        menu.addAction("Back up now", self.back_up_now)
+        for action in menu.actions():
+            action.setEnabled(self.transfer_thread is None)
+        menu.addAction("Database statistics...", self.show_database_stats)
+        menu.addSeparator()
+        plain = menu.addAction(f"Edit notes over {LARGE_NOTE_PLAIN_CHARS // (1024 * 1024)} MB as plain text (drops their formatting)")
+        plain.setCheckable(True)
+        plain.setChecked(bool(self.settings.get('plain_text_large_notes')))
+        plain.toggled.connect(self.set_plain_text_mode)
+        if profiler is not None:
+            menu.addSeparator()
+            overlay = menu.addAction("Show profiler overlay (Ctrl+Shift+P)")
+            overlay.setCheckable(True)
+            overlay.setChecked(self.profile_overlay.isVisible())
+            overlay.toggled.connect(self.show_profile_overlay)
+            menu.addAction("Save profile report", self.save_profile_report)
+        menu.exec(self.tools_btn.mapToGlobal(self.tools_btn.rect().topLeft()))
+
+    def export_jsonl(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Export", "planner.jsonl", "JSON Lines (*.jsonl)")
+        if path:
+            self.flush_pending_content()
+            self.db.writer.flush()
+            db_path = self.db.db_path
+            self.start_transfer("Exporting...", lambda progress: f"Exported {export_jsonl(db_path, path, progress)} tasks")
+
+    def export_markdown(self):
+        folder = QFileDialog.getExistingDirectory(self, "Export to folder")
+        if folder:
+            self.flush_pending_content()
+            self.db.writer.flush()
+            db_path = self.db.db_path
+            self.start_transfer("Exporting...", lambda progress: f"Exported {export_markdown(db_path, folder, progress)} tasks")
+
+    def import_jsonl(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Import", "", "JSON Lines (*.jsonl);;All files (*)")
+        if path:
+            db_path = self.db.db_path
+            self.start_transfer(
+                "Importing...", lambda progress: f"Imported {import_records(db_path, iter_jsonl_records(path, progress))} tasks",
+                self.finish_import
+            )
+
+    def import_markdown(self):
+        folder = QFileDialog.getExistingDirectory(self, "Import folder")
+        if folder:
+            db_path = self.db.db_path
+            self.start_transfer(
+                "Importing...", lambda progress: f"Imported {import_records(db_path, iter_markdown_records(folder, progress))} tasks",
+                self.finish_import
+            )
+
+    def back_up_now(self):
+        self.start_backup("Backing up...")
+
+    def check_backup(self):
+        self.backup_timer.setInterval(BACKUP_CHECK_MS)
+        hours = self.settings.get('backup_interval_hours', BACKUP_INTERVAL_HOURS)
+        if not isinstance(hours, (int, float)) or hours <= 0 or self.transfer_thread is not None:
+            return
+        backups = list_backups(self.backup_folder())
+        try:
+            age = time.time() - os.path.getmtime(backups[-1]) if backups else None
+        except OSError:
+            age = None
+        if age is None or age >= hours * 3600:
+            self.start_backup()
+
+    def backup_folder(self):
+        # Kept beside the database it copies
+        return os.path.join(os.path.dirname(os.path.abspath(self.db.db_path)), BACKUP_FOLDER)
+
+    def start_backup(self, title=None):
+        # Scheduled backups run without a progress dialog
+        self.flush_pending_content()
+        self.db.writer.flush()
+        db_path, folder = self.db.db_path, self.backup_folder()
+        generations = self.settings.get('backup_generations', BACKUP_GENERATIONS)
+        if not isinstance(generations, int):
+            generations = BACKUP_GENERATIONS
+        self.backup_running = True
+        self.start_transfer(
+            title, lambda progress: f"Backed up to {os.path.basename(backup_database(db_path, folder, generations, progress))}",
+            self.finish_backup
+        )
+
+    def finish_backup(self):
+        self.backup_running = False
+
+    def set_plain_text_mode(self, enabled):
+        self.flush_pending_content()
+        self.settings['plain_text_large_notes'] = enabled
+        # Cached and half-built documents are for the other mode
+        self.document_loader.stop()
+        self.document_cache.clear()
+        if self.selected_task is not None:
+            self.select_task(self.selected_task)
+
+    def start_transfer(self, title, job, on_done=None):
+        # One transfer at a time; the window stays usable while it runs. A None title runs it without a dialog
+        self.transfer_thread = QThread(self)
+        self.transfer_worker = TransferWorker(job)
+        self.transfer_worker.moveToThread(self.transfer_thread)
+        if title is not None:
+            self.transfer_dialog = QProgressDialog(title, "Cancel", 0, 100, self)
+            self.transfer_dialog.setWindowModality(Qt.WindowModality.NonModal)
+            self.transfer_dialog.setMinimumDuration(300)
+            self.transfer_dialog.setAutoClose(False)
+            self.transfer_dialog.setAutoReset(False)
+            self.transfer_dialog.canceled.connect(self.transfer_worker.cancelled.set)
+            self.transfer_worker.progress.connect(self.transfer_dialog.setValue)
+        self.transfer_worker.done.connect(lambda message: self.finish_transfer(message, on_done))
+        self.transfer_worker.failed.connect(lambda message: self.finish_transfer(message, on_done, failed=True))
+        self.transfer_thread.started.connect(self.transfer_worker.run)
+        self.transfer_thread.start()
+
+    def finish_transfer(self, message, on_done=None, failed=False):
+        self.transfer_thread.quit()
+        self.transfer_thread.wait()
+        quiet = self.transfer_dialog is None
+        if not quiet:
+            self.transfer_dialog.close()
+            self.transfer_dialog.deleteLater()
+        self.transfer_worker.deleteLater()
+        self.transfer_thread.deleteLater()
+        self.transfer_thread = self.transfer_worker = self.transfer_dialog = None
+        if on_done:
+            # Runs after a failed or cancelled import too: earlier batches are already committed
+            on_done()
+        if failed and not quiet:
+            QMessageBox.warning(self, APP_NAME, message)
+        elif failed:
+            self.show_save_label("Backup failed")
+        elif not quiet:
+            self.show_save_label(message)
+
+    def finish_import(self):
+        self.db.load_index()
+        self.refresh_task_list()
 
     def init_ui(self):
         # Main layout
@@ -376,7 +2077,7 @@ class MainWindow(QWidget):
         main_layout.setSpacing(0)
         # Left panel
         self.left_panel = QFrame()
-        self.left_panel.setStyleSheet("background-color: #3A4352; border-radius: 10px;")
+        self.left_panel.setObjectName("leftPanel")
         self.left_panel.setMinimumWidth(320)
         self.left_panel.setSizePolicy(self.left_panel.sizePolicy().horizontalPolicy(), self.left_panel.sizePolicy().verticalPolicy())
         left_layout = QVBoxLayout(self.left_panel)
@@ -384,18 +2085,40 @@ class MainWindow(QWidget):
         left_layout.setSpacing(10)
         # App title as tab (closer to top)
         self.title_label = QLabel(APP_NAME)
-        self.title_label.setStyleSheet("font-size: 24px; font-weight: bold; font-family: serif; color: #222; background: #EDEDED; border: 3px solid #222; border-radius: 12px; padding: 2px 12px;")
+        self.title_label.setObjectName("appTitle")
         self.title_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
         self.title_label.setFixedHeight(40)
         self.title_label.setFixedWidth(280)
         left_layout.addWidget(self.title_label, alignment=Qt.AlignmentFlag.AlignTop)
-        # Category/task area
-        self.cat_task_area = QVBoxLayout()
-        self.cat_task_area.setSpacing(8)
-        left_layout.addLayout(self.cat_task_area)
+        # Search box and results
+        self.search_box = QLineEdit()
+        self.search_box.setPlaceholderText("Search notes...")
+        self.search_box.setProperty("role", "pill")
+        self.search_box.setFixedHeight(36)
+        self.search_box.setClearButtonEnabled(True)
+        self.search_box.textChanged.connect(lambda _: self.search_timer.start())
+        left_layout.addWidget(self.search_box)
+        self.search_results = QListWidget()
+        self.search_results.setObjectName("searchResults")
+        self.search_results.setMaximumHeight(260)
+        self.search_results.itemClicked.connect(self.open_search_result)
+        self.search_results.hide()
+        left_layout.addWidget(self.search_results)
+        # Category/task list
+        self.task_model = TaskListModel(self.db, self)
+        self.task_model.task_renamed.connect(self.on_task_renamed)
+        self.task_delegate = TaskRowDelegate(self)
+        self.task_delegate.star_clicked.connect(self.toggle_task_important)
+        self.task_list = TaskListView()
+        self.task_list.setModel(self.task_model)
+        self.task_list.setItemDelegate(self.task_delegate)
+        self.task_list.clicked.connect(self.on_task_row_clicked)
+        self.task_list.customContextMenuRequested.connect(self.on_task_list_context_menu)
+        self.task_list.rows_dropped.connect(self.on_rows_dropped)
+        left_layout.addWidget(self.task_list, 1)
         # Add Category button
         self.add_cat_btn = QPushButton("ADD CATEGORY")
-        self.add_cat_btn.setStyleSheet(self.button_style())
+        self.add_cat_btn.setProperty("role", "pill")
         self.add_cat_btn.clicked.connect(self.add_category)
         left_layout.addWidget(self.add_cat_btn, alignment=Qt.AlignmentFlag.AlignBottom)
         # Save icon, question icon, and label
@@ -403,22 +2126,28 @@ class MainWindow(QWidget):
         save_row.setContentsMargins(0, 0, 0, 0)
         save_row.setSpacing(6)
         self.save_btn = QPushButton()
-        self.save_btn.setIcon(QIcon(ICON_PATH))
+        self.save_btn.setIcon(cached_icon(ICON_PATH))
         self.save_btn.setIconSize(QSize(28, 28))
         self.save_btn.setFixedSize(38, 38)
-        self.save_btn.setStyleSheet("border: none; background: transparent;")
+        self.save_btn.setProperty("role", "icon")
         self.save_btn.clicked.connect(self.save_all)
         save_row.addWidget(self.save_btn, alignment=Qt.AlignmentFlag.AlignLeft)
         # Question/help icon
         self.help_btn = QPushButton()
-        self.help_btn.setIcon(QIcon(QUESTION_ICON))
+        self.help_btn.setIcon(cached_icon(QUESTION_ICON))
         self.help_btn.setIconSize(QSize(28, 28))
         self.help_btn.setFixedSize(38, 38)
-        self.help_btn.setStyleSheet("border: none; background: transparent;")
+        self.help_btn.setProperty("role", "icon")
         self.help_btn.clicked.connect(self.show_help_dialog)
         save_row.addWidget(self.help_btn, alignment=Qt.AlignmentFlag.AlignLeft)
+        # Export/import and other maintenance
+        self.tools_btn = QPushButton("⋯")
+        self.tools_btn.setFixedSize(38, 38)
+        self.tools_btn.setProperty("role", "icon")
+        self.tools_btn.clicked.connect(self.show_tools_menu)
+        save_row.addWidget(self.tools_btn, alignment=Qt.AlignmentFlag.AlignLeft)
         self.save_label = QLabel("")
-        self.save_label.setStyleSheet("color: white; font-weight: bold; background: #222; border-radius: 8px; padding: 2px 12px; min-width: 0px; min-height: 0px;")
+        self.save_label.setObjectName("saveLabel")
         self.save_label.setFixedHeight(24)
         self.save_label.setSizePolicy(QSizePolicy.Policy.Fixed, QSizePolicy.Policy.Fixed)
         self.save_label.hide()
@@ -427,7 +2156,8 @@ class MainWindow(QWidget):
         left_layout.addLayout(save_row)
         # Right panel
         self.right_panel = QFrame()
-        self.right_panel.setStyleSheet("background-color: #3A4352; border-radius: 14px; border: 3px solid #222;")
+        self.right_panel.setObjectName("rightPanel")
+        self.right_panel_active = False
         right_layout = QVBoxLayout(self.right_panel)
         right_layout.setContentsMargins(20, 20, 20, 20)
         right_layout.setSpacing(12)
@@ -437,10 +2167,10 @@ class MainWindow(QWidget):
         right_top_bar.setSpacing(0)
         right_top_bar.addStretch()
         self.close_btn = QPushButton()
-        self.close_btn.setIcon(QIcon(CLOSE_ICON))
+        self.close_btn.setIcon(cached_icon(CLOSE_ICON))
         self.close_btn.setIconSize(QSize(16, 16))
         self.close_btn.setFixedSize(22, 22)
-        self.close_btn.setStyleSheet("QPushButton { color: #222; background: transparent; border: none; } QPushButton:hover { background: transparent; color: #a33; }")
+        self.close_btn.setObjectName("closeButton")
         self.close_btn.setCursor(Qt.CursorShape.PointingHandCursor)
         self.close_btn.clicked.connect(self.close)
         self.close_btn.setToolTip("")
@@ -448,15 +2178,34 @@ class MainWindow(QWidget):
         right_top_bar.addWidget(self.close_btn, alignment=Qt.AlignmentFlag.AlignTop | Qt.AlignmentFlag.AlignRight)
         right_layout.addLayout(right_top_bar)
         self.task_title = QLabel("TASK 1")
-        self.task_title.setStyleSheet("font-size: 24px; font-weight: bold;")
+        self.task_title.setObjectName("taskTitle")
         right_layout.addWidget(self.task_title)
         # Replace QTextEdit with RichTextEdit for task content
         self.task_content = RichTextEdit()
-        self.task_content.setStyleSheet("font-size: 18px; background: #fff; border: 2px solid #222;")
+        self.task_content.installEventFilter(self)
+        self.task_content.setObjectName("taskContent")
         self.task_content.setMinimumHeight(350)
-        self.task_content.textChanged.connect(self.save_task_content)
+        # The editor's own document belongs to its text control and dies on the first swap
+        self.empty_document = QTextDocument(self)
+        self.task_content.setDocument(self.empty_document)
+        self.empty_document.contentsChange.connect(self.save_task_content)
+        self.current_document = self.empty_document
+        self.content_editor = self.task_content
+        self.loading_document = QTextDocument(self)
+        self.loading_document.setPlainText("Loading...")
+        self.loading_document.setModified(False)
         right_layout.addWidget(self.task_content)
+        # Huge notes in plain-text mode skip rich text layout
+        self.plain_content = QPlainTextEdit()
+        self.plain_content.setObjectName("taskContent")
+        self.plain_content.setMinimumHeight(350)
+        self.empty_plain_document = QTextDocument(self)
+        self.empty_plain_document.setDocumentLayout(QPlainTextDocumentLayout(self.empty_plain_document))
+        self.plain_content.setDocument(self.empty_plain_document)
+        self.plain_content.hide()
+        right_layout.addWidget(self.plain_content)
         self.right_panel_layout = right_layout
+        self.init_right_panel_chrome()
         main_layout.addWidget(self.left_panel)
         main_layout.addWidget(self.right_panel)
         # Add QSizeGrip for resizing (bottom right corner)
@@ -466,44 +2215,267 @@ class MainWindow(QWidget):
         self.setMinimumSize(650, 500)
         self.setSizePolicy(self.sizePolicy().horizontalPolicy(), self.sizePolicy().verticalPolicy())
 
-    def add_task_delete_button(self):
-        # Only show in right panel when a task is selected
-        if hasattr(self, 'task_delete_btn') and self.task_delete_btn:
-            self.task_delete_btn.hide()
-        self.task_delete_btn = QPushButton("✕")
-        self.task_delete_btn.setFixedSize(20, 20)
-        self.task_delete_btn.setStyleSheet(
-            "QPushButton { color: #000; background: #fff; border: 1px solid #000; border-radius: 10px; font-size: 12px; } "
-            "QPushButton:hover { color: #fff; background: #000; border: 1px solid #000; }"
-        )
-        self.task_delete_btn.setCursor(Qt.CursorShape.PointingHandCursor)
+    def run_search(self):
+        self.search_generation += 1
+        self.search_worker.latest_generation = self.search_generation
+        text = self.search_box.text()
+        if not fts_query(text):
+            self.show_search_results(self.search_generation, [])
+            return
+        self.search_requested.emit(self.search_generation, text)
+
+    def show_search_results(self, generation, results):
+        if generation != self.search_generation:
+            return
+        self.search_results.clear()
+        for task_id, name, snippet in results:
+            label = QLabel(f"<b>{html.escape(name)}</b><br><span style='color:#555;'>{snippet}</span>")
+            label.setWordWrap(True)
+            label.setProperty("role", "searchResult")
+            item = QListWidgetItem()
+            item.setData(Qt.ItemDataRole.UserRole, task_id)
+            item.setSizeHint(label.sizeHint())
+            self.search_results.addItem(item)
+            self.search_results.setItemWidget(item, label)
+        self.search_results.setVisible(bool(results) or bool(fts_query(self.search_box.text())))
+
+    def open_search_result(self, item):
+        self.task_list.clearSelection()
+        self.select_task(item.data(Qt.ItemDataRole.UserRole))
+
+    def init_right_panel_chrome(self):
+        # Created once and shown/hidden per selection, so nothing piles up in the layout
+        self.task_footer = QWidget()
+        footer_layout = QHBoxLayout(self.task_footer)
+        footer_layout.setContentsMargins(0, 0, 0, 0)
+        footer_layout.setSpacing(10)
+        self.history_btn = QPushButton("History")
+        self.history_btn.setObjectName("historyButton")
+        self.history_btn.setCursor(Qt.CursorShape.PointingHandCursor)
+        self.history_btn.clicked.connect(self.show_history_dialog)
+        footer_layout.addWidget(self.history_btn)
+        self.last_modified_label = QLabel("")
+        self.last_modified_label.setObjectName("lastModified")
+        self.last_modified_label.setAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignBottom)
+        footer_layout.addWidget(self.last_modified_label)
+        self.task_footer.hide()
+        self.right_panel_layout.addWidget(self.task_footer, alignment=Qt.AlignmentFlag.AlignBottom | Qt.AlignmentFlag.AlignRight)
+        self.task_delete_btn = self.make_delete_button()
         self.task_delete_btn.clicked.connect(self.delete_selected_task)
         self.right_panel_layout.addWidget(self.task_delete_btn, alignment=Qt.AlignmentFlag.AlignTop | Qt.AlignmentFlag.AlignRight)
+        self.cat_delete_btn = self.make_delete_button()
+        self.cat_delete_btn.clicked.connect(lambda: self.confirm_delete_category(self.selected_category))
+        self.right_panel_layout.addWidget(self.cat_delete_btn, alignment=Qt.AlignmentFlag.AlignBottom | Qt.AlignmentFlag.AlignRight)
+
+    def make_delete_button(self):
+        btn = QPushButton("✕")
+        btn.setFixedSize(20, 20)
+        btn.setProperty("role", "delete")
+        btn.setCursor(Qt.CursorShape.PointingHandCursor)
+        btn.hide()
+        return btn
+
+    def set_right_panel_active(self, active):
+        # White when a task is open; the [active] selector needs the frame and its labels re-polished
+        if self.right_panel_active == active:
+            return
+        self.right_panel_active = active
+        self.right_panel.setProperty("active", active)
+        for widget in [self.right_panel] + self.right_panel.findChildren(QLabel):
+            widget.style().unpolish(widget)
+            widget.style().polish(widget)
+            widget.update()
+
+    def show_history_dialog(self):
+        # Lists revisions a page at a time and rebuilds one only when it is clicked
+        task_id = self.selected_task
+        if task_id is None:
+            return
+        self.flush_pending_content()
+        self.db.writer.flush()
+        dialog = QDialog(self)
+        dialog.setWindowTitle(f"History: {self.db.get_task(task_id)['name']}")
+        dialog.resize(820, 520)
+        layout = QVBoxLayout(dialog)
+        body = QHBoxLayout()
+        revisions = QListWidget()
+        revisions.setFixedWidth(240)
+        body.addWidget(revisions)
+        preview = QTextEdit()
+        preview.setReadOnly(True)
+        preview.setDocument(TaskDocument(preview))
+        body.addWidget(preview, 1)
+        layout.addLayout(body)
+        buttons = QHBoxLayout()
+        buttons.addStretch(1)
+        restore_btn = QPushButton("Restore this version")
+        restore_btn.setEnabled(False)
+        buttons.addWidget(restore_btn)
+        close_btn = QPushButton("Close")
+        close_btn.clicked.connect(dialog.reject)
+        buttons.addWidget(close_btn)
+        layout.addLayout(buttons)
+        current = QListWidgetItem("Current version")
+        revisions.addItem(current)
+        state = {'last_id': None, 'done': False, 'content': None}
+
+        def load_page():
+            if state['done']:
+                return
+            page = self.db.get_revisions(task_id, state['last_id'])
+            for revision_id, created, size in page:
+                item = QListWidgetItem(f"{format_timestamp(created)}   ({max(1, size // 1024)} KB)")
+                item.setData(Qt.ItemDataRole.UserRole, revision_id)
+                revisions.addItem(item)
+            state['done'] = len(page) < REVISION_PAGE_SIZE
+            if page:
+                state['last_id'] = page[-1][0]
+
+        def on_scroll(value):
+            if value >= revisions.verticalScrollBar().maximum():
+                load_page()
+
+        def on_current(item):
+            if item is None:
+                return
+            revision_id = item.data(Qt.ItemDataRole.UserRole)
+            state['content'] = self.db.get_task_content(task_id) if revision_id is None else self.db.get_revision_content(revision_id)
+            set_document_content(preview.document(), state['content'] or "")
+            restore_btn.setEnabled(revision_id is not None)
+
+        def restore():
+            self.restore_task_content(task_id, state['content'])
+            dialog.accept()
+
+        revisions.verticalScrollBar().valueChanged.connect(on_scroll)
+        revisions.currentItemChanged.connect(on_current)
+        restore_btn.clicked.connect(restore)
+        load_page()
+        revisions.setCurrentItem(current)
+        dialog.exec()
+        dialog.deleteLater()
+
+    def show_database_stats(self):
+        # Filled in by the maintenance worker, so a large database is never read on the UI thread
+        dialog = QDialog(self)
+        dialog.setWindowTitle("Database statistics")
+        dialog.resize(520, 460)
+        layout = QVBoxLayout(dialog)
+        summary = QLabel("Reading...")
+        summary.setTextInteractionFlags(Qt.TextInteractionFlag.TextSelectableByMouse)
+        layout.addWidget(summary)
+        layout.addWidget(QLabel("Largest notes (double-click to open):"))
+        notes = QListWidget()
+        layout.addWidget(notes, 1)
+        buttons = QHBoxLayout()
+        compact_btn = QPushButton("Compact database")
+        compact_btn.setToolTip("Rebuilds a database made by an older version so deleted notes give their space back")
+        compact_btn.hide()
+        compact_btn.clicked.connect(dialog.accept)
+        compact_btn.clicked.connect(self.compact_database)
+        buttons.addWidget(compact_btn)
+        buttons.addStretch(1)
+        close_btn = QPushButton("Close")
+        close_btn.clicked.connect(dialog.reject)
+        buttons.addWidget(close_btn)
+        layout.addLayout(buttons)
+
+        def fill(stats):
+            if 'error' in stats:
+                summary.setText(stats['error'])
+                return
+            free_bytes = stats['free_pages'] * stats['page_size']
+            lines = [
+                f"File: {format_size(stats['file_bytes'])}   (write-ahead log: {format_size(stats['wal_bytes'])})",
+                f"Free pages: {stats['free_pages']} of {stats['page_count']}   ({format_size(free_bytes)} to reclaim)",
+                f"Auto-vacuum: {stats['auto_vacuum']}",
+            ]
+            lines += [f"{table.replace('_', ' ').capitalize()}: {count}" for table, count in stats['rows'].items()]
+            if self.maintenance_error:
+                lines.append(f"Last maintenance error: {self.maintenance_error}")
+            summary.setText("\n".join(lines))
+            compact_btn.setVisible(stats['auto_vacuum'] == "none")
+            compact_btn.setEnabled(self.transfer_thread is None)
+            for task_id, name, size in stats['largest_notes']:
+                item = QListWidgetItem(f"{name}   ({format_size(size)})")
+                item.setData(Qt.ItemDataRole.UserRole, task_id)
+                notes.addItem(item)
+
+        def open_note(item):
+            task_id = item.data(Qt.ItemDataRole.UserRole)
+            if task_id in self.db.task_index:
+                self.select_task(task_id)
+                dialog.accept()
+
+        notes.itemDoubleClicked.connect(open_note)
+        self.maintenance_worker.stats_ready.connect(fill)
+        self.stats_requested.emit()
+        dialog.exec()
+        self.maintenance_worker.stats_ready.disconnect(fill)
+        dialog.deleteLater()
+
+    def compact_database(self):
+        # The one-off auto_vacuum conversion. Its VACUUM holds the write lock until it is done, so the
+        # window takes no input meanwhile rather than freezing on the first write that would wait for it.
+        self.flush_pending_content()
+        self.db.writer.flush()
+        db_path = self.db.db_path
+        prune_pending = self.prune_timer.isActive()
+        self.prune_timer.stop()
+
+        def finish():
+            if prune_pending:
+                self.prune_timer.start()
+
+        self.start_transfer(
+            "Compacting database...",
+            lambda progress: "Database compacted" if convert_auto_vacuum(db_path) else "Nothing to compact",
+            finish,
+        )
+        # VACUUM reports no progress and cannot be stopped part way
+        self.transfer_dialog.setWindowModality(Qt.WindowModality.WindowModal)
+        self.transfer_dialog.setRange(0, 0)
+        self.transfer_dialog.setCancelButton(None)
+        self.transfer_dialog.setMinimumDuration(0)
+
+    def restore_task_content(self, task_id, content):
+        # A restore is an edit: what it replaces goes into the history first.
+        # Versions from before attachments existed may still embed their images.
+        self.flush_pending_content()
+        content = self.db.extract_attachments(content)
+        if not self.db.update_task_content(task_id, content, revision=True):
+            return
+        now = int(time.time())
+        self.db.update_task_last_modified(task_id, now)
+        self.document_cache.discard(task_id)
+        if self.selected_task == task_id:
+            self.select_task(task_id)
+
+    def add_task_delete_button(self):
+        # Only show in right panel when a task is selected
+        self.task_delete_btn.show()
 
     def delete_selected_task(self):
         if self.selected_task:
+            cat_id = self.db.get_task(self.selected_task)['category_id']
             self.db.delete_task(self.selected_task)
+            self.document_cache.discard(self.selected_task)
+            self.task_model.remove_task(cat_id, self.selected_task)
             self.selected_task = None
-            self.load_categories()
             self.clear_task_editor()
 
     def show_task_last_modified(self, last_modified):
-        if hasattr(self, 'last_modified_label') and self.last_modified_label:
-            self.last_modified_label.hide()
-        self.last_modified_label = QLabel(f"Last modified: {last_modified}")
-        self.last_modified_label.setStyleSheet("color: #888; font-size: 10px;")
-        self.last_modified_label.setAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignBottom)
-        self.right_panel_layout.addWidget(self.last_modified_label, alignment=Qt.AlignmentFlag.AlignBottom | Qt.AlignmentFlag.AlignRight)
+        self.last_modified_label.setText(f"Last modified: {format_timestamp(last_modified)}")
+        self.task_footer.show()
 
     def clear_task_editor(self):
         self.task_title.setText("")
-        self.task_content.setHtml("")
+        self.document_cache.pinned = None
+        self.show_document(self.empty_document)
         self.task_title.hide()
-        self.task_content.hide()
-        if hasattr(self, 'last_modified_label') and self.last_modified_label:
-            self.last_modified_label.hide()
-        if hasattr(self, 'task_delete_btn') and self.task_delete_btn:
-            self.task_delete_btn.hide()
+        self.content_editor.hide()
+        self.task_footer.hide()
+        self.task_delete_btn.hide()
 
     def show_help_dialog(self):
         from PyQt6.QtWidgets import QDialog, QVBoxLayout, QLabel, QHBoxLayout, QPushButton
@@ -515,33 +2487,33 @@ class MainWindow(QWidget):
         layout = QVBoxLayout(dlg)
         label = QLabel("Made for my own shitty memory, shared freely for yours. You can always donate to my dumbass though or buy my shitty literature.")
         label.setWordWrap(True)
-        label.setStyleSheet("font-size: 14px; color: #222;")
+        label.setObjectName("helpText")
         layout.addWidget(label)
         icon_row = QHBoxLayout()
         # Paypal
         paypal_btn = QPushButton()
-        paypal_btn.setIcon(QIcon(PAYPAL_ICON))
+        paypal_btn.setIcon(cached_icon(PAYPAL_ICON))
         paypal_btn.setIconSize(QSize(32, 32))
         paypal_btn.setFixedSize(38, 38)
-        paypal_btn.setStyleSheet("border: none; background: transparent;")
+        paypal_btn.setProperty("role", "icon")
         paypal_btn.setCursor(QCursor(Qt.CursorShape.PointingHandCursor))
         paypal_btn.clicked.connect(lambda: webbrowser.open("https://www.paypal.com/donate/?business=UBZJY8KHKKLGC&no_recurring=0&item_name=Why+are+you+doing+this?+Are+you+drunk?+&currency_code=USD"))
         icon_row.addWidget(paypal_btn)
         # Goodreads/book
         book_btn = QPushButton()
-        book_btn.setIcon(QIcon(BOOK_ICON))
+        book_btn.setIcon(cached_icon(BOOK_ICON))
         book_btn.setIconSize(QSize(32, 32))
         book_btn.setFixedSize(38, 38)
-        book_btn.setStyleSheet("border: none; background: transparent;")
+        book_btn.setProperty("role", "icon")
         book_btn.setCursor(QCursor(Qt.CursorShape.PointingHandCursor))
         book_btn.clicked.connect(lambda: webbrowser.open("https://www.goodreads.com/book/show/25006763-usu"))
         icon_row.addWidget(book_btn)
         # Amazon
         amazon_btn = QPushButton()
-        amazon_btn.setIcon(QIcon(AMAZON_ICON))
+        amazon_btn.setIcon(cached_icon(AMAZON_ICON))
         amazon_btn.setIconSize(QSize(32, 32))
         amazon_btn.setFixedSize(38, 38)
-        amazon_btn.setStyleSheet("border: none; background: transparent;")
+        amazon_btn.setProperty("role", "icon")
         amazon_btn.setCursor(QCursor(Qt.CursorShape.PointingHandCursor))
         amazon_btn.clicked.connect(lambda: webbrowser.open("https://www.amazon.com/Usu-Jayde-Ver-Elst-ebook/dp/B00V8A5K7Y"))
         icon_row.addWidget(amazon_btn)
@@ -550,21 +2522,11 @@ class MainWindow(QWidget):
         dlg.exec()
 
     def show_category_delete_button(self, cat_id):
-        if hasattr(self, 'cat_delete_btn') and self.cat_delete_btn:
-            self.cat_delete_btn.hide()
-        self.cat_delete_btn = QPushButton("✕")
-        self.cat_delete_btn.setFixedSize(20, 20)
-        self.cat_delete_btn.setStyleSheet(
-            "QPushButton { color: #000; background: #fff; border: 1px solid #000; border-radius: 10px; font-size: 12px; } "
-            "QPushButton:hover { color: #fff; background: #000; border: 1px solid #000; }"
-        )
-        self.cat_delete_btn.setCursor(Qt.CursorShape.PointingHandCursor)
-        self.cat_delete_btn.clicked.connect(lambda _, cid=cat_id: self.confirm_delete_category(cid))
-        self.right_panel_layout.addWidget(self.cat_delete_btn, alignment=Qt.AlignmentFlag.AlignBottom | Qt.AlignmentFlag.AlignRight)
+        # The button deletes self.selected_category, which select_category() has just set
+        self.cat_delete_btn.show()
 
     def clear_category_delete_button(self):
-        if hasattr(self, 'cat_delete_btn') and self.cat_delete_btn:
-            self.cat_delete_btn.hide()
+        self.cat_delete_btn.hide()
 
     def confirm_delete_category(self, cat_id):
         msg = QMessageBox(self)
@@ -574,75 +2536,104 @@ class MainWindow(QWidget):
         msg.setDefaultButton(QMessageBox.StandardButton.No)
         res = msg.exec()
         if res == QMessageBox.StandardButton.Yes:
+            for task_id in self.task_model.category_tasks.get(cat_id, ()):
+                self.document_cache.discard(task_id)
             self.db.delete_category_and_tasks(cat_id)
-            self.load_categories()
+            self.task_model.remove_category(cat_id)
+            self.selected_category = None
+            self.clear_category_delete_button()
 
     def show_blank_right_panel(self):
         self.task_title.hide()
-        self.task_content.hide()
-        if hasattr(self, 'last_modified_label') and self.last_modified_label:
-            self.last_modified_label.hide()
-        if hasattr(self, 'task_delete_btn') and self.task_delete_btn:
-            self.task_delete_btn.hide()
-        self.right_panel.setStyleSheet("background-color: #3A4352; border-radius: 14px; border: 3px solid #222;")
-
-    # ---- Frameless resizing support ----
+        self.content_editor.hide()
+        self.task_footer.hide()
+        self.task_delete_btn.hide()
+        self.set_right_panel_active(False)
+
+    # ---- Frameless moving and resizing ----
+    # The window manager moves and resizes the window itself where the platform allows it.
+    # Elsewhere the drag is followed here with one geometry change per frame, however many
+    # mouse moves arrive in between.
     def mousePressEvent(self, event):
         if event.button() == Qt.MouseButton.LeftButton:
-            self._drag_pos = event.globalPosition().toPoint() - self.frameGeometry().topLeft()
-            if self._on_edge(event.pos()):
-                self._resizing = True
-                self._resize_dir = self._get_resize_dir(event.pos())
-            else:
-                self._resizing = False
+            edges = self._edges_at(event.pos())
+            handle = self.windowHandle()
+            if edges:
+                if handle is None or not handle.startSystemResize(edges):
+                    self._resize_edges = edges
+                    self._resize_origin = (event.globalPosition().toPoint(), self.geometry())
+            elif handle is None or not handle.startSystemMove():
+                self._drag_pos = event.globalPosition().toPoint() - self.frameGeometry().topLeft()
         super().mousePressEvent(event)
 
     def mouseMoveEvent(self, event):
-        if self._resizing and self._resize_dir:
-            self._resize_window(event.globalPosition().toPoint())
-        elif self._drag_pos and not self._resizing:
-            self.move(event.globalPosition().toPoint() - self._drag_pos)
+        if self._resize_edges or self._drag_pos is not None:
+            self._pointer_pos = event.globalPosition().toPoint()
+            if not self.frame_timer.isActive():
+                self.frame_timer.start()
         super().mouseMoveEvent(event)
 
     def mouseReleaseEvent(self, event):
+        if self._pointer_pos is not None:
+            self.frame_timer.stop()
+            self.apply_pointer_geometry()
         self._drag_pos = None
-        self._resizing = False
-        self._resize_dir = None
+        self._resize_edges = None
+        self._resize_origin = None
         super().mouseReleaseEvent(event)
 
-    def _on_edge(self, pos, margin=6):
+    def _edges_at(self, pos, margin=RESIZE_MARGIN):
         rect = self.rect()
-        return (
-            pos.x() < margin or pos.x() > rect.width() - margin or
-            pos.y() < margin or pos.y() > rect.height() - margin
-        )
+        edges = Qt.Edge(0)
+        if pos.x() < margin:
+            edges |= Qt.Edge.LeftEdge
+        if pos.x() > rect.width() - margin:
+            edges |= Qt.Edge.RightEdge
+        if pos.y() < margin:
+            edges |= Qt.Edge.TopEdge
+        if pos.y() > rect.height() - margin:
+            edges |= Qt.Edge.BottomEdge
+        return edges
 
-    def _get_resize_dir(self, pos, margin=6):
-        rect = self.rect()
-        left = pos.x() < margin
-        right = pos.x() > rect.width() - margin
-        top = pos.y() < margin
-        bottom = pos.y() > rect.height() - margin
-        return (left, right, top, bottom)
+    def apply_pointer_geometry(self):
+        pos, self._pointer_pos = self._pointer_pos, None
+        if pos is None:
+            return
+        if self._resize_edges:
+            self.setGeometry(self._resized_geometry(pos))
+        elif self._drag_pos is not None:
+            self.move(pos - self._drag_pos)
 
-    def _resize_window(self, global_pos):
-        g = self.geometry()
-        dx = global_pos.x() - g.x()
-        dy = global_pos.y() - g.y()
-        left, right, top, bottom = self._resize_dir
+    def _resized_geometry(self, pos):
+        # The geometry at press time moved by the pointer, all edges at once, never below the minimum size
+        origin, g = self._resize_origin
+        dx, dy = pos.x() - origin.x(), pos.y() - origin.y()
+        left, top, right, bottom = g.left(), g.top(), g.right(), g.bottom()
         min_w, min_h = self.minimumWidth(), self.minimumHeight()
-        if left:
-            new_x = min(g.x() + dx, g.right() - min_w)
-            new_w = max(g.width() - dx, min_w)
-            self.setGeometry(new_x, g.y(), new_w, g.height())
-        if right:
-            self.resize(max(dx, min_w), g.height())
-        if top:
-            new_y = min(g.y() + dy, g.bottom() - min_h)
-            new_h = max(g.height() - dy, min_h)
-            self.setGeometry(g.x(), new_y, g.width(), new_h)
-        if bottom:
-            self.resize(g.width(), max(dy, min_h))
+        if self._resize_edges & Qt.Edge.LeftEdge:
+            left = min(left + dx, right - min_w + 1)
+        if self._resize_edges & Qt.Edge.RightEdge:
+            right = max(right + dx, left + min_w - 1)
+        if self._resize_edges & Qt.Edge.TopEdge:
+            top = min(top + dy, bottom - min_h + 1)
+        if self._resize_edges & Qt.Edge.BottomEdge:
+            bottom = max(bottom + dy, top + min_h - 1)
+        return QRect(QPoint(left, top), QPoint(right, bottom))
+
+    def eventFilter(self, obj, event):
+        # While the editor is being resized the note keeps wrapping at its old width, so a long
+        # note is rewrapped once when the resize settles instead of on every frame. The filter
+        # runs before the editor's own resizeEvent() would rewrap it.
+        if (obj is self.task_content and event.type() == QEvent.Type.Resize and obj.isVisible()
+                and event.oldSize().isValid() and event.oldSize().width() != event.size().width()):
+            if obj.lineWrapMode() == QTextEdit.LineWrapMode.WidgetWidth:
+                obj.setLineWrapColumnOrWidth(round(obj.document().textWidth()))
+                obj.setLineWrapMode(QTextEdit.LineWrapMode.FixedPixelWidth)
+            self.resize_settle_timer.start()
+        return False
+
+    def finish_live_resize(self):
+        self.task_content.setLineWrapMode(QTextEdit.LineWrapMode.WidgetWidth)
 
     def closeEvent(self, event):
         if not self.saved_this_session:
@@ -662,9 +2653,78 @@ class MainWindow(QWidget):
                 event.ignore()
         else:
             event.accept()
+        if event.isAccepted():
+            # Autosaved content may still be queued on the write-behind thread
+            self.flush_pending_content()
+            self.save_session()
+            if self.transfer_thread is not None:
+                self.transfer_worker.done.disconnect()
+                self.transfer_worker.failed.disconnect()
+                self.transfer_worker.cancelled.set()
+                self.transfer_thread.quit()
+                self.transfer_thread.wait()
+            self.prefetch_timer.stop()
+            self.search_timer.stop()
+            self.prune_timer.stop()
+            self.backup_timer.stop()
+            self.change_timer.stop()
+            self.convert_timer.stop()
+            self.maintenance_timer.stop()
+            if profiler is not None:
+                self.profile_timer.stop()
+                self.profile_overlay_timer.stop()
+                try:
+                    profiler.dump()
+                except OSError:
+                    pass
+            self.search_thread.quit()
+            self.search_thread.wait()
+            self.maintenance_worker.maintained.disconnect()
+            self.maintenance_worker.failed.disconnect()
+            self.maintenance_worker.interrupt()
+            self.maintenance_thread.quit()
+            self.maintenance_thread.wait()
+            QApplication.instance().removeEventFilter(self.idle_monitor)
+            self.document_loader.stop()
+            self.db.close()
+
+def profiled_targets():
+    # What a profiling run times: every database call and the UI paths that can stutter
+    return [
+        (CategoryTaskDB, None),
+        (MainWindow, [
+            'finish_startup', 'load_categories', 'refresh_task_list', 'select_category', 'select_task',
+            'show_document', 'load_task_document', 'on_document_loaded', 'prefetch_next_document',
+            'save_task_content_actual', 'save_all', 'toggle_task_important', 'apply_remote_changes',
+            'run_search', 'show_search_results', 'show_history_dialog', 'paintEvent', 'convert_html_notes',
+            'run_maintenance', 'finish_maintenance',
+        ]),
+        (TaskListModel, ['reload']),
+        (DocumentLoader, ['load_next_chunk']),
+        (sys.modules[__name__], ['build_task_document', 'append_html_chunk', 'serialize_document', 'compact_equivalent']),
+        (planner_db, ['html_to_text', 'content_to_text', 'record_revision', 'load_revision']),
+    ]
+
+def profile_path(argv):
+    # --profile[=PATH] on the command line, else PLANNER_PROFILE; None when profiling is off
+    value = os.environ.get(PROFILE_ENV)
+    for arg in list(argv[1:]):
+        if arg == "--profile" or arg.startswith("--profile="):
+            argv.remove(arg)
+            value = arg.partition("=")[2] or value or "1"
+    if not value or value == "0":
+        return None
+    return os.path.join(get_app_folder(), PROFILE_FILENAME) if value == "1" else os.path.abspath(value)
 
 def main():
-    app = QApplication(sys.argv)
+    global profiler
+    argv = list(sys.argv)
+    path = profile_path(argv)
+    if path:
+        profiler = Profiler(path)
+        profiler.install(profiled_targets())
+    app = (ProfiledApplication if profiler else QApplication)(argv)
+    app.setStyleSheet(APP_STYLESHEET)
     window = MainWindow()
     window.show()
     sys.exit(app.exec())
@@ -0,0 +1,198 @@
+import argparse
+import html
+import io
+import json
+import re
+import shlex
+import sqlite3
+import sys
+import time
+
+from planner_db import (
+    DB_FILENAME, apply_task_fields, content_hash, content_to_html, content_to_text, decode_content, export_jsonl,
+    export_markdown, find_category, format_timestamp, get_db_path, insert_category, insert_task, open_database,
+    search_tasks, set_tasks_important, text_to_content,
+)
+
+# Scripting the planner from a shell or cron job: `python main.py add INBOX "Buy milk"`.
+# Only the data layer is imported, never Qt. Writes take the write lock up front and wait out
+# a running planner's own writes, which then picks them up like any other instance's changes.
+
+COMMANDS = ("add", "list", "show", "search", "star", "export", "batch")
+BATCH_COMMANDS = ("add", "list", "show", "search", "star")  # export reads through its own connection
+
+class CommandError(Exception):
+    pass
+
+def is_command(args):
+    return bool(args) and args[0] in COMMANDS
+
+def build_parser():
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--db", help=f"planner database (default: {DB_FILENAME} next to main.py)")
+    parser = argparse.ArgumentParser(prog="main.py", description="Shitty Planner from the command line")
+    commands = parser.add_subparsers(dest="command", required=True)
+    add = commands.add_parser("add", parents=[common], help="add a task, creating its category if needed")
+    add.add_argument("category", help="category name or id")
+    add.add_argument("name")
+    add.add_argument("--note", help="note text; - reads it from stdin")
+    add.add_argument("--star", action="store_true")
+    show_list = commands.add_parser("list", parents=[common], help="list categories and their tasks")
+    show_list.add_argument("category", nargs="?", help="only this category (name or id)")
+    show_list.add_argument("--json", action="store_true", help="one JSON object per line")
+    show = commands.add_parser("show", parents=[common], help="print a task's note")
+    show.add_argument("task_id", type=int)
+    show.add_argument("--html", action="store_true", help="the stored HTML instead of plain text")
+    search = commands.add_parser("search", parents=[common], help="full-text search of names and notes")
+    search.add_argument("text", nargs="+")
+    search.add_argument("--limit", type=int, default=20)
+    star = commands.add_parser("star", parents=[common], help="star tasks (or unstar them with --off)")
+    star.add_argument("task_ids", type=int, nargs="+")
+    star.add_argument("--off", action="store_true")
+    export = commands.add_parser("export", parents=[common], help="export to JSON Lines or a Markdown folder")
+    export.add_argument("path")
+    export.add_argument("--markdown", action="store_true", help="write a folder of .md files")
+    commands.add_parser(
+        "batch", parents=[common],
+        help="run one command per stdin line (shell quoting, # comments) in a single transaction",
+    )
+    return parser
+
+def cmd_add(conn, args, out):
+    cat_id = find_category(conn, args.category)
+    if cat_id is None:
+        cat_id = insert_category(conn, args.category)
+    task_id, _ = insert_task(conn, cat_id, args.name, args.star)
+    fields = {'last_modified': int(time.time())}
+    if args.note is not None:
+        text = sys.stdin.read() if args.note == "-" else args.note
+        content = text_to_content(text)
+        fields.update(content=content, content_hash=content_hash(content), search_text=content_to_text(content))
+    apply_task_fields(conn, task_id, fields)
+    print(task_id, file=out)
+
+def cmd_list(conn, args, out):
+    cat_id = None
+    if args.category is not None:
+        cat_id = find_category(conn, args.category)
+        if cat_id is None:
+            raise CommandError(f"no category {args.category!r}")
+    # The covering tree index answers this without reading a single note
+    tasks = {}
+    for task_id, task_cat_id, name, important, last_modified in conn.execute(
+            'SELECT id, category_id, name, important, last_modified FROM tasks ORDER BY category_id, important DESC, rank, id'):
+        tasks.setdefault(task_cat_id, []).append({
+            'type': 'task', 'id': task_id, 'category_id': task_cat_id, 'name': name,
+            'important': int(bool(important)), 'last_modified': last_modified,
+        })
+    for category_id, category_name in conn.execute('SELECT id, name FROM categories ORDER BY rank, id'):
+        if cat_id is not None and category_id != cat_id:
+            continue
+        if args.json:
+            print(json.dumps({'type': 'category', 'id': category_id, 'name': category_name}, ensure_ascii=False), file=out)
+        else:
+            print(f"{category_name}  ({category_id})", file=out)
+        for task in tasks.get(category_id, ()):
+            if args.json:
+                print(json.dumps(task, ensure_ascii=False), file=out)
+            else:
+                star = "*" if task['important'] else " "
+                print(f"  {task['id']:>6} {star} {task['name']}  {format_timestamp(task['last_modified'])}".rstrip(), file=out)
+
+def cmd_show(conn, args, out):
+    row = conn.execute('SELECT name, content FROM tasks WHERE id=?', (args.task_id,)).fetchone()
+    if row is None:
+        raise CommandError(f"no task {args.task_id}")
+    name, content = row
+    content = decode_content(content)
+    print(f"# {name}", file=out)
+    print(content_to_html(content) if args.html else content_to_text(content), file=out)
+
+def cmd_search(conn, args, out):
+    for task_id, name, snippet in search_tasks(conn, " ".join(args.text), args.limit):
+        snippet = html.unescape(re.sub(r'</?b>', '', snippet))
+        print(f"{task_id}\t{name}\t{' '.join(snippet.split())}", file=out)
+
+def cmd_star(conn, args, out):
+    found = {row[0] for row in conn.execute(
+        f'SELECT id FROM tasks WHERE id IN ({",".join("?" * len(args.task_ids))})', args.task_ids)}
+    missing = [task_id for task_id in args.task_ids if task_id not in found]
+    if missing:
+        raise CommandError(f"no task {', '.join(map(str, missing))}")
+    set_tasks_important(conn, args.task_ids, not args.off)
+
+def cmd_export(conn, args, out):
+    db_path = conn.execute('PRAGMA database_list').fetchone()[2]
+    if args.markdown:
+        done = export_markdown(db_path, args.path)
+    else:
+        done = export_jsonl(db_path, args.path)
+    print(f"Exported {done} tasks", file=out)
+
+HANDLERS = {
+    "add": cmd_add, "list": cmd_list, "show": cmd_show, "search": cmd_search, "star": cmd_star, "export": cmd_export,
+}
+WRITES = ("add", "star")
+
+def run_batch(conn, parser, lines, out):
+    # Every line is parsed before anything runs, then all of them share one IMMEDIATE transaction.
+    # Output is held back until the commit, so a failed batch prints nothing but the error.
+    batch = []
+    for number, line in enumerate(lines, start=1):
+        words = shlex.split(line, comments=True)
+        if not words:
+            continue
+        if words[0] not in BATCH_COMMANDS:
+            raise CommandError(f"line {number}: {words[0]!r} cannot run in a batch")
+        try:
+            args = parser.parse_args(words)
+        except SystemExit:
+            raise CommandError(f"line {number}: {line.strip()}")
+        if args.command == "add" and args.note == "-":
+            raise CommandError(f"line {number}: --note - cannot read stdin in a batch")
+        batch.append((number, args))
+    buffer = io.StringIO()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        for number, args in batch:
+            try:
+                HANDLERS[args.command](conn, args, buffer)
+            except CommandError as e:
+                raise CommandError(f"line {number}: {e}")
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    out.write(buffer.getvalue())
+    return len(batch)
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    try:
+        conn = open_database(args.db or get_db_path())
+    except (sqlite3.Error, RuntimeError) as e:
+        print(f"main.py: {e}", file=sys.stderr)
+        return 1
+    try:
+        if args.command == "batch":
+            run_batch(conn, parser, sys.stdin, sys.stdout)
+        elif args.command in WRITES:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                HANDLERS[args.command](conn, args, sys.stdout)
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+        else:
+            HANDLERS[args.command](conn, args, sys.stdout)
+    except (CommandError, sqlite3.Error, OSError) as e:
+        print(f"main.py {args.command}: {e}", file=sys.stderr)
+        return 1
+    finally:
+        conn.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
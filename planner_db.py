@@ -0,0 +1,1422 @@
+import sys
+import os
+import base64
+import hashlib
+import html
+import json
+import re
+import shutil
+import sqlite3
+import threading
+import time
+import zlib
+from difflib import SequenceMatcher
+from html.parser import HTMLParser
+
+# The planner's data layer: schema, migrations, the task index and everything that reads or writes
+# database.db. It imports nothing from Qt, so scripts and the command line can use it on their own.
+
+DB_FILENAME = "database.db"
+DB_SYNCHRONOUS = "NORMAL"  # OFF, NORMAL, FULL or EXTRA; WAL keeps NORMAL crash-safe
+DB_BUSY_TIMEOUT_MS = 10000  # how long a write waits for another instance's lock before failing
+CHANGE_LOG_KEEP = 10000  # newest change-log rows kept; an instance further behind reloads its whole index
+CHANGE_LOG_RELOAD_ITEMS = 500  # more changed rows than this in one poll also reload the index
+WRITE_BEHIND_DELAY = 1.0  # seconds pending task writes are coalesced before a flush
+SEARCH_RESULT_LIMIT = 50
+REVISION_INTERVAL = 10 * 60  # seconds; older content is kept after a pause this long, or this often while editing
+REVISION_SNAPSHOT_EVERY = 16  # full copy every N revisions, so rebuilding one applies at most N-1 deltas
+REVISION_KEEP_DAYS = 90
+REVISION_KEEP_PER_TASK = 100
+REVISION_PAGE_SIZE = 50  # history entries fetched per scroll
+REVISION_DIFF_MAX_LINES = 20000  # longer notes get deltas that only trim a common head and tail
+TRANSFER_BATCH_ROWS = 500  # rows per import transaction
+TRANSFER_BATCH_BYTES = 8 * 1024 * 1024  # or fewer, once their content adds up to this
+BACKUP_GENERATIONS = 7  # newest backups kept; settings.json "backup_generations" overrides it
+BACKUP_PAGES_PER_STEP = 256  # pages copied per backup step
+BACKUP_STEP_PAUSE = 0.005  # seconds between steps, so the copy never saturates the disk
+ATTACHMENT_SCHEME = "attachment"  # pasted images are referenced from notes as <img src="attachment:ID">
+ATTACHMENT_CHUNK_BYTES = 64 * 1024  # attachment blobs are written this much at a time
+ATTACHMENT_KEEP_DAYS = 7  # an image no note or revision refers to is deleted this long after it was last pasted, so undo can still restore it
+RANK_GAP = 1024  # spacing of manual-order ranks; about ten drops between two rows before a renumber
+COMPACT_PREFIX = "\x02"  # notes stored as plain text plus format runs start with this; any other note is HTML
+COMPACT_COMPRESS_CHARS = 16 * 1024  # compact notes longer than this are stored zlib-compressed
+VACUUM_PAGES_PER_STEP = 64  # free pages handed back to the file system per incremental vacuum step
+ANALYZE_ROW_LIMIT = 400  # rows ANALYZE samples per index, which keeps gathering statistics to a few ms
+STATS_LARGEST_NOTES = 10  # notes listed by database_stats(), biggest first
+
+# Helper to get exe folder
+def get_app_folder():
+    return os.path.dirname(os.path.abspath(sys.argv[0]))
+
+def get_db_path():
+    return os.path.join(get_app_folder(), DB_FILENAME)
+
+def content_hash(content):
+    return hashlib.blake2b((content or "").encode("utf-8"), digest_size=16).hexdigest()
+
+class _HTMLTextExtractor(HTMLParser):
+    SKIP_TAGS = {'head', 'style', 'script', 'title'}
+    BLOCK_TAGS = {'p', 'br', 'div', 'li', 'tr', 'table', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'pre', 'hr'}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self.skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP_TAGS:
+            self.skip += 1
+        elif tag in self.BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS:
+            self.skip = max(0, self.skip - 1)
+        elif tag in self.BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        if not self.skip:
+            self.parts.append(data)
+
+def html_to_text(content):
+    # Plain text of stored task HTML, for the search index
+    if not content:
+        return ""
+    parser = _HTMLTextExtractor()
+    parser.feed(content)
+    parser.close()
+    text = re.sub(r'[^\S\n]+', ' ', "".join(parser.parts))
+    return re.sub(r'\s*\n\s*', '\n', text).strip()
+
+# ---- Compact notes: "\x02" + JSON format runs + "\n" + the note's text ----
+# Each run is [length, flags] or, for an image, [1, flags, name, width, height], covering the text
+# from the start in order; text after the last run is unformatted. Flags are letters: b bold,
+# i italic, u underline, s strikethrough. Blocks are separated by "\n".
+def is_compact(content):
+    return content.startswith(COMPACT_PREFIX)
+
+def split_compact(content):
+    # (runs, text)
+    header, _, text = content[len(COMPACT_PREFIX):].partition("\n")
+    return json.loads(header), text
+
+def text_to_content(text):
+    # A note holding just this text
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return f"{COMPACT_PREFIX}[]\n{text}" if text else ""
+
+def encode_content(content):
+    # The value stored in tasks.content; long compact notes are compressed
+    if len(content) > COMPACT_COMPRESS_CHARS and is_compact(content):
+        return zlib.compress(content.encode("utf-8"))
+    return content
+
+def decode_content(stored):
+    if isinstance(stored, bytes):
+        return zlib.decompress(stored).decode("utf-8")
+    return stored or ""
+
+def content_to_text(content):
+    # Plain text of a note in either format, for the search index
+    if not is_compact(content):
+        return html_to_text(content)
+    _, text = split_compact(content)
+    return text.replace("\ufffc", "").replace("\u2028", "\n")
+
+RUN_STYLES = (('b', "font-weight:700"), ('i', "font-style:italic"))
+RUN_DECORATIONS = (('u', "underline"), ('s', "line-through"))
+
+def content_to_html(content):
+    # Compact notes as HTML for exports and other programs; Qt reads it back as the same note
+    if not is_compact(content):
+        return content
+    runs, text = split_compact(content)
+    runs.append([len(text) - sum(run[0] for run in runs), ""])
+    paragraphs, current, start = [], [], 0
+    for run in runs:
+        piece, flags = text[start:start + run[0]], run[1]
+        start += run[0]
+        styles = [style for letter, style in RUN_STYLES if letter in flags]
+        decorations = [decoration for letter, decoration in RUN_DECORATIONS if letter in flags]
+        if decorations:
+            styles.append(f"text-decoration:{' '.join(decorations)}")
+        if len(run) > 2:
+            size = "".join(f' {attr}="{value:g}"' for attr, value in (("width", run[3]), ("height", run[4])) if value is not None)
+            piece = f'<img src="{html.escape(run[2])}"{size} />'
+            current.append(f'<span style="{"; ".join(styles)}">{piece}</span>' if styles else piece)
+            continue
+        for n, line in enumerate(piece.split("\n")):
+            if n:
+                paragraphs.append("".join(current))
+                current = []
+            if line:
+                line = html.escape(line).replace("\u2028", "<br />")
+                current.append(f'<span style="{"; ".join(styles)}">{line}</span>' if styles else line)
+    paragraphs.append("".join(current))
+    body = "\n".join(f"<p>{inner}</p>" if inner else '<p style="-qt-paragraph-type:empty"><br /></p>' for inner in paragraphs)
+    return f"<html><head><style>p {{ white-space: pre-wrap; margin: 0; }}</style></head><body>\n{body}</body></html>"
+
+def fts_query(text):
+    # Every word must match, the last one as a prefix for search-as-you-type
+    words = re.findall(r'\w+', text)
+    if not words:
+        return ""
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += '*'
+    return " ".join(terms)
+
+def search_tasks(conn, text, limit=SEARCH_RESULT_LIMIT):
+    # [(task_id, name, snippet_html), ...] best match first, matches wrapped in <b>
+    query = fts_query(text)
+    if not query:
+        return []
+    rows = conn.execute(
+        "SELECT rowid, name, snippet(tasks_fts, -1, char(2), char(3), '…', 12) "
+        "FROM tasks_fts WHERE tasks_fts MATCH ? ORDER BY bm25(tasks_fts, 5.0, 1.0) LIMIT ?",
+        (query, limit)
+    ).fetchall()
+    return [
+        (task_id, name, html.escape(snippet).replace("\x02", "<b>").replace("\x03", "</b>"))
+        for task_id, name, snippet in rows
+    ]
+
+def format_timestamp(timestamp):
+    # tasks.last_modified holds integer epoch seconds
+    if timestamp is None:
+        return ""
+    return time.strftime("%Y-%m-%d %H:%M", time.localtime(timestamp))
+
+def format_size(size):
+    for unit in ("bytes", "KB", "MB"):
+        if size < 1024:
+            return f"{size} {unit}" if unit == "bytes" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+# ---- Export / import, streamed so memory stays flat however big the planner is ----
+class TransferCancelled(Exception):
+    pass
+
+def iter_planner_records(conn):
+    # Categories first, then tasks in list order, one row at a time
+    for cat_id, name in conn.execute('SELECT id, name FROM categories ORDER BY rank, id'):
+        yield {'type': 'category', 'id': cat_id, 'name': name}
+    rows = conn.execute('''SELECT id, category_id, name, important, last_modified, content
+        FROM tasks ORDER BY category_id, important DESC, rank, id''')
+    for task_id, cat_id, name, important, last_modified, content in rows:
+        yield {
+            'type': 'task', 'id': task_id, 'category_id': cat_id, 'name': name,
+            'important': int(bool(important)), 'last_modified': last_modified,
+            'content': content_to_html(decode_content(content)),
+        }
+
+def count_tasks(conn):
+    return conn.execute('SELECT COUNT(*) FROM tasks').fetchone()[0]
+
+def export_jsonl(db_path, path, progress=None):
+    # progress(done, total) is called per task and may raise TransferCancelled
+    conn = sqlite3.connect(db_path)
+    try:
+        total, done = count_tasks(conn), 0
+        with open(path, "w", encoding="utf-8") as f:
+            for record in iter_planner_records(conn):
+                if record['type'] == 'task':
+                    record['content'] = inline_attachments(conn, record['content'])
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                if record['type'] == 'task':
+                    done += 1
+                    if progress:
+                        progress(done, total)
+    finally:
+        conn.close()
+    return done
+
+def safe_filename(name, item_id):
+    name = re.sub(r'[<>:"/\\|?*\x00-\x1f]', "_", name or "").strip().rstrip(". ")[:80]
+    return f"{name or 'UNTITLED'} ({item_id})"
+
+def export_markdown(db_path, folder, progress=None):
+    # One folder per category, one .md file per task holding the note's plain text
+    conn = sqlite3.connect(db_path)
+    try:
+        total, done = count_tasks(conn), 0
+        os.makedirs(folder, exist_ok=True)
+        category_dirs = {}
+        for record in iter_planner_records(conn):
+            if record['type'] == 'category':
+                category_dirs[record['id']] = os.path.join(folder, safe_filename(record['name'], record['id']))
+                os.makedirs(category_dirs[record['id']], exist_ok=True)
+                continue
+            category_dir = category_dirs.get(record['category_id'], folder)
+            star = "★ " if record['important'] else ""
+            with open(os.path.join(category_dir, safe_filename(record['name'], record['id']) + ".md"), "w", encoding="utf-8") as f:
+                f.write(f"# {star}{record['name']}\n\n{html_to_text(record['content'])}\n")
+            done += 1
+            if progress:
+                progress(done, total)
+    finally:
+        conn.close()
+    return done
+
+def iter_jsonl_records(path, progress=None):
+    total = os.path.getsize(path)
+    with open(path, "rb") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+            if progress:
+                progress(f.tell(), total)
+
+def iter_markdown_records(folder, progress=None):
+    # Sub-folders become categories, their .md files tasks; "# name" on the first line names the task
+    entries = sorted(entry for entry in os.listdir(folder) if os.path.isdir(os.path.join(folder, entry)))
+    for cat_id, entry in enumerate(entries, start=1):
+        yield {'type': 'category', 'id': cat_id, 'name': re.sub(r" \(\d+\)$", "", entry)}
+        files = sorted(name for name in os.listdir(os.path.join(folder, entry)) if name.lower().endswith(".md"))
+        for name in files:
+            with open(os.path.join(folder, entry, name), encoding="utf-8") as f:
+                text = f.read()
+            title, _, body = text.partition("\n")
+            important = title.startswith("# ★ ")
+            if title.startswith("# "):
+                title = title[4:] if important else title[2:]
+            else:
+                title, body = re.sub(r" \(\d+\)$", "", name[:-3]), text
+            yield {
+                'type': 'task', 'category_id': cat_id, 'name': title.strip() or "NEW TASK",
+                'important': int(important), 'content': text_to_content(body.strip("\n")),
+            }
+        if progress:
+            progress(cat_id, len(entries))
+
+def between_ranks(before, after):
+    # A rank strictly between two neighbours (None for the list ends), or None when they are adjacent
+    if before is None and after is None:
+        return RANK_GAP
+    if before is None:
+        return after - RANK_GAP
+    if after is None:
+        return before + RANK_GAP
+    return (before + after) // 2 if after - before > 1 else None
+
+def insert_category(conn, name):
+    # New categories go last
+    return conn.execute(
+        'INSERT INTO categories (name, rank) VALUES (?, (SELECT COALESCE(MAX(rank), 0) + ? FROM categories))', (name, RANK_GAP)
+    ).lastrowid
+
+def insert_rows(cur, sql, rows):
+    # Inserts one row at a time and returns each new id from lastrowid; guessing ids from
+    # sqlite_sequence would pick up rows another connection inserted in between
+    return [cur.execute(sql, row).lastrowid for row in rows]
+
+def import_records(db_path, records, batch_rows=TRANSFER_BATCH_ROWS, batch_bytes=TRANSFER_BATCH_BYTES):
+    # Appends the records' categories and tasks to the planner in batched transactions.
+    # Category ids are remapped; a task whose category is missing lands in an IMPORTED category.
+    conn = sqlite3.connect(db_path, timeout=30)
+    category_ids = {}
+    batch, size, imported = [], 0, 0
+
+    def category_for(old_id):
+        if old_id not in category_ids:
+            category_ids[old_id] = insert_category(conn, "IMPORTED")
+        return category_ids[old_id]
+
+    def write_batch():
+        cur = conn.cursor()
+        # Each row is ranked after the one before it, so imported tasks keep their file order
+        new_ids = insert_rows(cur, '''INSERT INTO tasks (category_id, name, content, important, last_modified, content_hash, rank)
+            VALUES (?, ?, ?, ?, ?, ?, (SELECT COALESCE(MAX(rank), 0) + ? FROM tasks WHERE category_id=?))''',
+            [row[:6] + (RANK_GAP, row[0]) for row in batch])
+        cur.executemany('UPDATE tasks_fts SET body=? WHERE rowid=?', [(row[6], task_id) for row, task_id in zip(batch, new_ids)])
+        conn.commit()
+
+    try:
+        for record in records:
+            if record.get('type') == 'category':
+                category_ids[record.get('id')] = insert_category(conn, record.get('name') or "NEW CATEGORY")
+            elif record.get('type') == 'task':
+                content = extract_data_uris(conn, record.get('content') or "")
+                last_modified = record.get('last_modified')
+                batch.append((
+                    category_for(record.get('category_id')), record.get('name') or "NEW TASK", encode_content(content),
+                    int(bool(record.get('important'))), last_modified if isinstance(last_modified, int) else None,
+                    content_hash(content), content_to_text(content),
+                ))
+                size += len(content)
+                if len(batch) >= batch_rows or size >= batch_bytes:
+                    write_batch()
+                    imported += len(batch)
+                    batch, size = [], 0
+        if batch:
+            write_batch()
+            imported += len(batch)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return imported
+
+# ---- Attachments: images stored once per content hash and read lazily when a note shows them ----
+DATA_URI_IMAGE = re.compile(r'(<img\b[^>]*?\bsrc=")data:(image/[\w.+-]+);base64,([^"]*)"')
+ATTACHMENT_IMAGE = re.compile(rf'(<img\b[^>]*?\bsrc="){ATTACHMENT_SCHEME}:(\d+)"')
+# Any mention counts, in HTML, compact runs or revision deltas alike, so a doubtful one keeps its image
+ATTACHMENT_REFERENCE = re.compile(rf'{ATTACHMENT_SCHEME}:(\d+)')
+
+def attachment_url(attachment_id):
+    return f"{ATTACHMENT_SCHEME}:{attachment_id}"
+
+def parse_attachment_url(url):
+    match = re.fullmatch(rf'{ATTACHMENT_SCHEME}:(\d+)', url)
+    return int(match.group(1)) if match else None
+
+def store_attachment(conn, data, mime):
+    # Returns the id of the attachment holding data, adding it if it is new. The caller commits.
+    # created is the time of the latest paste, which sweep_attachments() waits out.
+    digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+    now = int(time.time())
+    row = conn.execute('SELECT id FROM attachments WHERE hash=?', (digest,)).fetchone()
+    if row:
+        conn.execute('UPDATE attachments SET created=? WHERE id=?', (now, row[0]))
+        return row[0]
+    attachment_id = conn.execute(
+        'INSERT INTO attachments (hash, mime, size, created, data) VALUES (?, ?, ?, ?, zeroblob(?))',
+        (digest, mime, len(data), now, len(data))
+    ).lastrowid
+    view = memoryview(data)
+    with conn.blobopen('attachments', 'data', attachment_id) as blob:
+        for start in range(0, len(view), ATTACHMENT_CHUNK_BYTES):
+            blob.write(view[start:start + ATTACHMENT_CHUNK_BYTES])
+    return attachment_id
+
+def read_attachment(conn, attachment_id):
+    # (data, mime), or None for an unknown id
+    row = conn.execute('SELECT mime FROM attachments WHERE id=?', (attachment_id,)).fetchone()
+    if row is None:
+        return None
+    with conn.blobopen('attachments', 'data', attachment_id, readonly=True) as blob:
+        return blob.read(), row[0]
+
+def extract_data_uris(conn, content):
+    # Moves base64 images embedded in note HTML into attachments
+    if 'src="data:' not in content:
+        return content
+    def replace(match):
+        try:
+            data = base64.b64decode(match.group(3), validate=True)
+        except ValueError:
+            return match.group(0)
+        return f'{match.group(1)}{attachment_url(store_attachment(conn, data, match.group(2)))}"'
+    return DATA_URI_IMAGE.sub(replace, content)
+
+def inline_attachments(conn, content):
+    # The reverse, for exports that have to stand on their own
+    def replace(match):
+        found = read_attachment(conn, int(match.group(2)))
+        if found is None:
+            return match.group(0)
+        data, mime = found
+        return f'{match.group(1)}data:{mime};base64,{base64.b64encode(data).decode("ascii")}"'
+    return ATTACHMENT_IMAGE.sub(replace, content)
+
+def sweep_attachments(conn, keep_days=ATTACHMENT_KEEP_DAYS):
+    # Deletes attachments that no note and no kept revision refers to any more, once keep_days have
+    # passed since they were last pasted. Returns how many went.
+    keep_after = int(time.time()) - keep_days * 86400
+    unused = {row[0] for row in conn.execute('SELECT id FROM attachments WHERE created<=?', (keep_after,))}
+    if not unused:
+        return 0
+    notes = conn.execute("SELECT content FROM tasks WHERE typeof(content) = 'blob' OR instr(content, ?)", (f"{ATTACHMENT_SCHEME}:",))
+    for (content,) in notes:
+        unused.difference_update(int(n) for n in ATTACHMENT_REFERENCE.findall(decode_content(content)))
+    revisions = conn.execute('SELECT data FROM task_revisions')
+    for (data,) in revisions:
+        if not unused:
+            break
+        unused.difference_update(int(n) for n in ATTACHMENT_REFERENCE.findall(zlib.decompress(data).decode("utf-8")))
+    # A paste since the scan renews created, which keeps that attachment
+    conn.executemany('DELETE FROM attachments WHERE id=? AND created<=?', [(attachment_id, keep_after) for attachment_id in unused])
+    conn.commit()
+    return len(unused)
+
+# ---- Revision history: zlib-compressed line deltas chained to periodic full snapshots ----
+def line_delta(old, new):
+    # [[start, end], "line", ...]: copy lines old[start:end] or insert a literal line
+    a, b = old.splitlines(True), new.splitlines(True)
+    if max(len(a), len(b)) <= REVISION_DIFF_MAX_LINES:
+        opcodes = SequenceMatcher(None, a, b, autojunk=False).get_opcodes()
+    else:
+        head = 0
+        while head < min(len(a), len(b)) and a[head] == b[head]:
+            head += 1
+        tail = 0
+        while tail < min(len(a), len(b)) - head and a[-1 - tail] == b[-1 - tail]:
+            tail += 1
+        opcodes = [
+            ('equal', 0, head, 0, head),
+            ('replace', head, len(a) - tail, head, len(b) - tail),
+            ('equal', len(a) - tail, len(a), len(b) - tail, len(b)),
+        ]
+    ops = []
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag == 'equal':
+            if i2 > i1:
+                ops.append([i1, i2])
+        else:
+            ops.extend(b[j1:j2])
+    return ops
+
+def apply_line_delta(old, ops):
+    lines, out = old.splitlines(True), []
+    for op in ops:
+        if isinstance(op, list):
+            out.extend(lines[op[0]:op[1]])
+        else:
+            out.append(op)
+    return "".join(out)
+
+def load_revision(conn, revision_id):
+    # Snapshot plus the deltas after it in its chain, so cost is bounded by REVISION_SNAPSHOT_EVERY
+    row = conn.execute('SELECT snapshot_id, data FROM task_revisions WHERE id=?', (revision_id,)).fetchone()
+    if row is None:
+        return None
+    snapshot_id, data = row
+    if snapshot_id is None:
+        return zlib.decompress(data).decode("utf-8")
+    snapshot = conn.execute('SELECT data FROM task_revisions WHERE id=?', (snapshot_id,)).fetchone()[0]
+    content = zlib.decompress(snapshot).decode("utf-8")
+    deltas = conn.execute(
+        'SELECT data FROM task_revisions WHERE snapshot_id=? AND id<=? ORDER BY id', (snapshot_id, revision_id)
+    )
+    for (delta,) in deltas:
+        content = apply_line_delta(content, json.loads(zlib.decompress(delta)))
+    return content
+
+def record_revision(conn, task_id, content, created, recorded):
+    latest = conn.execute(
+        'SELECT id, snapshot_id FROM task_revisions WHERE task_id=? ORDER BY id DESC LIMIT 1', (task_id,)
+    ).fetchone()
+    snapshot = zlib.compress(content.encode("utf-8"))
+    if latest:
+        chain = latest[1] or latest[0]
+        depth = conn.execute('SELECT COUNT(*) FROM task_revisions WHERE snapshot_id=?', (chain,)).fetchone()[0]
+        if depth < REVISION_SNAPSHOT_EVERY - 1:
+            delta = zlib.compress(json.dumps(line_delta(load_revision(conn, latest[0]), content)).encode("utf-8"))
+            # A delta that barely beats a full copy just lengthens the chain
+            if len(delta) < len(snapshot) // 2:
+                conn.execute(
+                    'INSERT INTO task_revisions (task_id, created, recorded, snapshot_id, size, data) VALUES (?, ?, ?, ?, ?, ?)',
+                    (task_id, created, recorded, chain, len(content), delta)
+                )
+                return
+    conn.execute(
+        'INSERT INTO task_revisions (task_id, created, recorded, snapshot_id, size, data) VALUES (?, ?, ?, NULL, ?, ?)',
+        (task_id, created, recorded, len(content), snapshot)
+    )
+
+def prune_task_revisions(conn, task_id, keep_after, keep_count=REVISION_KEEP_PER_TASK):
+    # Drops revisions archived before keep_after or beyond the newest keep_count. A kept delta whose
+    # snapshot goes is rewritten as the new snapshot of its chain first.
+    kept = conn.execute(
+        'SELECT id, snapshot_id FROM task_revisions WHERE task_id=? AND recorded>=? ORDER BY id DESC LIMIT ?',
+        (task_id, keep_after, keep_count)
+    ).fetchall()
+    if not kept:
+        conn.execute('DELETE FROM task_revisions WHERE task_id=?', (task_id,))
+        return
+    oldest_id, snapshot_id = kept[-1]
+    if snapshot_id is not None:
+        content = load_revision(conn, oldest_id)
+        conn.execute('UPDATE task_revisions SET snapshot_id=NULL, data=? WHERE id=?', (zlib.compress(content.encode("utf-8")), oldest_id))
+        conn.execute('UPDATE task_revisions SET snapshot_id=? WHERE snapshot_id=? AND id>?', (oldest_id, snapshot_id, oldest_id))
+    conn.execute('DELETE FROM task_revisions WHERE task_id=? AND id<?', (task_id, oldest_id))
+
+def prune_revisions(conn, keep_days=REVISION_KEEP_DAYS, keep_count=REVISION_KEEP_PER_TASK):
+    keep_after = int(time.time()) - keep_days * 86400
+    task_ids = [row[0] for row in conn.execute(
+        'SELECT task_id FROM task_revisions GROUP BY task_id HAVING COUNT(*)>? OR MIN(recorded)<?', (keep_count, keep_after)
+    )]
+    for task_id in task_ids:
+        prune_task_revisions(conn, task_id, keep_after, keep_count)
+    conn.commit()
+    return len(task_ids)
+
+# ---- Online backups ----
+def list_backups(folder):
+    # Oldest first; the timestamped names sort chronologically
+    try:
+        names = os.listdir(folder)
+    except OSError:
+        return []
+    return [os.path.join(folder, name) for name in sorted(names) if re.fullmatch(r"database-\d{8}-\d{6}\.db", name)]
+
+def backup_database(db_path, folder, generations=BACKUP_GENERATIONS, progress=None):
+    # progress(done, total) is called per step and may raise TransferCancelled to abort the copy
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, time.strftime("database-%Y%m%d-%H%M%S.db"))
+    partial = path + ".partial"
+    src = sqlite3.connect(db_path)
+    dst = sqlite3.connect(partial)
+    try:
+        # A read transaction pins one WAL snapshot, so autosaves during the copy never restart it
+        src.execute('BEGIN')
+        src.execute('SELECT COUNT(*) FROM sqlite_master').fetchone()
+
+        def step(status, remaining, total):
+            if progress:
+                progress(total - remaining, total)
+            time.sleep(BACKUP_STEP_PAUSE)
+
+        src.backup(dst, pages=BACKUP_PAGES_PER_STEP, progress=step)
+        src.rollback()
+        problems = [row[0] for row in dst.execute('PRAGMA integrity_check')]
+        if problems != ['ok']:
+            raise sqlite3.DatabaseError("Backup failed its integrity check: " + "; ".join(problems[:5]))
+    except BaseException:
+        src.close()
+        dst.close()
+        os.remove(partial)
+        raise
+    src.close()
+    dst.close()
+    os.replace(partial, path)
+    for old in list_backups(folder)[:-max(generations, 1)]:
+        os.remove(old)
+    return path
+
+# ---- Maintenance: free pages, query statistics ----
+AUTO_VACUUM_MODES = ("none", "full", "incremental")
+STATS_TABLES = ("categories", "tasks", "task_revisions", "attachments", "change_log")
+
+def file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+def database_stats(conn, largest=STATS_LARGEST_NOTES):
+    # Sizes come from the files and the page counts; note sizes are as stored, so compressed notes count compressed
+    db_path = conn.execute('PRAGMA database_list').fetchone()[2]
+    page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+    return {
+        'file_bytes': file_size(db_path),
+        'wal_bytes': file_size(db_path + "-wal"),
+        'page_size': page_size,
+        'page_count': conn.execute('PRAGMA page_count').fetchone()[0],
+        'free_pages': conn.execute('PRAGMA freelist_count').fetchone()[0],
+        'auto_vacuum': AUTO_VACUUM_MODES[conn.execute('PRAGMA auto_vacuum').fetchone()[0]],
+        'rows': {table: conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0] for table in STATS_TABLES},
+        'largest_notes': conn.execute(
+            'SELECT id, name, length(CAST(content AS BLOB)) AS size FROM tasks ORDER BY size DESC, id LIMIT ?', (largest,)
+        ).fetchall(),
+    }
+
+def incremental_vacuum_step(conn, pages=VACUUM_PAGES_PER_STEP):
+    # Returns (pages freed, free pages left). Each step is its own short write transaction.
+    # executescript() runs the pragma to completion; execute() would free a single page.
+    before = conn.execute('PRAGMA freelist_count').fetchone()[0]
+    if before:
+        conn.executescript(f'PRAGMA incremental_vacuum({int(pages)})')
+    after = conn.execute('PRAGMA freelist_count').fetchone()[0]
+    return before - after, after
+
+def optimize_database(conn):
+    # PRAGMA optimize only refreshes statistics that already exist, so the first run gathers them.
+    # Both sample at most ANALYZE_ROW_LIMIT rows per index.
+    conn.commit()
+    conn.execute(f'PRAGMA analysis_limit={ANALYZE_ROW_LIMIT}')
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name='sqlite_stat1'").fetchone() is None:
+        conn.executescript('ANALYZE')
+    else:
+        # 0x10000 checks every table, not just those this connection has queried (SQLite 3.46+)
+        conn.executescript('PRAGMA optimize=0x10002')
+
+def convert_auto_vacuum(db_path):
+    # Rebuilds a database created before auto_vacuum was turned on; False if there is nothing to do.
+    # VACUUM holds the write lock throughout, so every other writer, in this process or another,
+    # waits for it; the planner only runs it when asked to. It is all-or-nothing, but needs room for
+    # two more copies of the file (the rebuilt one and its WAL), and a file that fails its check is left alone.
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute(f'PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}')
+        if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 0:
+            return False
+        needed = 2 * conn.execute('PRAGMA page_size').fetchone()[0] * conn.execute('PRAGMA page_count').fetchone()[0]
+        if shutil.disk_usage(os.path.dirname(os.path.abspath(db_path))).free < needed:
+            raise OSError(f"Not enough free disk space to compact {os.path.basename(db_path)}")
+        problems = [row[0] for row in conn.execute('PRAGMA quick_check')]
+        if problems != ['ok']:
+            raise sqlite3.DatabaseError("Database failed its check: " + "; ".join(problems[:5]))
+        conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+        conn.execute('VACUUM')
+    finally:
+        conn.close()
+    return True
+
+# ---- Schema migrations, keyed on PRAGMA user_version ----
+def migrate_epoch_last_modified(conn):
+    # last_modified was a local "yyyy-MM-dd HH:mm" TEXT; rebuild the table with an INTEGER column
+    seq = conn.execute("SELECT seq FROM sqlite_sequence WHERE name='tasks'").fetchone()
+    conn.execute('''CREATE TABLE tasks_new (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        category_id INTEGER,
+        name TEXT NOT NULL,
+        content TEXT DEFAULT '',
+        important INTEGER DEFAULT 0,
+        last_modified INTEGER,
+        FOREIGN KEY(category_id) REFERENCES categories(id)
+    )''')
+    conn.execute('''INSERT INTO tasks_new (id, category_id, name, content, important, last_modified)
+        SELECT id, category_id, name, content, important,
+               CAST(strftime('%s', last_modified, 'utc') AS INTEGER)
+        FROM tasks''')
+    conn.execute('DROP TABLE tasks')
+    conn.execute('ALTER TABLE tasks_new RENAME TO tasks')
+    # Keep AUTOINCREMENT from reusing ids of tasks deleted before the rebuild
+    if seq:
+        conn.execute("UPDATE sqlite_sequence SET seq=max(seq, ?) WHERE name='tasks'", seq)
+        if not conn.execute("SELECT 1 FROM sqlite_sequence WHERE name='tasks'").fetchone():
+            conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('tasks', ?)", seq)
+
+def migrate_task_order_index(conn):
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_tasks_category_order ON tasks(category_id, important DESC, id)')
+
+def migrate_content_hash(conn):
+    conn.execute('ALTER TABLE tasks ADD COLUMN content_hash TEXT')
+    conn.create_function('planner_content_hash', 1, content_hash, deterministic=True)
+    conn.execute('UPDATE tasks SET content_hash=planner_content_hash(content)')
+
+def migrate_search_index(conn):
+    # rowid is tasks.id; names and deletes follow via triggers, bodies via the write path
+    conn.execute("CREATE VIRTUAL TABLE tasks_fts USING fts5(name, body, tokenize='unicode61 remove_diacritics 2')")
+    conn.execute('''CREATE TRIGGER tasks_fts_insert AFTER INSERT ON tasks BEGIN
+        INSERT INTO tasks_fts (rowid, name, body) VALUES (new.id, new.name, '');
+    END''')
+    conn.execute('''CREATE TRIGGER tasks_fts_rename AFTER UPDATE OF name ON tasks BEGIN
+        UPDATE tasks_fts SET name=new.name WHERE rowid=new.id;
+    END''')
+    conn.execute('''CREATE TRIGGER tasks_fts_delete AFTER DELETE ON tasks BEGIN
+        DELETE FROM tasks_fts WHERE rowid=old.id;
+    END''')
+    rows = conn.execute('SELECT id, name, content FROM tasks')
+    conn.executemany(
+        'INSERT INTO tasks_fts (rowid, name, body) VALUES (?, ?, ?)',
+        ((task_id, name, html_to_text(content)) for task_id, name, content in rows)
+    )
+
+def migrate_task_tree_index(conn):
+    # Covers load_index() so startup reads the index b-tree instead of every note body
+    conn.execute('DROP INDEX IF EXISTS idx_tasks_category_order')
+    conn.execute('CREATE INDEX idx_tasks_tree ON tasks(category_id, important DESC, id, name, last_modified, content_hash)')
+
+def migrate_task_revisions(conn):
+    # snapshot_id is NULL for full snapshots; deltas point at the snapshot that starts their chain
+    conn.execute('''CREATE TABLE task_revisions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        task_id INTEGER NOT NULL,
+        created INTEGER NOT NULL,
+        recorded INTEGER NOT NULL,
+        snapshot_id INTEGER,
+        size INTEGER NOT NULL,
+        data BLOB NOT NULL
+    )''')
+    conn.execute('CREATE INDEX idx_task_revisions_task ON task_revisions(task_id, id)')
+    conn.execute('CREATE INDEX idx_task_revisions_chain ON task_revisions(snapshot_id, id)')
+    conn.execute('''CREATE TRIGGER task_revisions_delete AFTER DELETE ON tasks BEGIN
+        DELETE FROM task_revisions WHERE task_id=old.id;
+    END''')
+
+def migrate_change_log(conn):
+    # One row per committed change to a task or category, read by other running instances
+    conn.execute('''CREATE TABLE change_log (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        kind TEXT NOT NULL,
+        item_id INTEGER NOT NULL
+    )''')
+    for table, kind in (('tasks', 'task'), ('categories', 'category')):
+        for event, row in (('INSERT', 'new'), ('UPDATE', 'new'), ('DELETE', 'old')):
+            conn.execute(f'''CREATE TRIGGER {table}_log_{event.lower()} AFTER {event} ON {table} BEGIN
+                INSERT INTO change_log (kind, item_id) VALUES ('{kind}', {row}.id);
+            END''')
+
+def migrate_manual_order(conn):
+    # Sparse ranks order tasks within their star group and categories among themselves,
+    # numbered in the order they were shown before
+    conn.execute('ALTER TABLE tasks ADD COLUMN rank INTEGER NOT NULL DEFAULT 0')
+    conn.execute('ALTER TABLE categories ADD COLUMN rank INTEGER NOT NULL DEFAULT 0')
+    conn.execute('''UPDATE tasks SET rank = ordered.n * ? FROM (
+        SELECT id, ROW_NUMBER() OVER (PARTITION BY category_id ORDER BY important DESC, id) AS n FROM tasks
+    ) AS ordered WHERE ordered.id = tasks.id''', (RANK_GAP,))
+    conn.execute('''UPDATE categories SET rank = ordered.n * ? FROM (
+        SELECT id, ROW_NUMBER() OVER (ORDER BY id) AS n FROM categories
+    ) AS ordered WHERE ordered.id = categories.id''', (RANK_GAP,))
+    conn.execute('DROP INDEX idx_tasks_tree')
+    conn.execute('CREATE INDEX idx_tasks_tree ON tasks(category_id, important DESC, rank, id, name, last_modified, content_hash)')
+
+def migrate_attachments(conn):
+    # Images already embedded in notes as data: URIs move out into attachments.
+    # created came later (migrate_attachment_created), but store_attachment() writes it already.
+    conn.execute('''CREATE TABLE attachments (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        hash TEXT NOT NULL UNIQUE,
+        mime TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        created INTEGER,
+        data BLOB NOT NULL
+    )''')
+    rows = conn.execute('''SELECT id, content FROM tasks WHERE content LIKE '%src="data:%' ''').fetchall()
+    for task_id, content in rows:
+        content = extract_data_uris(conn, content)
+        conn.execute('UPDATE tasks SET content=?, content_hash=? WHERE id=?', (content, content_hash(content), task_id))
+
+# Notes still stored as HTML; the same terms have to appear in a query for it to use the index
+HTML_CONTENT_WHERE = "typeof(content) = 'text' AND content <> '' AND substr(content, 1, 1) <> char(2)"
+
+def migrate_compact_content(conn):
+    # Reading HTML takes Qt, so the planner converts these notes itself, a few at a time while idle
+    conn.execute(f'CREATE INDEX idx_tasks_html_content ON tasks(id) WHERE {HTML_CONTENT_WHERE}')
+
+def migrate_attachment_created(conn):
+    # Attachments from before are dated now, so the sweep gives them a full ATTACHMENT_KEEP_DAYS
+    if 'created' not in [row[1] for row in conn.execute('PRAGMA table_info(attachments)')]:
+        conn.execute('ALTER TABLE attachments ADD COLUMN created INTEGER')
+    conn.execute('UPDATE attachments SET created=? WHERE created IS NULL', (int(time.time()),))
+
+# Migration N upgrades user_version N-1 to N; only ever append to this list
+MIGRATIONS = [
+    migrate_epoch_last_modified,
+    migrate_task_order_index,
+    migrate_content_hash,
+    migrate_search_index,
+    migrate_task_tree_index,
+    migrate_task_revisions,
+    migrate_change_log,
+    migrate_manual_order,
+    migrate_attachments,
+    migrate_compact_content,
+    migrate_attachment_created,
+]
+
+def run_migrations(conn):
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+    if version > len(MIGRATIONS):
+        raise RuntimeError(f"{DB_FILENAME} schema version {version} is newer than this build supports")
+    while version < len(MIGRATIONS):
+        conn.commit()
+        # IMMEDIATE takes the write lock first, so an instance starting alongside waits and then re-reads the version
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            version = conn.execute('PRAGMA user_version').fetchone()[0]
+            if version < len(MIGRATIONS):
+                MIGRATIONS[version](conn)
+                version += 1
+                conn.execute(f'PRAGMA user_version={version}')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+SYNCHRONOUS_LEVELS = ("OFF", "NORMAL", "FULL", "EXTRA")
+
+def configure_connection(conn, synchronous):
+    if synchronous.upper() not in SYNCHRONOUS_LEVELS:
+        raise ValueError(f"Unknown synchronous level: {synchronous}")
+    conn.execute(f'PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}')
+    if conn.execute('PRAGMA page_count').fetchone()[0] == 0:
+        # Only sticks on a new, empty file, and only ahead of WAL; older files go through convert_auto_vacuum()
+        conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute(f'PRAGMA synchronous={synchronous.upper()}')
+
+def apply_task_fields(conn, task_id, fields):
+    # Writes task columns the way every save does: the content being replaced may go into the
+    # history first, and the search index follows the new content. The caller commits.
+    # fields may carry search_text (the plain text, when the caller already has it) and revision=True.
+    search_text = fields.pop('search_text', None)
+    force_revision = fields.pop('revision', False)
+    if 'content' in fields and search_text is None:
+        search_text = content_to_text(fields['content'])
+    if 'content' in fields:
+        archive_content(conn, task_id, fields['content'], force_revision)
+        fields['content'] = encode_content(fields['content'])
+    if fields:
+        columns = sorted(fields)
+        assignments = ", ".join(f"{column}=?" for column in columns)
+        conn.execute(f'UPDATE tasks SET {assignments} WHERE id=?', [fields[c] for c in columns] + [task_id])
+    if search_text is not None:
+        conn.execute('UPDATE tasks_fts SET body=? WHERE rowid=?', (search_text, task_id))
+
+def archive_content(conn, task_id, content, force=False):
+    # Keeps what is about to be overwritten when the last save was a while ago,
+    # when the newest revision is old enough, or when asked to (restores)
+    row = conn.execute('''SELECT content, last_modified,
+        (SELECT MAX(recorded) FROM task_revisions WHERE task_id=tasks.id) FROM tasks WHERE id=?''', (task_id,)).fetchone()
+    if row is None or not row[0]:
+        return
+    old_content, last_modified, last_recorded = row
+    old_content = decode_content(old_content)
+    if old_content == content:
+        return
+    now = int(time.time())
+    if (force or last_recorded is None or now - (last_modified or 0) >= REVISION_INTERVAL
+            or now - last_recorded >= REVISION_INTERVAL):
+        record_revision(conn, task_id, old_content, last_modified or now, now)
+        prune_task_revisions(conn, task_id, now - REVISION_KEEP_DAYS * 86400)
+
+class WriteBehindQueue:
+    # Coalesces per-task column writes and applies them in one transaction on a background thread
+    def __init__(self, db_path, synchronous=DB_SYNCHRONOUS, delay=WRITE_BEHIND_DELAY):
+        self.db_path = db_path
+        self.synchronous = synchronous
+        self.delay = delay
+        self.pending = {}
+        self.in_flight = {}
+        self.flush_requested = False
+        self.closed = False
+        self.last_error = None
+        self.failed_batches = 0
+        self.cond = threading.Condition()
+        self.thread = threading.Thread(target=self._run, name="planner-write-behind", daemon=True)
+        self.thread.start()
+
+    def put(self, task_id, **fields):
+        with self.cond:
+            self.pending.setdefault(task_id, {}).update(fields)
+            self.cond.notify_all()
+
+    def get(self, task_id, field):
+        # Latest not-yet-committed value for a task column, or None
+        with self.cond:
+            for queue in (self.pending, self.in_flight):
+                if field in queue.get(task_id, {}):
+                    return queue[task_id][field]
+        return None
+
+    def discard(self, task_id):
+        with self.cond:
+            self.pending.pop(task_id, None)
+
+    def flush(self):
+        # Block until everything queued so far is committed, or until a batch fails: it stays
+        # queued for the next attempt and last_error says why
+        with self.cond:
+            failed_batches = self.failed_batches
+            self.flush_requested = True
+            self.cond.notify_all()
+            while (self.pending or self.in_flight) and self.thread.is_alive() and self.failed_batches == failed_batches:
+                self.cond.wait(0.1)
+
+    def close(self):
+        self.flush()
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        self.thread.join()
+
+    def _run(self):
+        conn = sqlite3.connect(self.db_path)
+        configure_connection(conn, self.synchronous)
+        while True:
+            with self.cond:
+                while not self.pending and not self.closed:
+                    self.flush_requested = False
+                    self.cond.notify_all()
+                    self.cond.wait()
+                if not self.pending:
+                    break
+                # Let writes pile up for a moment unless someone is waiting on them
+                deadline = time.monotonic() + self.delay
+                while not self.flush_requested and not self.closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.cond.wait(remaining)
+                self.in_flight, self.pending = self.pending, {}
+                batch = self.in_flight
+            try:
+                with conn:
+                    for task_id, fields in batch.items():
+                        apply_task_fields(conn, task_id, dict(fields))
+                error = None
+            except Exception as e:
+                # Not only locks: a note that fails to encode must not end the thread either
+                error = e
+            with self.cond:
+                if error:
+                    # Put the batch back underneath anything queued since, retry after the delay
+                    self.last_error = error
+                    self.failed_batches += 1
+                    for task_id, fields in batch.items():
+                        merged = dict(fields)
+                        merged.update(self.pending.get(task_id, {}))
+                        self.pending[task_id] = merged
+                self.in_flight = {}
+                self.cond.notify_all()
+                if error and self.closed:
+                    # close() has already waited out one attempt; give up rather than hang the exit
+                    break
+            if error:
+                time.sleep(self.delay)
+        conn.close()
+
+def create_tables(conn):
+    cur = conn.cursor()
+    cur.execute('''CREATE TABLE IF NOT EXISTS categories (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL
+    )''')
+    cur.execute('''CREATE TABLE IF NOT EXISTS tasks (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        category_id INTEGER,
+        name TEXT NOT NULL,
+        content TEXT DEFAULT '',
+        important INTEGER DEFAULT 0,
+        last_modified TEXT,
+        FOREIGN KEY(category_id) REFERENCES categories(id)
+    )''')
+    conn.commit()
+
+def open_database(db_path, synchronous=DB_SYNCHRONOUS):
+    # A connection to an up-to-date schema; safe alongside other open instances
+    conn = sqlite3.connect(db_path)
+    configure_connection(conn, synchronous)
+    create_tables(conn)
+    run_migrations(conn)
+    return conn
+
+# Row-level writes shared by CategoryTaskDB and the command line. None of them commit.
+
+def insert_task(conn, category_id, name="NEW TASK", important=0):
+    # New tasks go last in their category; returns (id, rank)
+    cur = conn.cursor()
+    cur.execute('''INSERT INTO tasks (category_id, name, important, rank)
+        VALUES (?, ?, ?, (SELECT COALESCE(MAX(rank), 0) + ? FROM tasks WHERE category_id=?))''',
+        (category_id, name, int(bool(important)), RANK_GAP, category_id))
+    task_id = cur.lastrowid
+    return task_id, cur.execute('SELECT rank FROM tasks WHERE id=?', (task_id,)).fetchone()[0]
+
+def set_tasks_important(conn, task_ids, important):
+    conn.executemany('UPDATE tasks SET important=? WHERE id=?', [(int(bool(important)), task_id) for task_id in task_ids])
+
+def find_category(conn, name_or_id):
+    # Category id by id or by name (case-insensitive, first in list order), or None
+    if str(name_or_id).isdigit():
+        row = conn.execute('SELECT id FROM categories WHERE id=?', (int(name_or_id),)).fetchone()
+        if row:
+            return row[0]
+    row = conn.execute('SELECT id FROM categories WHERE name=? COLLATE NOCASE ORDER BY rank, id LIMIT 1', (str(name_or_id),)).fetchone()
+    return row[0] if row else None
+
+# Columns behind each task_index entry, in task_index_entry() order
+TASK_INDEX_COLUMNS = "id, category_id, name, important, rank, last_modified, content_hash"
+
+def task_index_entry(row):
+    task_id, cat_id, name, important, rank, last_modified, digest = row
+    return task_id, {
+        'category_id': cat_id, 'name': name, 'important': int(bool(important)), 'rank': rank,
+        'last_modified': last_modified, 'content_hash': digest,
+    }
+
+class CategoryTaskDB:
+    def __init__(self, db_path, synchronous=DB_SYNCHRONOUS, load_index=True):
+        self.db_path = db_path
+        self.conn = open_database(db_path, synchronous)
+        self.writer = WriteBehindQueue(db_path, synchronous)
+        # In-memory index: category id -> name (in display order) and rank, task id -> row fields
+        self.categories = {}
+        self.category_ranks = {}
+        self.task_index = {}
+        # Position in change_log this index reflects, and the last PRAGMA data_version seen
+        self.change_id = self.last_change_id()
+        self.data_version = None
+        if load_index:
+            self.load_index()
+
+    def load_index(self):
+        # Two set-based queries instead of one get_tasks() per category
+        self.change_id = self.last_change_id()
+        cur = self.conn.cursor()
+        cur.execute('SELECT id, name, rank FROM categories ORDER BY rank, id')
+        rows = cur.fetchall()
+        self.categories = {cat_id: name for cat_id, name, _ in rows}
+        self.category_ranks = {cat_id: rank for cat_id, _, rank in rows}
+        cur.execute(f'SELECT {TASK_INDEX_COLUMNS} FROM tasks ORDER BY category_id, important DESC, rank, id')
+        self.task_index = dict(task_index_entry(row) for row in cur.fetchall())
+
+    def load_task(self, task_id):
+        # Index entry for one task and its category, ahead of a full load_index()
+        cur = self.conn.cursor()
+        cur.execute(f'''SELECT categories.name, categories.rank, {", ".join("tasks." + c.strip() for c in TASK_INDEX_COLUMNS.split(","))}
+            FROM tasks JOIN categories ON categories.id = tasks.category_id WHERE tasks.id=?''', (task_id,))
+        row = cur.fetchone()
+        if row is None:
+            return None
+        _, task = task_index_entry(row[2:])
+        self.categories.setdefault(task['category_id'], row[0])
+        self.category_ranks.setdefault(task['category_id'], row[1])
+        self.task_index[task_id] = task
+        return task
+
+    def last_change_id(self):
+        return self.conn.execute('SELECT COALESCE(MAX(id), 0) FROM change_log').fetchone()[0]
+
+    def poll_changes(self, max_items=CHANGE_LOG_RELOAD_ITEMS):
+        # Brings the index up to date with commits made through other connections.
+        # Returns None when nothing changed, True when the whole index was reloaded, otherwise
+        # (categories, tasks) mapping each changed id to (old, new), None standing for missing;
+        # categories as {'name', 'rank'}, tasks as task_index entries.
+        # Tasks with content still queued here keep their local content_hash and last_modified.
+        version = self.conn.execute('PRAGMA data_version').fetchone()[0]
+        if version == self.data_version:
+            return None
+        self.data_version = version
+        cur = self.conn.cursor()
+        cur.execute('SELECT MIN(id) FROM change_log')
+        first = cur.fetchone()[0]
+        cur.execute('SELECT id, kind, item_id FROM change_log WHERE id>? ORDER BY id', (self.change_id,))
+        rows = cur.fetchall()
+        if not rows:
+            return None
+        changed = {'category': set(), 'task': set()}
+        for _, kind, item_id in rows:
+            changed.setdefault(kind, set()).add(item_id)
+        if first > self.change_id + 1 or len(changed['category']) + len(changed['task']) > max_items:
+            # Rows this index never saw were pruned, or rebuilding is cheaper than patching
+            self.load_index()
+            return True
+        self.change_id = rows[-1][0]
+        categories, tasks = {}, {}
+        ids = sorted(changed['category'])
+        cur.execute(f'SELECT id, name, rank FROM categories WHERE id IN ({",".join("?" * len(ids))})', ids)
+        found = {cat_id: {'name': name, 'rank': rank} for cat_id, name, rank in cur.fetchall()}
+        for cat_id in ids:
+            old = {'name': self.categories[cat_id], 'rank': self.category_ranks.get(cat_id, 0)} if cat_id in self.categories else None
+            new = found.get(cat_id)
+            if old != new:
+                categories[cat_id] = (old, new)
+                if new is None:
+                    del self.categories[cat_id]
+                    self.category_ranks.pop(cat_id, None)
+                else:
+                    self.categories[cat_id] = new['name']
+                    self.category_ranks[cat_id] = new['rank']
+        if any(old is None or new is None or old['rank'] != new['rank'] for old, new in categories.values()):
+            self.sort_categories()
+        ids = sorted(changed['task'])
+        cur.execute(f'SELECT {TASK_INDEX_COLUMNS} FROM tasks WHERE id IN ({",".join("?" * len(ids))})', ids)
+        found = dict(task_index_entry(row) for row in cur.fetchall())
+        for task_id in ids:
+            old, new = self.task_index.get(task_id), found.get(task_id)
+            if old is not None and new is not None and self.writer.get(task_id, 'content') is not None:
+                new['content_hash'], new['last_modified'] = old['content_hash'], old['last_modified']
+            if old != new:
+                tasks[task_id] = (old and dict(old), new)
+                if new is None:
+                    del self.task_index[task_id]
+                elif old is None:
+                    self.task_index[task_id] = new
+                else:
+                    old.update(new)
+        return categories, tasks
+
+    def prune_change_log(self, keep=CHANGE_LOG_KEEP):
+        self.conn.execute('DELETE FROM change_log WHERE id <= (SELECT MAX(id) FROM change_log) - ?', (keep,))
+        self.conn.commit()
+
+    def get_tree(self):
+        # [(cat_id, cat_name, [(task_id, name, important), ...]), ...] built from the index
+        grouped = {cat_id: [] for cat_id in self.categories}
+        for task_id, task in self.task_index.items():
+            if task['category_id'] in grouped:
+                grouped[task['category_id']].append(task_id)
+        tree = []
+        for cat_id, cat_name in self.categories.items():
+            task_ids = sorted(grouped[cat_id], key=self.task_order)
+            tree.append((cat_id, cat_name, [(task_id, self.task_index[task_id]['name'], self.task_index[task_id]['important']) for task_id in task_ids]))
+        return tree
+
+    def task_order(self, task_id):
+        # Sort key within a category: starred first, then manual rank
+        task = self.task_index[task_id]
+        return -task['important'], task['rank'], task_id
+
+    def category_order(self, cat_id):
+        return self.category_ranks.get(cat_id, 0), cat_id
+
+    def sort_categories(self):
+        self.categories = {cat_id: self.categories[cat_id] for cat_id in sorted(self.categories, key=self.category_order)}
+
+    def get_task(self, task_id):
+        return self.task_index.get(task_id)
+
+    def get_categories(self):
+        cur = self.conn.cursor()
+        cur.execute('SELECT id, name FROM categories ORDER BY rank, id')
+        return cur.fetchall()
+
+    def get_tasks(self, category_id):
+        cur = self.conn.cursor()
+        cur.execute('SELECT id, name, important FROM tasks WHERE category_id=? ORDER BY important DESC, rank, id', (category_id,))
+        return cur.fetchall()
+
+    def get_task_content(self, task_id):
+        pending = self.writer.get(task_id, 'content')
+        if pending is not None:
+            return pending
+        cur = self.conn.cursor()
+        cur.execute('SELECT content FROM tasks WHERE id=?', (task_id,))
+        row = cur.fetchone()
+        return decode_content(row[0]) if row else ""
+
+    def html_content_ids(self, after_id, max_chars, limit):
+        # Tasks after after_id, in id order, whose notes are HTML of at most max_chars
+        return [row[0] for row in self.conn.execute(
+            f'SELECT id FROM tasks WHERE {HTML_CONTENT_WHERE} AND id > ? AND length(content) <= ? ORDER BY id LIMIT ?',
+            (after_id, max_chars, limit)
+        )]
+
+    def replace_task_content(self, task_id, old_content, content):
+        # Stores an equivalent form of a note without touching last_modified, the history or the
+        # search index. Returns False if the note has changed since old_content was read.
+        if self.writer.get(task_id, 'content') is not None:
+            return False
+        digest = content_hash(content)
+        cur = self.conn.execute(
+            'UPDATE tasks SET content=?, content_hash=? WHERE id=? AND content_hash=?',
+            (encode_content(content), digest, task_id, content_hash(old_content))
+        )
+        self.conn.commit()
+        if not cur.rowcount:
+            return False
+        if task_id in self.task_index:
+            self.task_index[task_id]['content_hash'] = digest
+        return True
+
+    def get_task_last_modified(self, task_id):
+        task = self.task_index.get(task_id)
+        return task['last_modified'] if task else ""
+
+    def add_category(self, name="NEW CATEGORY"):
+        cat_id = insert_category(self.conn, name)
+        self.conn.commit()
+        self.categories[cat_id] = name
+        self.category_ranks[cat_id] = self.conn.execute('SELECT rank FROM categories WHERE id=?', (cat_id,)).fetchone()[0]
+        return cat_id
+
+    def add_task(self, category_id, name="NEW TASK"):
+        task_id, rank = insert_task(self.conn, category_id, name)
+        self.conn.commit()
+        self.task_index[task_id] = {
+            'category_id': category_id, 'name': name, 'important': 0, 'rank': rank,
+            'last_modified': None, 'content_hash': content_hash(""),
+        }
+        return task_id
+
+    def update_category_name(self, category_id, name):
+        cur = self.conn.cursor()
+        cur.execute('UPDATE categories SET name=? WHERE id=?', (name, category_id))
+        self.conn.commit()
+        if category_id in self.categories:
+            self.categories[category_id] = name
+
+    def update_task_name(self, task_id, name):
+        cur = self.conn.cursor()
+        cur.execute('UPDATE tasks SET name=? WHERE id=?', (name, task_id))
+        self.conn.commit()
+        if task_id in self.task_index:
+            self.task_index[task_id]['name'] = name
+
+    def update_task_content(self, task_id, content, plain_text=None, revision=False):
+        # Returns False without writing when the stored content is identical.
+        # plain_text feeds the search index; without it the HTML is stripped on the writer thread.
+        # revision=True keeps the content being replaced in the history whatever its age.
+        digest = content_hash(content)
+        task = self.task_index.get(task_id)
+        if task and task['content_hash'] == digest:
+            return False
+        fields = {'content': content, 'content_hash': digest, 'search_text': plain_text}
+        if revision:
+            fields['revision'] = True
+        self.writer.put(task_id, **fields)
+        if task:
+            task['content_hash'] = digest
+        return True
+
+    def set_task_important(self, task_id, important):
+        set_tasks_important(self.conn, [task_id], important)
+        self.conn.commit()
+        if task_id in self.task_index:
+            self.task_index[task_id]['important'] = int(bool(important))
+
+    def update_task_last_modified(self, task_id, last_modified):
+        self.writer.put(task_id, last_modified=last_modified)
+        if task_id in self.task_index:
+            self.task_index[task_id]['last_modified'] = last_modified
+
+    def delete_task(self, task_id):
+        self.writer.discard(task_id)
+        cur = self.conn.cursor()
+        cur.execute('DELETE FROM tasks WHERE id=?', (task_id,))
+        self.conn.commit()
+        self.task_index.pop(task_id, None)
+
+    # Bulk operations: one transaction and one commit each, however many tasks are passed. Most are a
+    # single executemany; duplicate_tasks inserts its copies one by one to read each new id.
+
+    def move_tasks(self, task_ids, category_id):
+        # Appended to the category in the order given
+        cur = self.conn.cursor()
+        cur.executemany('''UPDATE tasks SET category_id=?, rank=(SELECT COALESCE(MAX(rank), 0) + ? FROM tasks WHERE category_id=?)
+            WHERE id=?''', [(category_id, RANK_GAP, category_id, task_id) for task_id in task_ids])
+        ranks = {task_id: cur.execute('SELECT rank FROM tasks WHERE id=?', (task_id,)).fetchone() for task_id in task_ids}
+        self.conn.commit()
+        for task_id in task_ids:
+            if task_id in self.task_index and ranks[task_id]:
+                self.task_index[task_id].update(category_id=category_id, rank=ranks[task_id][0])
+
+    def set_tasks_important(self, task_ids, important):
+        set_tasks_important(self.conn, task_ids, important)
+        self.conn.commit()
+        for task_id in task_ids:
+            if task_id in self.task_index:
+                self.task_index[task_id]['important'] = int(bool(important))
+
+    def delete_tasks(self, task_ids):
+        for task_id in task_ids:
+            self.writer.discard(task_id)
+        cur = self.conn.cursor()
+        cur.executemany('DELETE FROM tasks WHERE id=?', [(task_id,) for task_id in task_ids])
+        self.conn.commit()
+        for task_id in task_ids:
+            self.task_index.pop(task_id, None)
+
+    def duplicate_tasks(self, task_ids, last_modified=None):
+        # Copies keep category, star and content; returns the new ids in the order given
+        task_ids = [task_id for task_id in task_ids if task_id in self.task_index]
+        self.writer.flush()
+        cur = self.conn.cursor()
+        new_ids = insert_rows(cur, '''INSERT INTO tasks (category_id, name, content, important, last_modified, content_hash, rank)
+            SELECT category_id, name, content, important, ?, content_hash,
+                (SELECT COALESCE(MAX(rank), 0) + ? FROM tasks AS other WHERE other.category_id = tasks.category_id)
+            FROM tasks WHERE id=?''', [(last_modified, RANK_GAP, task_id) for task_id in task_ids])
+        rows = [cur.execute(f'SELECT {TASK_INDEX_COLUMNS} FROM tasks WHERE id=?', (task_id,)).fetchone() for task_id in new_ids]
+        # The insert trigger indexes names only; copy the bodies across
+        cur.executemany('UPDATE tasks_fts SET body=(SELECT body FROM tasks_fts WHERE rowid=?) WHERE rowid=?',
+            [(task_id, row[0]) for task_id, row in zip(task_ids, rows)])
+        self.conn.commit()
+        self.task_index.update(task_index_entry(row) for row in rows)
+        return [row[0] for row in rows]
+
+    # Manual order: a move rewrites the moved row's rank to fall between its new neighbours,
+    # renumbering the whole list RANK_GAP apart only once two neighbours are adjacent
+
+    def move_task(self, task_id, category_id, before_id=None):
+        # Puts the task before before_id, or last, among the tasks of category_id that share its star.
+        # Returns the ids whose rank changed.
+        task = self.task_index[task_id]
+        group = sorted(
+            (tid for tid, other in self.task_index.items()
+             if other['category_id'] == category_id and other['important'] == task['important'] and tid != task_id),
+            key=self.task_order,
+        )
+        if before_id in group:
+            pos = group.index(before_id)
+        elif before_id in self.task_index and self.task_index[before_id]['important'] < task['important']:
+            # Dropped among the unstarred tasks: the starred one stays last of the starred
+            pos = len(group)
+        elif before_id in self.task_index and self.task_index[before_id]['category_id'] == category_id:
+            pos = 0
+        else:
+            pos = len(group)
+        ranks = [self.task_index[tid]['rank'] for tid in group]
+        rank = between_ranks(ranks[pos - 1] if pos else None, ranks[pos] if pos < len(ranks) else None)
+        cur = self.conn.cursor()
+        if rank is None:
+            group.insert(pos, task_id)
+            changed = {tid: (n + 1) * RANK_GAP for n, tid in enumerate(group)}
+            cur.executemany('UPDATE tasks SET rank=? WHERE id=?', [(rank, tid) for tid, rank in changed.items()])
+        else:
+            changed = {task_id: rank}
+        cur.execute('UPDATE tasks SET category_id=?, rank=? WHERE id=?', (category_id, changed[task_id], task_id))
+        self.conn.commit()
+        task['category_id'] = category_id
+        for tid, rank in changed.items():
+            self.task_index[tid]['rank'] = rank
+        return list(changed)
+
+    def move_category(self, cat_id, before_id=None):
+        # Puts the category before before_id, or last. Returns the ids whose rank changed:
+        # none when it is dropped on itself or already sits there.
+        order = list(self.categories)
+        if before_id == cat_id or cat_id not in order:
+            return []
+        others = [other for other in order if other != cat_id]
+        pos = others.index(before_id) if before_id in others else len(others)
+        if pos == order.index(cat_id):
+            return []
+        ranks = [self.category_ranks.get(other, 0) for other in others]
+        rank = between_ranks(ranks[pos - 1] if pos else None, ranks[pos] if pos < len(ranks) else None)
+        if rank is None:
+            others.insert(pos, cat_id)
+            changed = {other: (n + 1) * RANK_GAP for n, other in enumerate(others)}
+        else:
+            changed = {cat_id: rank}
+        self.conn.executemany('UPDATE categories SET rank=? WHERE id=?', [(rank, other) for other, rank in changed.items()])
+        self.conn.commit()
+        self.category_ranks.update(changed)
+        self.sort_categories()
+        return list(changed)
+
+    def delete_category_and_tasks(self, cat_id):
+        for task_id, task in self.task_index.items():
+            if task['category_id'] == cat_id:
+                self.writer.discard(task_id)
+        c = self.conn.cursor()
+        c.execute('DELETE FROM tasks WHERE category_id=?', (cat_id,))
+        c.execute('DELETE FROM categories WHERE id=?', (cat_id,))
+        self.conn.commit()
+        self.categories.pop(cat_id, None)
+        self.category_ranks.pop(cat_id, None)
+        for task_id in [tid for tid, task in self.task_index.items() if task['category_id'] == cat_id]:
+            del self.task_index[task_id]
+
+    def get_revisions(self, task_id, before_id=None, limit=REVISION_PAGE_SIZE):
+        # [(revision_id, created, size), ...] newest first, a page at a time
+        cur = self.conn.cursor()
+        cur.execute('''SELECT id, created, size FROM task_revisions WHERE task_id=? AND id<?
+            ORDER BY id DESC LIMIT ?''', (task_id, before_id if before_id is not None else 2 ** 63 - 1, limit))
+        return cur.fetchall()
+
+    def get_revision_content(self, revision_id):
+        return load_revision(self.conn, revision_id)
+
+    def add_attachment(self, data, mime):
+        attachment_id = store_attachment(self.conn, data, mime)
+        self.conn.commit()
+        return attachment_id
+
+    def get_attachment(self, attachment_id):
+        return read_attachment(self.conn, attachment_id)
+
+    def extract_attachments(self, content):
+        content = extract_data_uris(self.conn, content)
+        self.conn.commit()
+        return content
+
+    def prune_revisions(self):
+        return prune_revisions(self.conn)
+
+    def save(self, checkpoint="FULL"):
+        self.writer.flush()
+        self.conn.commit()
+        # Explicit saves stay durable under synchronous=NORMAL; a FULL checkpoint would wait out a running backup
+        self.conn.execute(f'PRAGMA wal_checkpoint({checkpoint})')
+
+    def close(self):
+        self.writer.close()
+        self.conn.commit()
+        self.conn.close()
+
@@ -0,0 +1,138 @@
+import base64
+import importlib.util
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+
+import planner_db
+
+HAS_QT = importlib.util.find_spec("PyQt6") is not None
+if HAS_QT:
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt6.QtCore import QMimeData
+    from PyQt6.QtGui import QColor, QImage
+    from PyQt6.QtWidgets import QApplication
+    import main
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"not really an image"
+
+
+def attachment_ids(conn):
+    return {row[0] for row in conn.execute('SELECT id FROM attachments')}
+
+
+class PlannerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = planner_db.CategoryTaskDB(os.path.join(self.tmp.name, planner_db.DB_FILENAME))
+        self.cat_id = self.db.add_category("Work")
+        self.task_id = self.db.add_task(self.cat_id, "Photos")
+
+    def tearDown(self):
+        self.db.close()
+        self.tmp.cleanup()
+
+    def save(self, task_id, content, revision=False):
+        self.db.update_task_content(task_id, content, revision=revision)
+        self.db.writer.flush()
+
+    def sweep(self, keep_days=0):
+        return planner_db.sweep_attachments(self.db.conn, keep_days)
+
+
+@unittest.skipUnless(HAS_QT, "PyQt6 is not installed")
+class PastedImageTest(PlannerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.app = QApplication.instance() or QApplication([])
+        main.TaskDocument.db = self.db
+        self.editor = main.RichTextEdit()
+
+    def tearDown(self):
+        main.TaskDocument.db = None
+        self.editor.deleteLater()
+        super().tearDown()
+
+    def paste_image(self):
+        image = QImage(40, 30, QImage.Format.Format_RGB32)
+        image.fill(QColor(200, 100, 50))
+        mime = QMimeData()
+        mime.setImageData(image)
+        self.editor.insertFromMimeData(mime)
+        return max(attachment_ids(self.db.conn))
+
+    def test_deleted_task_loses_its_image(self):
+        attachment_id = self.paste_image()
+        self.save(self.task_id, main.document_content(self.editor.document()))
+        self.assertEqual(self.sweep(), 0)
+        self.assertIn(attachment_id, attachment_ids(self.db.conn))
+        self.db.delete_task(self.task_id)
+        self.assertEqual(self.sweep(), 1)
+        self.assertNotIn(attachment_id, attachment_ids(self.db.conn))
+
+    def test_undone_paste_is_kept_for_a_while(self):
+        attachment_id = self.paste_image()
+        self.editor.undo()
+        self.save(self.task_id, main.document_content(self.editor.document()))
+        self.assertEqual(self.sweep(planner_db.ATTACHMENT_KEEP_DAYS), 0)
+        self.assertEqual(self.sweep(), 1)
+        self.assertNotIn(attachment_id, attachment_ids(self.db.conn))
+
+
+class SweepTest(PlannerTestCase):
+    def note(self, attachment_id):
+        return f'<p>Look <img src="{planner_db.attachment_url(attachment_id)}" /></p>'
+
+    def test_image_kept_by_a_revision(self):
+        attachment_id = self.db.add_attachment(PNG, "image/png")
+        self.save(self.task_id, self.note(attachment_id))
+        self.save(self.task_id, "<p>Image edited out</p>", revision=True)
+        self.assertEqual(self.sweep(), 0)
+        # Once the history that still shows it expires, the image goes too
+        planner_db.prune_revisions(self.db.conn, keep_days=0, keep_count=0)
+        self.assertEqual(self.sweep(), 1)
+        self.assertEqual(attachment_ids(self.db.conn), set())
+
+    def test_compact_and_compressed_notes_keep_their_images(self):
+        attachment_id = self.db.add_attachment(PNG, "image/png")
+        name = planner_db.attachment_url(attachment_id)
+        content = planner_db.COMPACT_PREFIX + f'[[1, "", "{name}", 40, 30]]\n\ufffc' + "x" * 100000
+        self.save(self.task_id, content)
+        self.assertIsInstance(self.db.conn.execute('SELECT content FROM tasks WHERE id=?', (self.task_id,)).fetchone()[0], bytes)
+        self.assertEqual(self.sweep(), 0)
+
+    def test_deleted_category_loses_its_images(self):
+        attachment_id = self.db.add_attachment(PNG, "image/png")
+        self.save(self.task_id, self.note(attachment_id))
+        self.db.delete_category_and_tasks(self.cat_id)
+        self.assertEqual(self.sweep(), 1)
+
+    def test_pasting_again_renews_the_grace_period(self):
+        attachment_id = self.db.add_attachment(PNG, "image/png")
+        self.db.conn.execute('UPDATE attachments SET created=0 WHERE id=?', (attachment_id,))
+        self.db.conn.commit()
+        self.assertEqual(self.db.add_attachment(PNG, "image/png"), attachment_id)
+        self.assertEqual(self.sweep(planner_db.ATTACHMENT_KEEP_DAYS), 0)
+
+
+class MigratedAttachmentTest(unittest.TestCase):
+    def test_embedded_images_are_dated_when_moved_out(self):
+        with tempfile.TemporaryDirectory() as folder:
+            db_path = os.path.join(folder, planner_db.DB_FILENAME)
+            conn = sqlite3.connect(db_path)
+            planner_db.create_tables(conn)
+            uri = "data:image/png;base64," + base64.b64encode(PNG).decode("ascii")
+            conn.execute('INSERT INTO tasks (category_id, name, content) VALUES (1, ?, ?)', ("Old", f'<img src="{uri}" />'))
+            conn.commit()
+            conn.close()
+            conn = planner_db.open_database(db_path)
+            created = conn.execute('SELECT created FROM attachments').fetchall()
+            conn.close()
+        self.assertEqual(len(created), 1)
+        self.assertLessEqual(abs(created[0][0] - time.time()), 60)
+
+
+if __name__ == '__main__':
+    unittest.main()
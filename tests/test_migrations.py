@@ -0,0 +1,106 @@
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+
+import planner_db
+
+# A database.db as the first release wrote it: no user_version, TEXT timestamps in local time
+ORIGINAL_SCHEMA = '''
+CREATE TABLE categories (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL
+);
+CREATE TABLE tasks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    category_id INTEGER,
+    name TEXT NOT NULL,
+    content TEXT DEFAULT '',
+    important INTEGER DEFAULT 0,
+    last_modified TEXT,
+    FOREIGN KEY(category_id) REFERENCES categories(id)
+);
+'''
+
+CATEGORIES = [(1, "Work"), (2, "Home")]
+# id, category_id, name, content, important, last_modified
+TASKS = [
+    (1, 1, "Write report", "<p>Quarterly <b>numbers</b></p>", 0, "2023-03-14 09:26"),
+    (2, 1, "Call bank", "<p>Ask about the café fee</p>", 1, "2023-11-05 18:00"),
+    (3, 2, "Groceries", "", 0, None),
+    (4, 1, "Book flights", "<p>Lisbon &amp; Porto</p>", 0, "2024-07-01 00:05"),
+    (5, 2, "Fix bike", "<p>Rear brake</p>", 1, "2022-12-31 23:59"),
+]
+DELETED_TASK_ID = 6
+
+
+def local_epoch(text):
+    return int(time.mktime(time.strptime(text, "%Y-%m-%d %H:%M")))
+
+
+class OriginalDatabaseTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, planner_db.DB_FILENAME)
+        conn = sqlite3.connect(self.db_path)
+        conn.executescript(ORIGINAL_SCHEMA)
+        conn.executemany('INSERT INTO categories (id, name) VALUES (?, ?)', CATEGORIES)
+        conn.executemany('INSERT INTO tasks VALUES (?, ?, ?, ?, ?, ?)', TASKS)
+        # The newest task was deleted, so AUTOINCREMENT is ahead of MAX(id)
+        conn.execute('INSERT INTO tasks (id, category_id, name) VALUES (?, 1, ?)', (DELETED_TASK_ID, "Gone"))
+        conn.execute('DELETE FROM tasks WHERE id=?', (DELETED_TASK_ID,))
+        conn.commit()
+        conn.close()
+        self.conn = planner_db.open_database(self.db_path)
+
+    def tearDown(self):
+        self.conn.close()
+        self.tmp.cleanup()
+
+    def test_schema_is_current(self):
+        self.assertEqual(self.conn.execute('PRAGMA user_version').fetchone()[0], len(planner_db.MIGRATIONS))
+        self.assertEqual(self.conn.execute('PRAGMA integrity_check').fetchone()[0], "ok")
+
+    def test_reopening_changes_nothing(self):
+        self.conn.close()
+        self.conn = planner_db.open_database(self.db_path)
+        self.assertEqual(self.conn.execute('PRAGMA user_version').fetchone()[0], len(planner_db.MIGRATIONS))
+        self.assertEqual(self.conn.execute('SELECT COUNT(*) FROM tasks').fetchone()[0], len(TASKS))
+
+    def test_rows_are_kept(self):
+        rows = self.conn.execute('SELECT id, category_id, name, content, important FROM tasks ORDER BY id').fetchall()
+        self.assertEqual(rows, [task[:5] for task in TASKS])
+
+    def test_timestamps_become_epoch_seconds(self):
+        rows = dict(self.conn.execute('SELECT id, last_modified FROM tasks'))
+        for task_id, last_modified in ((task[0], task[5]) for task in TASKS):
+            self.assertEqual(rows[task_id], local_epoch(last_modified) if last_modified else None)
+
+    def test_content_hashes(self):
+        for task_id, content, digest in self.conn.execute('SELECT id, content, content_hash FROM tasks'):
+            self.assertEqual(digest, planner_db.content_hash(content), task_id)
+
+    def test_autoincrement_does_not_reuse_deleted_ids(self):
+        seq = self.conn.execute("SELECT seq FROM sqlite_sequence WHERE name='tasks'").fetchone()[0]
+        self.assertEqual(seq, DELETED_TASK_ID)
+        task_id, _ = planner_db.insert_task(self.conn, 1, "New")
+        self.assertEqual(task_id, DELETED_TASK_ID + 1)
+
+    def test_ranks_follow_the_old_order(self):
+        # Starred first, then by id, RANK_GAP apart within each category
+        ranks = dict(self.conn.execute('SELECT id, rank FROM tasks'))
+        gap = planner_db.RANK_GAP
+        self.assertEqual(ranks, {2: gap, 1: 2 * gap, 4: 3 * gap, 5: gap, 3: 2 * gap})
+        self.assertEqual(self.conn.execute('SELECT id, rank FROM categories ORDER BY id').fetchall(), [(1, gap), (2, 2 * gap)])
+
+    def test_search_index(self):
+        rows = self.conn.execute('SELECT rowid, name, body FROM tasks_fts ORDER BY rowid').fetchall()
+        self.assertEqual(rows, [(task[0], task[2], planner_db.html_to_text(task[3])) for task in TASKS])
+        self.assertIn("Quarterly numbers", rows[0][2])
+        hits = self.conn.execute("SELECT rowid FROM tasks_fts WHERE tasks_fts MATCH 'cafe'").fetchall()
+        self.assertEqual(hits, [(2,)])
+
+
+if __name__ == '__main__':
+    unittest.main()
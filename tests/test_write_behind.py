@@ -0,0 +1,50 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+
+import planner_db
+
+
+class FailingWriteTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, planner_db.DB_FILENAME)
+        self.conn = planner_db.open_database(self.db_path)
+        self.task_id, _ = planner_db.insert_task(self.conn, planner_db.insert_category(self.conn, "Work"))
+        self.conn.commit()
+        self.writer = planner_db.WriteBehindQueue(self.db_path, delay=0.01)
+
+    def tearDown(self):
+        self.writer.close()
+        self.conn.close()
+        self.tmp.cleanup()
+
+    def content(self):
+        return self.conn.execute('SELECT content FROM tasks WHERE id=?', (self.task_id,)).fetchone()[0]
+
+    def test_error_outside_sqlite_keeps_the_writer_running(self):
+        # None is not a note; encoding it fails in Python rather than in sqlite3
+        self.writer.put(self.task_id, content=None)
+        self.writer.flush()
+        self.assertIsNotNone(self.writer.last_error)
+        self.assertNotIsInstance(self.writer.last_error, sqlite3.Error)
+        self.assertTrue(self.writer.thread.is_alive())
+        # The failed write stays queued underneath newer ones, which replace it
+        self.writer.put(self.task_id, content="<p>Fixed</p>")
+        self.writer.flush()
+        self.assertEqual(self.content(), "<p>Fixed</p>")
+
+    def test_close_gives_up_on_a_write_that_keeps_failing(self):
+        self.writer.put(self.task_id, content=None)
+        closing = threading.Thread(target=self.writer.close)
+        closing.start()
+        closing.join(10)
+        self.assertFalse(closing.is_alive())
+        self.assertFalse(self.writer.thread.is_alive())
+        self.assertEqual(self.content(), "")
+
+
+if __name__ == '__main__':
+    unittest.main()